@@ -1,37 +1,146 @@
 import requests
 import json
-from typing import Dict, List, Any, Optional
+import time
+from typing import Dict, List, Any, Optional, Tuple, Union
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from PySide6.QtCore import QObject, Signal
 from core.logger import get_logger
+from core.api.http_stats import LatencyStats, endpoint_name
+
+# Таймаут запроса: (установка соединения, чтение ответа), секунды
+Timeout = Union[float, Tuple[float, float]]
+
+DEFAULT_TIMEOUT: Timeout = (3.05, 15)
+
+# Таймауты по префиксу пути (выбирается самый длинный совпавший префикс)
+ENDPOINT_TIMEOUTS: Dict[str, Timeout] = {
+    "/ping": (2, 5),
+    "/api/auth/": (3.05, 20),
+    "/api/devices/": (3.05, 10),
+    "/api/labs/": (3.05, 30),
+}
+
+# Повторы при сбоях соединения и ответах 502/503/504 только для идемпотентных методов
+RETRY_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+RETRY_TOTAL = 3
+RETRY_BACKOFF = 0.3  # секунды, удваивается с каждой попыткой
+
+# Размер пула соединений (запросы выполняются из нескольких потоков)
+POOL_MAXSIZE = 10
+
+# Период записи сводки задержек в журнал, секунды
+STATS_LOG_INTERVAL = 300
 
 
 class APIClient(QObject):
-    """Клиент для работы с API сервера"""
+    """Клиент для работы с API сервера
+
+    Все запросы идут через одну сессию requests с пулом постоянных
+    соединений, таймаутами по конечным точкам, повторами идемпотентных
+    запросов и статистикой задержек.
+    """
 
     # Сигналы для уведомления об ошибках и событиях
     error_occurred = Signal(str)
     connection_status_changed = Signal(bool)
 
-    def __init__(self):
+    def __init__(self, gzip: bool = True):
         super().__init__()
         self.logger = get_logger()
         self.base_url = ""
         self.api_key = ""
         self.token = ""
         self.connected = False
+        # URL -> (ETag, тело ответа) для условных запросов списков
+        self._etag_cache: Dict[str, Tuple[str, bytes]] = {}
+        self.timeouts: Dict[str, Timeout] = dict(ENDPOINT_TIMEOUTS)
+        self.stats = LatencyStats()
+        self._stats_logged_at = time.monotonic()
+        self.session = self._create_session(gzip)
         self.logger.info("APIClient инициализирован")
 
+    @staticmethod
+    def _create_session(gzip: bool) -> requests.Session:
+        """Сессия с пулом соединений и повторами"""
+        retry = Retry(
+            total=RETRY_TOTAL,
+            backoff_factor=RETRY_BACKOFF,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=RETRY_METHODS,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=POOL_MAXSIZE, max_retries=retry)
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        # requests распаковывает gzip сам; без сжатия сервер отдает тело как есть
+        session.headers["Accept-Encoding"] = "gzip, deflate" if gzip else "identity"
+        return session
+
+    def set_timeout(self, path_prefix: str, timeout: Timeout):
+        """Настройка таймаута для конечных точек с указанным префиксом пути"""
+        self.timeouts[path_prefix] = timeout
+
+    def _timeout_for(self, path: str) -> Timeout:
+        """Таймаут для пути запроса (самый длинный совпавший префикс)"""
+        matches = [prefix for prefix in self.timeouts if path.startswith(prefix)]
+        if not matches:
+            return DEFAULT_TIMEOUT
+        return self.timeouts[max(matches, key=len)]
+
+    def _request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Запрос через общую сессию с таймаутом и учетом задержки"""
+        path = url[len(self.base_url):] if url.startswith(self.base_url) else url
+        kwargs.setdefault("headers", self.get_headers())
+        kwargs.setdefault("timeout", self._timeout_for(path))
+
+        endpoint = endpoint_name(method, path)
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except requests.RequestException:
+            self.stats.record(endpoint, time.perf_counter() - started, error=True)
+            raise
+
+        self.stats.record(endpoint, time.perf_counter() - started,
+                          error=response.status_code >= 500)
+        self._maybe_log_stats()
+        return response
+
+    def _maybe_log_stats(self):
+        """Периодическая запись сводки задержек в журнал"""
+        now = time.monotonic()
+        if now - self._stats_logged_at < STATS_LOG_INTERVAL:
+            return
+        self._stats_logged_at = now
+        self.log_latency_stats()
+
+    def log_latency_stats(self):
+        """Запись сводки задержек по конечным точкам в журнал"""
+        lines = self.stats.summary_lines()
+        if not lines:
+            return
+        self.logger.info("Задержки запросов к API:\n" + "\n".join(lines))
+
+    def get_latency_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Статистика задержек по конечным точкам (миллисекунды)"""
+        return self.stats.snapshot()
+
     def configure(self, base_url: str, api_key: str):
         """Настройка клиента API"""
         self.logger.info(f"Настройка APIClient: URL={base_url}")
         self.base_url = base_url.rstrip("/")
         self.api_key = api_key
         self.connected = False
+        self._etag_cache.clear()
+        self.stats.clear()
 
     def set_token(self, token: str):
         """Установка токена авторизации"""
         self.logger.info("Установка токена авторизации")
         self.token = token
+        self._etag_cache.clear()
 
     def get_headers(self) -> Dict[str, str]:
         """Получение заголовков для запросов"""
@@ -40,15 +149,43 @@ class APIClient(QObject):
             headers["Authorization"] = f"Bearer {self.token}"
         return headers
 
+    def _conditional_get(self, path: str) -> Tuple[Any, requests.Response]:
+        """GET-запрос с If-None-Match
+
+        Возвращает (данные, ответ). При ответе 304 данные разбираются из
+        сохраненного тела предыдущего ответа, при ошибке данные - None.
+        """
+        url = f"{self.base_url}{path}"
+        headers = self.get_headers()
+        cached = self._etag_cache.get(url)
+        if cached:
+            headers["If-None-Match"] = cached[0]
+
+        response = self._request("GET", url, headers=headers)
+
+        if response.status_code == 304 and cached:
+            self.logger.debug(f"Данные не изменились: {path}")
+            return json.loads(cached[1]), response
+
+        if response.status_code == 200:
+            etag = response.headers.get("ETag")
+            if etag:
+                self._etag_cache[url] = (etag, response.content)
+            else:
+                self._etag_cache.pop(url, None)
+            return response.json(), response
+
+        return None, response
+
     def check_connection(self) -> bool:
         """Проверка соединения с сервером"""
         try:
             self.logger.info(
                 f"Проверка соединения с сервером: {self.base_url}")
-            response = requests.get(
+            response = self._request(
+                "GET",
                 f"{self.base_url}/ping",
-                headers=self.get_headers(),
-                timeout=5
+                headers=self.get_headers()
             )
             self.connected = response.status_code == 200
             self.connection_status_changed.emit(self.connected)
@@ -72,7 +209,8 @@ class APIClient(QObject):
         """Вход в систему"""
         try:
             self.logger.info(f"Попытка входа пользователя: {username}")
-            response = requests.post(
+            response = self._request(
+                "POST",
                 f"{self.base_url}/api/auth/login",
                 headers=self.get_headers(),
                 json={"username": username, "password": password}
@@ -98,7 +236,8 @@ class APIClient(QObject):
         try:
             self.logger.info(
                 f"Попытка регистрации пользователя: {user_data.get('login')}")
-            response = requests.post(
+            response = self._request(
+                "POST",
                 f"{self.base_url}/api/auth/register",
                 headers=self.get_headers(),
                 json=user_data
@@ -122,7 +261,8 @@ class APIClient(QObject):
         """Получение информации о текущем пользователе"""
         try:
             self.logger.info("Получение информации о текущем пользователе")
-            response = requests.get(
+            response = self._request(
+                "GET",
                 f"{self.base_url}/api/auth/me",
                 headers=self.get_headers()
             )
@@ -144,13 +284,10 @@ class APIClient(QObject):
         """Получение списка устройств"""
         try:
             self.logger.info("Получение списка устройств")
-            response = requests.get(
-                f"{self.base_url}/api/devices",
-                headers=self.get_headers()
-            )
+            devices, response = self._conditional_get("/api/devices/")
 
-            if response.status_code == 200:
-                return response.json()
+            if devices is not None:
+                return devices
             else:
                 error_msg = response.json().get("detail", "Ошибка получения устройств")
                 self.logger.error(f"Ошибка получения устройств: {error_msg}")
@@ -161,11 +298,39 @@ class APIClient(QObject):
             self.error_occurred.emit(str(e))
             return None
 
+    def get_device_changes(self, since: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """Получение устройств, изменившихся после курсора since
+
+        Ответ: {"seq", "resync", "devices", "removed"}. При resync=true
+        devices содержит полный список устройств.
+        """
+        try:
+            params = {"since": since} if since is not None else {}
+            response = self._request(
+                "GET",
+                f"{self.base_url}/api/devices/changes",
+                headers=self.get_headers(),
+                params=params
+            )
+
+            if response.status_code == 200:
+                return response.json()
+            else:
+                error_msg = response.json().get("detail", "Ошибка синхронизации устройств")
+                self.logger.error(f"Ошибка синхронизации устройств: {error_msg}")
+                self.error_occurred.emit(error_msg)
+                return None
+        except Exception as e:
+            self.logger.error(f"Ошибка при синхронизации устройств: {e}")
+            self.error_occurred.emit(str(e))
+            return None
+
     def get_device(self, device_id: str) -> Optional[Dict[str, Any]]:
         """Получение информации об устройстве"""
         try:
             self.logger.info(f"Получение информации об устройстве {device_id}")
-            response = requests.get(
+            response = self._request(
+                "GET",
                 f"{self.base_url}/api/devices/{device_id}",
                 headers=self.get_headers()
             )
@@ -188,7 +353,8 @@ class APIClient(QObject):
         """Отправка команды устройству"""
         try:
             self.logger.info(f"Отправка команды устройству {device_id}")
-            response = requests.post(
+            response = self._request(
+                "POST",
                 f"{self.base_url}/api/devices/{device_id}/command",
                 headers=self.get_headers(),
                 json={"command": command}
@@ -212,7 +378,8 @@ class APIClient(QObject):
         """Получение истории показаний устройства"""
         try:
             self.logger.info(f"Получение истории устройства {device_id}")
-            response = requests.get(
+            response = self._request(
+                "GET",
                 f"{self.base_url}/api/devices/{device_id}/history?limit={limit}",
                 headers=self.get_headers()
             )
@@ -235,7 +402,8 @@ class APIClient(QObject):
         """Получение списка пользователей"""
         try:
             self.logger.info("Получение списка пользователей")
-            response = requests.get(
+            response = self._request(
+                "GET",
                 f"{self.base_url}/api/users",
                 headers=self.get_headers()
             )
@@ -257,7 +425,8 @@ class APIClient(QObject):
         """Получение информации о пользователе"""
         try:
             self.logger.info(f"Получение информации о пользователе {user_id}")
-            response = requests.get(
+            response = self._request(
+                "GET",
                 f"{self.base_url}/api/users/{user_id}",
                 headers=self.get_headers()
             )
@@ -280,7 +449,8 @@ class APIClient(QObject):
         """Создание нового пользователя"""
         try:
             self.logger.info("Создание нового пользователя")
-            response = requests.post(
+            response = self._request(
+                "POST",
                 f"{self.base_url}/api/users",
                 headers=self.get_headers(),
                 json=data
@@ -302,7 +472,8 @@ class APIClient(QObject):
         """Обновление пользователя"""
         try:
             self.logger.info(f"Обновление пользователя {user_id}")
-            response = requests.put(
+            response = self._request(
+                "PUT",
                 f"{self.base_url}/api/users/{user_id}",
                 headers=self.get_headers(),
                 json=data
@@ -326,7 +497,8 @@ class APIClient(QObject):
         """Удаление пользователя"""
         try:
             self.logger.info(f"Удаление пользователя {user_id}")
-            response = requests.delete(
+            response = self._request(
+                "DELETE",
                 f"{self.base_url}/api/users/{user_id}",
                 headers=self.get_headers()
             )
@@ -349,13 +521,10 @@ class APIClient(QObject):
         """Получение списка лабораторных работ"""
         try:
             self.logger.info("Получение списка лабораторных работ")
-            response = requests.get(
-                f"{self.base_url}/api/labs",
-                headers=self.get_headers()
-            )
+            labs, response = self._conditional_get("/api/labs/")
 
-            if response.status_code == 200:
-                return response.json()
+            if labs is not None:
+                return labs
             else:
                 try:
                     error_msg = response.json().get("detail", "Ошибка получения лабораторных работ")
@@ -374,7 +543,8 @@ class APIClient(QObject):
         try:
             self.logger.info(
                 f"Получение информации о лабораторной работе {lab_id}")
-            response = requests.get(
+            response = self._request(
+                "GET",
                 f"{self.base_url}/api/labs/{lab_id}",
                 headers=self.get_headers()
             )
@@ -397,7 +567,8 @@ class APIClient(QObject):
         """Начало выполнения лабораторной работы"""
         try:
             self.logger.info(f"Начало выполнения лабораторной работы {lab_id}")
-            response = requests.post(
+            response = self._request(
+                "POST",
                 f"{self.base_url}/api/labs/{lab_id}/start",
                 headers=self.get_headers()
             )
@@ -422,7 +593,8 @@ class APIClient(QObject):
         try:
             self.logger.info(
                 f"Получение результата выполнения лабораторной работы {result_id}")
-            response = requests.get(
+            response = self._request(
+                "GET",
                 f"{self.base_url}/api/labs/results/{result_id}",
                 headers=self.get_headers()
             )
@@ -446,7 +618,8 @@ class APIClient(QObject):
         try:
             self.logger.info(
                 f"Получение результатов лабораторной работы {lab_id}")
-            response = requests.get(
+            response = self._request(
+                "GET",
                 f"{self.base_url}/api/labs/{lab_id}/results",
                 headers=self.get_headers()
             )
@@ -465,11 +638,53 @@ class APIClient(QObject):
             self.error_occurred.emit(str(e))
             return None
 
+    def get_lab_results_page(self, lab_id: int, page: int = 1, page_size: int = 50,
+                             sort_by: str = "id", order: str = "asc",
+                             status: Optional[str] = None,
+                             search: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Получение страницы результатов лабораторной работы с ФИО студентов"""
+        try:
+            self.logger.info(
+                f"Получение страницы {page} результатов лабораторной работы {lab_id}")
+            params = {
+                "expand": "true",
+                "page": page,
+                "page_size": page_size,
+                "sort_by": sort_by,
+                "order": order
+            }
+            if status:
+                params["status"] = status
+            if search:
+                params["search"] = search
+
+            response = self._request(
+                "GET",
+                f"{self.base_url}/api/labs/{lab_id}/results",
+                headers=self.get_headers(),
+                params=params
+            )
+
+            if response.status_code == 200:
+                return response.json()
+            else:
+                error_msg = response.json().get("detail", "Ошибка получения результатов")
+                self.logger.error(
+                    f"Ошибка получения результатов лабораторной работы {lab_id}: {error_msg}")
+                self.error_occurred.emit(error_msg)
+                return None
+        except Exception as e:
+            self.logger.error(
+                f"Ошибка при получении результатов лабораторной работы {lab_id}: {e}")
+            self.error_occurred.emit(str(e))
+            return None
+
     def update_lab_result(self, result_id: int, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Обновление результата выполнения лабораторной работы"""
         try:
             self.logger.info(f"Обновление результата {result_id}")
-            response = requests.put(
+            response = self._request(
+                "PUT",
                 f"{self.base_url}/api/labs/results/{result_id}",
                 headers=self.get_headers(),
                 json=data
@@ -493,7 +708,8 @@ class APIClient(QObject):
         """Обновление результата выполнения задания"""
         try:
             self.logger.info(f"Обновление результата задания {task_result_id}")
-            response = requests.put(
+            response = self._request(
+                "PUT",
                 f"{self.base_url}/api/labs/results/{result_id}/tasks/{task_result_id}",
                 headers=self.get_headers(),
                 json=data
@@ -517,7 +733,8 @@ class APIClient(QObject):
         """Создание новой лабораторной работы"""
         try:
             self.logger.info("Создание новой лабораторной работы")
-            response = requests.post(
+            response = self._request(
+                "POST",
                 f"{self.base_url}/api/labs",
                 headers=self.get_headers(),
                 json=data
@@ -540,7 +757,8 @@ class APIClient(QObject):
         """Обновление лабораторной работы"""
         try:
             self.logger.info(f"Обновление лабораторной работы {lab_id}")
-            response = requests.put(
+            response = self._request(
+                "PUT",
                 f"{self.base_url}/api/labs/{lab_id}",
                 headers=self.get_headers(),
                 json=data
@@ -564,7 +782,8 @@ class APIClient(QObject):
         """Удаление лабораторной работы"""
         try:
             self.logger.info(f"Удаление лабораторной работы {lab_id}")
-            response = requests.delete(
+            response = self._request(
+                "DELETE",
                 f"{self.base_url}/api/labs/{lab_id}",
                 headers=self.get_headers()
             )
@@ -588,7 +807,8 @@ class APIClient(QObject):
         try:
             self.logger.info(
                 f"Создание задания для лабораторной работы {lab_id}")
-            response = requests.post(
+            response = self._request(
+                "POST",
                 f"{self.base_url}/api/labs/{lab_id}/tasks",
                 headers=self.get_headers(),
                 json=data
@@ -612,7 +832,8 @@ class APIClient(QObject):
         """Обновление задания"""
         try:
             self.logger.info(f"Обновление задания {task_id}")
-            response = requests.put(
+            response = self._request(
+                "PUT",
                 f"{self.base_url}/api/labs/{lab_id}/tasks/{task_id}",
                 headers=self.get_headers(),
                 json=data
@@ -635,7 +856,8 @@ class APIClient(QObject):
         """Удаление задания"""
         try:
             self.logger.info(f"Удаление задания {task_id}")
-            response = requests.delete(
+            response = self._request(
+                "DELETE",
                 f"{self.base_url}/api/labs/{lab_id}/tasks/{task_id}",
                 headers=self.get_headers()
             )
@@ -1,16 +1,20 @@
-from PySide6.QtCore import QThread, Signal
 from typing import Dict, List, Any, Optional, Callable
+from core.api.task_pool import TaskFuture, task_pool, PRIORITY_USER, PRIORITY_BACKGROUND
 from core.logger import get_logger
 
 logger = get_logger()
 
 
-class APIWorker(QThread):
-    """Рабочий поток для выполнения API запросов"""
+class APIWorker(TaskFuture):
+    """Запрос к API, выполняемый в общем пуле потоков
 
-    # Сигналы для уведомления о результатах
-    result_ready = Signal(object)
-    error_occurred = Signal(str)
+    Одинаковые запросы, которые еще выполняются, объединяются в один
+    (dedupe = False отключает это для запросов, которые нужно повторять).
+    Фоновые обновления запускаются с priority = PRIORITY_BACKGROUND.
+    """
+
+    priority = PRIORITY_USER
+    dedupe = True
 
     def __init__(self, api_client, method_name: str, *args, **kwargs):
         super().__init__()
@@ -18,49 +22,29 @@ class APIWorker(QThread):
         self.method_name = method_name
         self.args = args
         self.kwargs = kwargs
-        self.result = None
-        self._is_running = False
-        logger.info(f"Создан APIWorker для метода {method_name}")
-
-    def run(self):
-        """Выполнение API запроса в отдельном потоке"""
-        self._is_running = True
-        logger.info(f"Запуск APIWorker для метода {self.method_name}")
-        try:
-            # Получаем метод API клиента по имени
-            method = getattr(self.api_client, self.method_name)
-
-            # Вызываем метод с переданными аргументами
-            self.result = method(*self.args, **self.kwargs)
-
-            # Отправляем сигнал с результатом
-            if self._is_running:  # Проверяем, что поток не был остановлен
-                logger.info(
-                    f"APIWorker для метода {self.method_name} успешно выполнен")
-                self.result_ready.emit(self.result)
-        except Exception as e:
-            # В случае ошибки отправляем сигнал с сообщением об ошибке
-            logger.error(
-                f"Ошибка в APIWorker для метода {self.method_name}: {e}")
-            if self._is_running:  # Проверяем, что поток не был остановлен
-                self.error_occurred.emit(str(e))
-        finally:
-            self._is_running = False
-            logger.info(f"APIWorker для метода {self.method_name} завершен")
 
-    def stop(self):
-        """Безопасная остановка потока"""
-        logger.info(f"Остановка APIWorker для метода {self.method_name}")
-        self._is_running = False
-        self.quit()
-        self.wait()
+    def start(self, priority: Optional[int] = None):
+        """Постановка запроса в очередь пула"""
+        key = None
+        if self.dedupe:
+            key = (id(self.api_client), self.method_name,
+                   repr(self.args), repr(sorted(self.kwargs.items())))
+        task_pool.submit(
+            getattr(self.api_client, self.method_name),
+            self.args,
+            self.kwargs,
+            priority=self.priority if priority is None else priority,
+            key=key,
+            future=self
+        )
+
+    def isRunning(self) -> bool:
+        """Запрос еще не завершен"""
+        return not self.done()
 
-    def __del__(self):
-        logger.info(f"Уничтожение APIWorker для метода {self.method_name}")
-        if self.isRunning():
-            logger.warning(
-                f"APIWorker для метода {self.method_name} уничтожается во время работы!")
-            self.stop()
+    def stop(self):
+        """Отмена запроса"""
+        self.cancel()
 
 
 class LoginWorker(APIWorker):
@@ -129,6 +113,16 @@ class GetDevicesWorker(APIWorker):
         logger.info("Создан GetDevicesWorker")
 
 
+class GetDeviceChangesWorker(APIWorker):
+    """Рабочий поток для получения изменений устройств после курсора"""
+
+    priority = PRIORITY_BACKGROUND
+
+    def __init__(self, api_client, since: Optional[int] = None):
+        super().__init__(api_client, "get_device_changes", since)
+        logger.info(f"Создан GetDeviceChangesWorker (since={since})")
+
+
 class GetDeviceWorker(APIWorker):
     """Рабочий поток для получения информации об устройстве"""
 
@@ -140,6 +134,9 @@ class GetDeviceWorker(APIWorker):
 class SendDeviceCommandWorker(APIWorker):
     """Рабочий поток для отправки команды устройству"""
 
+    # Повторная команда (например, переключение) должна выполниться еще раз
+    dedupe = False
+
     def __init__(self, api_client, device_id: str, command: Dict[str, Any]):
         super().__init__(api_client, "send_device_command", device_id, command)
         logger.info(
@@ -187,6 +184,18 @@ class GetLabResultsWorker(APIWorker):
             f"Создан GetLabResultsWorker для лабораторной работы {lab_id}")
 
 
+class GetLabResultsPageWorker(APIWorker):
+    """Рабочий поток для получения страницы результатов лабораторной работы"""
+
+    def __init__(self, api_client, lab_id: int, page: int, page_size: int,
+                 sort_by: str, order: str, status: Optional[str] = None,
+                 search: Optional[str] = None):
+        super().__init__(api_client, "get_lab_results_page", lab_id, page, page_size,
+                         sort_by, order, status, search)
+        logger.info(
+            f"Создан GetLabResultsPageWorker для лабораторной работы {lab_id}, страница {page}")
+
+
 class UpdateLabResultWorker(APIWorker):
     """Рабочий поток для обновления результата выполнения лабораторной работы"""
 
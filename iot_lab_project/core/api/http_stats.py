@@ -0,0 +1,71 @@
+import re
+from collections import deque
+from threading import Lock
+from typing import Dict, Any, List
+
+# Сегменты пути, которые являются идентификаторами (числа, IEEE-адреса)
+_ID_SEGMENT = re.compile(r"/(\d+|0x[0-9a-fA-F]+)(?=/|$)")
+
+
+def endpoint_name(method: str, path: str) -> str:
+    """Имя конечной точки для статистики: метод и путь без идентификаторов и параметров"""
+    path = path.split("?", 1)[0]
+    return f"{method} {_ID_SEGMENT.sub('/{id}', path)}"
+
+
+class LatencyStats:
+    """Статистика задержек запросов по конечным точкам
+
+    Для каждой конечной точки хранятся счетчики и последние window
+    измерений, по которым считаются перцентили.
+    """
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._lock = Lock()
+        self._samples: Dict[str, deque] = {}
+        self._counts: Dict[str, int] = {}
+        self._errors: Dict[str, int] = {}
+
+    def record(self, endpoint: str, elapsed: float, error: bool = False):
+        """Учет одного запроса (elapsed - секунды)"""
+        with self._lock:
+            samples = self._samples.get(endpoint)
+            if samples is None:
+                samples = self._samples[endpoint] = deque(maxlen=self.window)
+            samples.append(elapsed * 1000)
+            self._counts[endpoint] = self._counts.get(endpoint, 0) + 1
+            if error:
+                self._errors[endpoint] = self._errors.get(endpoint, 0) + 1
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Текущая статистика по конечным точкам (миллисекунды)"""
+        with self._lock:
+            result = {}
+            for endpoint, samples in self._samples.items():
+                ordered = sorted(samples)
+                result[endpoint] = {
+                    "count": self._counts[endpoint],
+                    "errors": self._errors.get(endpoint, 0),
+                    "p50": ordered[len(ordered) // 2],
+                    "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+                    "max": ordered[-1]
+                }
+            return result
+
+    def summary_lines(self) -> List[str]:
+        """Строки сводки для журнала, самые медленные конечные точки первыми"""
+        stats = self.snapshot()
+        lines = []
+        for endpoint, item in sorted(stats.items(), key=lambda kv: kv[1]["p95"], reverse=True):
+            lines.append(
+                f"{endpoint}: {item['count']} запр., p50 {item['p50']:.0f} мс, "
+                f"p95 {item['p95']:.0f} мс, max {item['max']:.0f} мс, ошибок {item['errors']}")
+        return lines
+
+    def clear(self):
+        """Сброс статистики"""
+        with self._lock:
+            self._samples.clear()
+            self._counts.clear()
+            self._errors.clear()
@@ -0,0 +1,215 @@
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal, Slot
+from typing import Dict, Any, Callable, Hashable, Optional, Tuple
+from core.logger import get_logger
+
+logger = get_logger()
+
+# Приоритеты (очереди) задач
+PRIORITY_BACKGROUND = 0  # Фоновые обновления
+PRIORITY_USER = 1  # Действия пользователя
+
+# Число потоков в каждой очереди
+USER_THREADS = 4
+BACKGROUND_THREADS = 2
+
+# Состояния задачи
+PENDING = "pending"
+DONE = "done"
+CANCELLED = "cancelled"
+
+
+class TaskFuture(QObject):
+    """Результат задачи, выполняемой в пуле потоков
+
+    Сигналы отправляются в потоке интерфейса. Ссылку на объект держит пул
+    до завершения задачи, поэтому сохранять его у себя не требуется.
+    """
+
+    result_ready = Signal(object)
+    error_occurred = Signal(str)
+    finished = Signal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._state = PENDING
+        self._task = None
+        self.result = None
+        self.error = None
+
+    def done(self) -> bool:
+        """Задача завершена или отменена"""
+        return self._state != PENDING
+
+    def cancelled(self) -> bool:
+        return self._state == CANCELLED
+
+    def cancel(self) -> bool:
+        """Отмена: результат не будет доставлен; задача из очереди снимается,
+        если ее больше никто не ждет"""
+        if self._state != PENDING:
+            return False
+        self._state = CANCELLED
+        if self._task is not None:
+            task_pool._detach(self._task, self)
+        return True
+
+    def _resolve(self, result: Any, error: Optional[str]):
+        """Доставка результата (в потоке интерфейса)"""
+        if self._state != PENDING:
+            return
+        self._state = DONE
+        self._task = None
+        self.result = result
+        self.error = error
+        if error is None:
+            self.result_ready.emit(result)
+        else:
+            self.error_occurred.emit(error)
+        self.finished.emit()
+
+
+class _Task(QRunnable):
+    """Вызов функции в потоке пула; результат получают все ожидающие"""
+
+    def __init__(self, fn: Callable, args: Tuple, kwargs: Dict[str, Any],
+                 key: Optional[Hashable], priority: int):
+        super().__init__()
+        # Объектом владеет пул задач, а не Qt
+        self.setAutoDelete(False)
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.key = key
+        self.priority = priority
+        self.futures = []
+        self.started = False
+
+    def run(self):
+        self.started = True
+        result, error = None, None
+        if self.futures:
+            try:
+                result = self.fn(*self.args, **self.kwargs)
+            except Exception as e:
+                name = getattr(self.fn, "__name__", repr(self.fn))
+                logger.error(f"Ошибка в задаче {name}: {e}")
+                error = str(e)
+        task_pool._task_done.emit(self, result, error)
+
+
+class TaskPool(QObject):
+    """Общий пул потоков для запросов к API
+
+    Две очереди с собственными потоками: действия пользователя не ждут
+    фоновых обновлений. Одинаковые задачи, которые еще ждут в очереди,
+    объединяются: повторный вызов получает тот же результат. К уже
+    начавшейся задаче вызов не присоединяется - ее ответ мог быть получен
+    до изменений, сделанных перед вызовом.
+    """
+
+    _task_done = Signal(object, object, object)
+
+    def __init__(self, user_threads: int = USER_THREADS,
+                 background_threads: int = BACKGROUND_THREADS):
+        super().__init__()
+        self._lanes: Dict[int, QThreadPool] = {}
+        for priority, threads in ((PRIORITY_USER, user_threads),
+                                  (PRIORITY_BACKGROUND, background_threads)):
+            lane = QThreadPool()
+            lane.setMaxThreadCount(threads)
+            self._lanes[priority] = lane
+
+        # Ключ задачи -> последняя поставленная задача с этим ключом
+        self._inflight: Dict[Hashable, _Task] = {}
+        # Все незавершенные задачи (пул держит ссылки до их завершения)
+        self._tasks = set()
+        self._task_done.connect(self._on_task_done)
+
+        # Метрики
+        self.submitted = 0
+        self.deduplicated = 0
+        self.cancelled = 0
+        self.completed = 0
+
+    def submit(self, fn: Callable, args: Tuple = (), kwargs: Optional[Dict[str, Any]] = None,
+               priority: int = PRIORITY_USER, key: Optional[Hashable] = None,
+               future: Optional[TaskFuture] = None) -> TaskFuture:
+        """Постановка задачи в очередь
+
+        Если задача с тем же key еще не начала выполняться, новая не
+        создается: future присоединяется к ней. Без key задачи не объединяются.
+        """
+        future = future or TaskFuture()
+        self.submitted += 1
+
+        task = self._inflight.get(key) if key is not None else None
+        if task is not None and not task.started:
+            self.deduplicated += 1
+            # Фоновая задача, которую ждет пользователь, переходит в его очередь
+            if priority > task.priority and not task.started:
+                if self._lanes[task.priority].tryTake(task):
+                    task.priority = priority
+                    self._lanes[priority].start(task)
+        else:
+            task = _Task(fn, tuple(args), dict(kwargs or {}), key, priority)
+            if key is not None:
+                self._inflight[key] = task
+            self._tasks.add(task)
+            self._lanes[priority].start(task)
+
+        future._task = task
+        task.futures.append(future)
+        return future
+
+    def _detach(self, task: _Task, future: TaskFuture):
+        """Отсоединение отмененного future; задача без ожидающих снимается с очереди"""
+        self.cancelled += 1
+        if future in task.futures:
+            task.futures.remove(future)
+        if task.futures or task.started:
+            return
+        if self._lanes[task.priority].tryTake(task):
+            self._forget(task)
+
+    def _forget(self, task: _Task):
+        if task.key is not None and self._inflight.get(task.key) is task:
+            del self._inflight[task.key]
+        self._tasks.discard(task)
+
+    @Slot(object, object, object)
+    def _on_task_done(self, task: _Task, result: Any, error: Optional[str]):
+        """Завершение задачи (в потоке интерфейса)"""
+        self._forget(task)
+        self.completed += 1
+        futures, task.futures = task.futures, []
+        for future in futures:
+            future._resolve(result, error)
+
+    def shutdown(self, timeout_ms: int = 1000):
+        """Отмена задач из очередей и ожидание выполняемых"""
+        for lane in self._lanes.values():
+            lane.clear()
+        for task in list(self._tasks):
+            if not task.started:
+                for future in task.futures:
+                    future._state = CANCELLED
+                task.futures = []
+                self._forget(task)
+        for lane in self._lanes.values():
+            lane.waitForDone(timeout_ms)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Метрики пула"""
+        return {
+            "submitted": self.submitted,
+            "deduplicated": self.deduplicated,
+            "cancelled": self.cancelled,
+            "completed": self.completed,
+            "pending": len(self._tasks),
+            "active_user": self._lanes[PRIORITY_USER].activeThreadCount(),
+            "active_background": self._lanes[PRIORITY_BACKGROUND].activeThreadCount()
+        }
+
+
+# Глобальный экземпляр пула задач
+task_pool = TaskPool()
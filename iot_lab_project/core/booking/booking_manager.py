@@ -2,6 +2,7 @@ from PySide6.QtCore import QObject, Signal
 from typing import Dict, List, Any, Optional
 from datetime import datetime
 from core.api import api_client
+from core.api.task_pool import PRIORITY_BACKGROUND
 from core.booking.booking_worker import (
     GetDeviceAvailabilityWorker, GetDeviceQueueWorker,
     BookDeviceWorker, GetUserBookingsWorker, CancelBookingWorker
@@ -23,6 +24,7 @@ class BookingManager(QObject):
     def __init__(self):
         super().__init__()
         self.logger = get_logger()
+        # Незавершенные запросы (для отмены при закрытии)
         self._workers = []
 
     def get_device_availability(self, device_id: str):
@@ -31,7 +33,7 @@ class BookingManager(QObject):
         worker.result_ready.connect(
             lambda result: self._handle_availability_result(device_id, result))
         worker.error_occurred.connect(self.error_occurred.emit)
-        self._workers.append(worker)
+        self._track(worker)
         worker.start()
 
     def get_device_queue(self, device_id: str):
@@ -40,7 +42,7 @@ class BookingManager(QObject):
         worker.result_ready.connect(
             lambda result: self._handle_queue_result(device_id, result))
         worker.error_occurred.connect(self.error_occurred.emit)
-        self._workers.append(worker)
+        self._track(worker)
         worker.start()
 
     def book_device(self, device_id: str, start_time: datetime, end_time: datetime, purpose: str):
@@ -54,16 +56,16 @@ class BookingManager(QObject):
         )
         worker.result_ready.connect(self._handle_booking_result)
         worker.error_occurred.connect(self.error_occurred.emit)
-        self._workers.append(worker)
+        self._track(worker)
         worker.start()
 
-    def get_user_bookings(self):
+    def get_user_bookings(self, priority: Optional[int] = None):
         """Получение всех бронирований пользователя"""
         worker = GetUserBookingsWorker(api_client)
         worker.result_ready.connect(self._handle_user_bookings_result)
         worker.error_occurred.connect(self.error_occurred.emit)
-        self._workers.append(worker)
-        worker.start()
+        self._track(worker)
+        worker.start(priority)
 
     def cancel_booking(self, booking_id: int):
         """Отмена бронирования"""
@@ -71,7 +73,7 @@ class BookingManager(QObject):
         worker.result_ready.connect(
             lambda result: self._handle_cancel_result(booking_id, result))
         worker.error_occurred.connect(self.error_occurred.emit)
-        self._workers.append(worker)
+        self._track(worker)
         worker.start()
 
     def _handle_availability_result(self, device_id: str, result: Optional[Dict[str, Any]]):
@@ -101,7 +103,7 @@ class BookingManager(QObject):
             self.logger.success(
                 f"Устройство успешно забронировано: {result.get('booking_id')}")
             # Обновляем список бронирований пользователя
-            self.get_user_bookings()
+            self.get_user_bookings(PRIORITY_BACKGROUND)
         else:
             message = result.get(
                 "message", "Неизвестная ошибка") if result else "Не удалось забронировать устройство"
@@ -123,23 +125,19 @@ class BookingManager(QObject):
             self.booking_cancelled.emit(booking_id)
             self.logger.success(f"Бронирование {booking_id} успешно отменено")
             # Обновляем список бронирований пользователя
-            self.get_user_bookings()
+            self.get_user_bookings(PRIORITY_BACKGROUND)
         else:
             self.error_occurred.emit(
                 f"Не удалось отменить бронирование {booking_id}")
             self.logger.error(f"Не удалось отменить бронирование {booking_id}")
 
+    def _track(self, worker):
+        """Учет запроса до его завершения"""
+        self._workers.append(worker)
+        worker.finished.connect(lambda: self._workers.remove(worker))
+
     def cleanup_workers(self):
-        """Очистка завершенных рабочих потоков"""
+        """Отмена незавершенных запросов"""
         for worker in self._workers[:]:
-            if not worker.isRunning():
-                worker.deleteLater()
-                self._workers.remove(worker)
-            else:
-                # Если поток все еще работает, пытаемся его остановить
-                worker.quit()
-                worker.wait(1000)  # Ждем до 1 секунды
-                if worker.isRunning():
-                    worker.terminate()
-                worker.deleteLater()
-                self._workers.remove(worker)
+            worker.cancel()
+        self._workers.clear()
@@ -1,4 +1,4 @@
-from typing import List, Dict, Any, Callable
+from typing import List, Dict, Any, Callable, Optional
 from core.ha.entity_manager import EntityManager
 from core.ha.ws_client import HomeAssistantWSClient
 
@@ -9,33 +9,44 @@ class DeviceManager:
     def __init__(self, ws_client: HomeAssistantWSClient, entity_manager: EntityManager):
         self.ws = ws_client
         self.entity_manager = entity_manager
+        # Реестр устройств (None - не загружен или устарел)
+        self._devices: Optional[List[Dict[str, Any]]] = None
+        self.ws.subscribe_event("device_registry_updated", lambda event: self._invalidate())
+        self.ws.add_connection_listener(lambda connected: self._invalidate())
+
+    def _invalidate(self):
+        self._devices = None
 
     def get_physical_devices(self, callback: Callable[[List[Dict[str, Any]]], None]):
         def on_devices_loaded(devices):
-            entities = self.entity_manager.get_all()
-            entity_map = {}
-            for e in entities:
-                dev_id = e.get("device_id")
-                if dev_id:
-                    entity_map.setdefault(dev_id, []).append(e)
-
-            physical_devices = []
-            for dev in devices:
-                dev_id = dev.get("id")
-                if dev_id in entity_map:
-                    physical_devices.append({
-                        "id": dev_id,
-                        "name": dev.get("name_by_user") or dev.get("name") or "Без названия",
-                        "manufacturer": dev.get("manufacturer", "Неизвестно"),
-                        "model": dev.get("model", "Неизвестно"),
-                        "entities": entity_map[dev_id]
-                    })
-
-            callback(physical_devices)
+            if isinstance(devices, list):
+                self._devices = devices
+            callback(self._build_physical_devices(devices or []))
+
+        # Реестр устройств меняется редко: повторный запрос не нужен
+        if self._devices is not None:
+            callback(self._build_physical_devices(self._devices))
+            return
 
         self.ws.send_command("config/device_registry/list",
                              callback=on_devices_loaded)
 
+    def _build_physical_devices(self, devices: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Устройства с сущностями (сущности берутся из индекса по устройству)"""
+        physical_devices = []
+        for dev in devices:
+            dev_id = dev.get("id")
+            entities = self.entity_manager.get_by_device(dev_id) if dev_id else []
+            if entities:
+                physical_devices.append({
+                    "id": dev_id,
+                    "name": dev.get("name_by_user") or dev.get("name") or "Без названия",
+                    "manufacturer": dev.get("manufacturer", "Неизвестно"),
+                    "model": dev.get("model", "Неизвестно"),
+                    "entities": entities
+                })
+        return physical_devices
+
     def get_categorized_devices(self, callback: Callable[[Dict[str, List[Dict[str, Any]]]], None]):
         def on_devices(devices):
             categories = {
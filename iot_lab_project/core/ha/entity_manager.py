@@ -1,37 +1,157 @@
+from concurrent.futures import Future
+from threading import RLock
 from typing import List, Dict, Any, Callable, Optional
 from core.ha.ws_client import HomeAssistantWSClient
 from core.ha.rest_client import HomeAssistantRestClient
 
 
 class EntityManager:
-    """Менеджер сущностей Home Assistant"""
+    """Менеджер сущностей Home Assistant
+
+    Реестр сущностей проиндексирован по entity_id, устройству и домену, а
+    состояния хранятся локально и обновляются событиями state_changed,
+    поэтому поиск сущности и ее состояния не требует запросов к серверу.
+    """
 
     def __init__(self, ws_client: HomeAssistantWSClient, rest_client: Optional[HomeAssistantRestClient] = None):
         self.ws = ws_client
         self.rest = rest_client
+        self._lock = RLock()
         self.entities: List[Dict[str, Any]] = []
+        # entity_id -> сущность реестра
+        self._by_id: Dict[str, Dict[str, Any]] = {}
+        # device_id -> {entity_id: сущность}
+        self._by_device: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        # домен -> {entity_id: сущность}
+        self._by_domain: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        # entity_id -> последнее состояние
+        self._states: Dict[str, Dict[str, Any]] = {}
+        self._states_loaded = False
+        self._states_loading = False
+        # Ожидающие завершения загрузки состояний
+        self._states_waiters: List[Callable[[], None]] = []
+        self._state_listeners: List[Callable[[Dict[str, Any]], None]] = []
+
+        self.ws.subscribe_event("state_changed", self._on_state_changed)
+        self.ws.subscribe_event("entity_registry_updated", lambda event: self._load_entities())
+        self.ws.add_connection_listener(self._on_connection)
         self._load_entities()
+        self._load_states()
 
     def _load_entities(self):
         def callback(result):
             if isinstance(result, list):
-                self.entities = result
+                self._index_entities(result)
         self.ws.send_command("config/entity_registry/list", callback=callback)
 
+    def _index_entities(self, entities: List[Dict[str, Any]]):
+        """Перестроение индексов реестра сущностей"""
+        by_id, by_device, by_domain = {}, {}, {}
+        for entity in entities:
+            entity_id = entity.get("entity_id")
+            if not entity_id:
+                continue
+            by_id[entity_id] = entity
+            device_id = entity.get("device_id")
+            if device_id:
+                by_device.setdefault(device_id, {})[entity_id] = entity
+            by_domain.setdefault(entity_id.split(".", 1)[0], {})[entity_id] = entity
+
+        with self._lock:
+            self.entities = entities
+            self._by_id = by_id
+            self._by_device = by_device
+            self._by_domain = by_domain
+
+    def _load_states(self, on_loaded: Optional[Callable[[], None]] = None):
+        """Полная загрузка состояний (при подключении или по запросу)"""
+        with self._lock:
+            if on_loaded:
+                self._states_waiters.append(on_loaded)
+            if self._states_loading:
+                # Загрузка уже выполняется, ждем ее результата
+                return
+            connected = self.ws.is_connected()
+            if connected:
+                self._states_loading = True
+            else:
+                waiters, self._states_waiters = self._states_waiters, []
+
+        if not connected:
+            # Без соединения ожидающие получают последние известные состояния
+            for waiter in waiters:
+                waiter()
+            return
+
+        def callback(result):
+            with self._lock:
+                # При ошибке или обрыве соединения сохраняются прежние состояния
+                if isinstance(result, list):
+                    self._states = {state["entity_id"]: state
+                                    for state in result if state.get("entity_id")}
+                    self._states_loaded = True
+                self._states_loading = False
+                waiters, self._states_waiters = self._states_waiters, []
+            for waiter in waiters:
+                waiter()
+
+        self.ws.send_command("get_states", callback=callback)
+
+    def _on_connection(self, connected: bool):
+        """Перезагрузка реестра и состояний после (пере)подключения
+
+        События state_changed за время обрыва потеряны, поэтому локальные
+        состояния считаются устаревшими до повторной загрузки.
+        """
+        if connected:
+            self._load_entities()
+            self._load_states()
+        else:
+            with self._lock:
+                self._states_loaded = False
+
+    def _on_state_changed(self, event: Dict[str, Any]):
+        """Обновление локального состояния по событию state_changed"""
+        data = event.get("data", {})
+        entity_id = data.get("entity_id")
+        new_state = data.get("new_state")
+        if entity_id:
+            with self._lock:
+                if new_state:
+                    self._states[entity_id] = new_state
+                else:
+                    self._states.pop(entity_id, None)
+            listeners = list(self._state_listeners)
+        else:
+            listeners = []
+        for listener in listeners:
+            listener(event)
+
+    def add_state_listener(self, listener: Callable[[Dict[str, Any]], None]):
+        """Подписка на события state_changed (после обновления локального состояния)"""
+        self._state_listeners.append(listener)
+
+    def remove_state_listener(self, listener: Callable[[Dict[str, Any]], None]):
+        if listener in self._state_listeners:
+            self._state_listeners.remove(listener)
+
     def get_all(self) -> List[Dict[str, Any]]:
         return self.entities
 
     def get_by_device(self, device_id: str) -> List[Dict[str, Any]]:
-        return [e for e in self.entities if e.get("device_id") == device_id]
+        with self._lock:
+            return list(self._by_device.get(device_id, {}).values())
 
     def get_by_domain(self, domain: str) -> List[Dict[str, Any]]:
-        return [e for e in self.entities if e.get("entity_id", "").startswith(f"{domain}.")]
+        with self._lock:
+            return list(self._by_domain.get(domain, {}).values())
 
     def get_entity(self, entity_id: str) -> Dict[str, Any]:
-        for e in self.entities:
-            if e.get("entity_id") == entity_id:
-                return e
-        return {}
+        return self._by_id.get(entity_id, {})
+
+    def get_cached_state(self, entity_id: str) -> Optional[Dict[str, Any]]:
+        """Последнее известное состояние сущности без запроса к серверу"""
+        return self._states.get(entity_id)
 
     def control_entity(self, entity_id: str, service: str, data: Optional[Dict] = None):
         domain = entity_id.split('.')[0]
@@ -44,26 +164,40 @@ class EntityManager:
             "service_data": service_data
         })
 
-    def get_states(self, callback: Callable[[List[Dict[str, Any]]], None]):
-        self.ws.send_command("get_states", callback=callback)
+    def get_states(self, callback: Callable[[List[Dict[str, Any]]], None], refresh: bool = False):
+        """Состояния всех сущностей (из локального хранилища, refresh - перезагрузить)"""
+        def deliver():
+            with self._lock:
+                states = list(self._states.values())
+            callback(states)
+
+        if self._states_loaded and not refresh:
+            deliver()
+            return
+        self._load_states(on_loaded=deliver)
 
     def get_entity_state(self, entity_id: str, callback: Callable[[Optional[Dict[str, Any]]], None]):
+        state = self._states.get(entity_id)
+        if state is not None:
+            callback(state)
+            return
+
         if self.rest:
             try:
                 state = self.rest.get_state(entity_id)
+                if state:
+                    with self._lock:
+                        self._states[entity_id] = state
                 callback(state)
                 return
             except Exception:
                 pass
 
-        def on_states_loaded(states: List[Dict]):
-            for state in states:
-                if state.get("entity_id") == entity_id:
-                    callback(state)
-                    return
+        if self._states_loaded:
+            # Состояния загружены и обновляются событиями: сущности нет
             callback(None)
-
-        self.get_states(callback=on_states_loaded)
+            return
+        self._load_states(on_loaded=lambda: callback(self._states.get(entity_id)))
 
     def update_sensor(self, entity_id: str) -> bool:
         if self.rest:
@@ -77,3 +211,23 @@ class EntityManager:
             return True
         except Exception:
             return False
+
+    def update_sensors(self, entity_ids: List[str], timeout: float = 30.0) -> Future:
+        """Обновление нескольких сущностей одним вызовом update_entity
+
+        Future завершается, когда Home Assistant выполнил обновление; новые
+        состояния приходят событиями state_changed.
+        """
+        if self.ws.is_connected():
+            return self.ws.request("call_service", {
+                "domain": "homeassistant",
+                "service": "update_entity",
+                "service_data": {"entity_id": list(entity_ids)}
+            }, timeout=timeout)
+
+        future: Future = Future()
+        if self.rest:
+            future.set_result(self.rest.update_entities(entity_ids))
+        else:
+            future.set_exception(ConnectionError("нет соединения с Home Assistant"))
+        return future
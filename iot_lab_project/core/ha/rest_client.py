@@ -1,4 +1,5 @@
 import requests
+from typing import List
 from urllib.parse import urljoin
 
 
@@ -31,3 +32,16 @@ class HomeAssistantRestClient:
         except Exception as e:
             print(f"[REST] Ошибка при обновлении {entity_id}: {e}")
             return False
+
+    def update_entities(self, entity_ids: List[str]) -> bool:
+        """Отправить одну команду обновления для нескольких сущностей"""
+        try:
+            url = urljoin(
+                self.base_url, "/api/services/homeassistant/update_entity")
+            payload = {"entity_id": list(entity_ids)}
+            resp = requests.post(
+                url, json=payload, headers=self.headers, timeout=30)
+            return resp.status_code == 200
+        except Exception as e:
+            print(f"[REST] Ошибка при обновлении {len(entity_ids)} сущностей: {e}")
+            return False
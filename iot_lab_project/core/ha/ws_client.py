@@ -1,14 +1,51 @@
 import asyncio
 import json
+import random
+import time
 import websockets
 import threading
-from typing import Callable, Dict, Any, Optional
+from concurrent.futures import Future
+from typing import Callable, Dict, Any, List, Optional
 from core.logger import get_logger
 
 text_logger = get_logger()
 
+# Время ожидания ответа на команду, секунды
+REQUEST_TIMEOUT = 10.0
+
+# Переподключение: начальная и максимальная задержка, секунды
+RECONNECT_DELAY = 1.0
+RECONNECT_MAX_DELAY = 60.0
+
+# Проверка соединения (ping/pong): период и время ожидания ответа, секунды
+HEARTBEAT_INTERVAL = 30.0
+HEARTBEAT_TIMEOUT = 10.0
+
+
+class HomeAssistantWSError(Exception):
+    """Ошибка, возвращенная Home Assistant в ответ на команду"""
+
+    def __init__(self, code: str, message: str):
+        super().__init__(f"{code}: {message}")
+        self.code = code
+        self.message = message
+
+
+class HomeAssistantAuthError(Exception):
+    """Неверный токен доступа (переподключение бессмысленно)"""
+
 
 class HomeAssistantWSClient:
+    """WebSocket клиент Home Assistant
+
+    Соединение обслуживается в отдельном потоке с циклом asyncio. При обрыве
+    клиент переподключается с экспоненциальной задержкой, заново проходит
+    авторизацию и восстанавливает подписки на события. Команды возвращают
+    Future, который завершается ответом, ошибкой Home Assistant, обрывом
+    соединения или по таймауту. На одно событие можно подписать несколько
+    обработчиков. Обработчики и колбэки вызываются в потоке клиента.
+    """
+
     _instance = None
 
     @staticmethod
@@ -29,95 +66,316 @@ class HomeAssistantWSClient:
         self.token = token
         self._ws = None
         self._id_counter = 1
-        self._pending: Dict[int, Callable[[Any], None]] = {}
-        self._events: Dict[str, Callable[[Dict[str, Any]], None]] = {}
+        # ID команды -> (Future, таймер таймаута)
+        self._pending: Dict[int, tuple] = {}
+        self._events: Dict[str, List[Callable[[Dict[str, Any]], None]]] = {}
+        self._events_lock = threading.Lock()
+        # События, на которые подписано текущее соединение
+        self._subscribed: set = set()
+        self._connection_listeners: List[Callable[[bool], None]] = []
+        self._connected_event = threading.Event()
+        self._closed = False
+        self._heartbeat_task: Optional[asyncio.Future] = None
+
+        # Метрики соединения
+        self.connects = 0
+        self.reconnects = 0
+        self.timeouts = 0
+        self.latency_ms: Optional[float] = None
+        self.last_error: Optional[str] = None
+
         self._loop = asyncio.new_event_loop()
-        self._connected = False
         self._thread = threading.Thread(target=self._start_loop, daemon=True)
         self._thread.start()
 
     def _start_loop(self):
         asyncio.set_event_loop(self._loop)
         try:
-            self._loop.run_until_complete(self._connect())
-            self._loop.run_forever()
+            self._loop.run_until_complete(self._run())
         except Exception as e:
             text_logger.error(f"[WS] Ошибка в loop: {e}")
+        finally:
+            self._loop.close()
+
+    async def _run(self):
+        """Подключение и переподключение до закрытия клиента"""
+        attempt = 0
+        while not self._closed:
+            try:
+                await self._connect()
+                attempt = 0
+                await self._listen()
+            except HomeAssistantAuthError as e:
+                self.last_error = str(e)
+                text_logger.error(f"[WS] Ошибка авторизации: {e}")
+                break
+            except Exception as e:
+                if self._closed:
+                    break
+                self.last_error = str(e)
+                text_logger.error(f"[WS] Соединение потеряно: {e}")
+            finally:
+                await self._disconnected()
+
+            if self._closed:
+                break
+            delay = min(RECONNECT_MAX_DELAY, RECONNECT_DELAY * 2 ** attempt)
+            delay *= random.uniform(0.8, 1.2)
+            attempt += 1
+            text_logger.info(f"[WS] Переподключение через {delay:.1f} с")
+            await asyncio.sleep(delay)
 
     async def _connect(self):
-        try:
-            text_logger.info(f"[WS] Подключение к {self.url}")
-            self._ws = await websockets.connect(self.url)
-            await self._authorize()
-            self._connected = True
-            asyncio.create_task(self._listen())
-            text_logger.success("[WS] Соединение установлено")
-        except Exception as e:
-            self._connected = False
-            text_logger.error(f"[WS] Ошибка подключения: {e}")
+        text_logger.info(f"[WS] Подключение к {self.url}")
+        # Проверка соединения выполняется сообщениями ping Home Assistant,
+        # список состояний может превышать стандартный лимит сообщения
+        self._ws = await websockets.connect(self.url, ping_interval=None, max_size=None)
+        await self._authorize()
+
+        if self.connects:
+            self.reconnects += 1
+        self.connects += 1
+        self._connected_event.set()
+        text_logger.success("[WS] Соединение установлено")
+
+        # Подписки восстанавливаются после каждого подключения
+        with self._events_lock:
+            event_types = list(self._events)
+        for event_type in event_types:
+            self._subscribe(event_type)
+        self._heartbeat_task = asyncio.ensure_future(self._heartbeat(self._ws))
+        self._notify_connection(True)
 
     async def _authorize(self):
-        try:
-            await self._ws.recv()
-            await self._ws.send(json.dumps({"type": "auth", "access_token": self.token}))
-            await self._ws.recv()
-            text_logger.success("[WS] Авторизация прошла успешно")
-        except Exception as e:
-            text_logger.error(f"[WS] Ошибка авторизации: {e}")
-            raise
+        await self._ws.recv()
+        await self._ws.send(json.dumps({"type": "auth", "access_token": self.token}))
+        reply = json.loads(await self._ws.recv())
+        if reply.get("type") == "auth_invalid":
+            raise HomeAssistantAuthError(reply.get("message", "неверный токен"))
+        if reply.get("type") != "auth_ok":
+            raise ConnectionError(f"неожиданный ответ авторизации: {reply.get('type')}")
+        text_logger.success("[WS] Авторизация прошла успешно")
 
-    async def _listen(self):
-        while self._connected:
+    async def _disconnected(self):
+        """Сброс соединения: ожидающие команды завершаются ошибкой"""
+        was_connected = self._connected_event.is_set()
+        self._connected_event.clear()
+        ws, self._ws = self._ws, None
+        self._subscribed.clear()
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+            self._heartbeat_task = None
+        if ws is not None:
             try:
-                msg = await self._ws.recv()
-                data = json.loads(msg)
+                await ws.close()
+            except Exception:
+                pass
+
+        pending, self._pending = self._pending, {}
+        for future, timer in pending.values():
+            timer.cancel()
+            if not future.done():
+                future.set_exception(ConnectionError("соединение с Home Assistant потеряно"))
+        if was_connected:
+            self._notify_connection(False)
+
+    async def _listen(self):
+        ws = self._ws
+        while not self._closed:
+            data = json.loads(await ws.recv())
+            msg_type = data.get("type")
 
-                if data.get("type") == "result" and "id" in data:
-                    cb = self._pending.pop(data["id"], None)
-                    if cb:
-                        cb(data.get("result"))
+            if msg_type in ("result", "pong") and "id" in data:
+                entry = self._pending.pop(data["id"], None)
+                if entry is None:
+                    continue
+                future, timer = entry
+                timer.cancel()
+                if future.done():
+                    continue
+                if msg_type == "pong" or data.get("success", True):
+                    future.set_result(data.get("result"))
+                else:
+                    error = data.get("error") or {}
+                    future.set_exception(HomeAssistantWSError(
+                        error.get("code", "unknown_error"), error.get("message", "")))
 
-                elif data.get("type") == "event":
-                    event_type = data["event"].get("event_type")
-                    handler = self._events.get(event_type)
-                    if handler:
-                        handler(data["event"])
+            elif msg_type == "event":
+                event = data.get("event", {})
+                with self._events_lock:
+                    handlers = list(self._events.get(event.get("event_type"), ()))
+                for handler in handlers:
+                    try:
+                        handler(event)
+                    except Exception as e:
+                        text_logger.error(f"[WS] Ошибка обработчика события: {e}")
 
+    async def _heartbeat(self, ws):
+        """Периодический ping с замером задержки; без ответа соединение рвется"""
+        while not self._closed and self._ws is ws:
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            if self._ws is not ws:
+                break
+            started = time.monotonic()
+            future = self._request_nowait("ping", timeout=HEARTBEAT_TIMEOUT)
+            try:
+                await asyncio.wrap_future(future)
+                self.latency_ms = round((time.monotonic() - started) * 1000, 1)
             except Exception as e:
-                self._connected = False
-                text_logger.error(f"[WS] Ошибка прослушивания: {e}")
+                if self._ws is ws:
+                    text_logger.warning(f"[WS] Нет ответа на ping: {e}")
+                    await ws.close()
                 break
 
-    def send_command(self, command_type: str, payload: Optional[Dict] = None,
-                     callback: Optional[Callable[[Any], None]] = None):
-        if not self._connected or not self._ws:
-            text_logger.warning(
-                "[WS] Попытка отправки команды без соединения.")
-            return
+    def _request_nowait(self, command_type: str, payload: Optional[Dict] = None,
+                        timeout: float = REQUEST_TIMEOUT,
+                        future: Optional[Future] = None) -> Future:
+        """Отправка команды из потока клиента"""
+        future = future or Future()
+        if self._ws is None:
+            future.set_exception(ConnectionError("нет соединения с Home Assistant"))
+            return future
 
-        asyncio.run_coroutine_threadsafe(
-            self._send(command_type, payload, callback),
-            self._loop
-        )
-
-    async def _send(self, command_type: str, payload: Optional[Dict],
-                    callback: Optional[Callable[[Any], None]]):
         msg_id = self._id_counter
         self._id_counter += 1
         msg = {"id": msg_id, "type": command_type}
         if payload:
             msg.update(payload)
-        if callback:
-            self._pending[msg_id] = callback
+        timer = self._loop.call_later(timeout, self._expire, msg_id)
+        self._pending[msg_id] = (future, timer)
+        asyncio.ensure_future(self._send(self._ws, msg_id, msg))
+        return future
+
+    async def _send(self, ws, msg_id: int, msg: Dict[str, Any]):
         try:
-            await self._ws.send(json.dumps(msg))
+            await ws.send(json.dumps(msg))
         except Exception as e:
             text_logger.error(f"[WS] Ошибка отправки: {e}")
-            self._pending.pop(msg_id, None)
+            entry = self._pending.pop(msg_id, None)
+            if entry:
+                entry[1].cancel()
+                if not entry[0].done():
+                    entry[0].set_exception(e)
+
+    def _expire(self, msg_id: int):
+        entry = self._pending.pop(msg_id, None)
+        if entry and not entry[0].done():
+            self.timeouts += 1
+            entry[0].set_exception(TimeoutError("нет ответа от Home Assistant"))
+
+    def request(self, command_type: str, payload: Optional[Dict] = None,
+                timeout: float = REQUEST_TIMEOUT) -> Future:
+        """Команда Home Assistant; Future завершается результатом или ошибкой
+
+        Не ожидайте результат в обработчиках событий и колбэках: они
+        выполняются в потоке клиента.
+        """
+        if self._closed or not self.is_connected():
+            future: Future = Future()
+            future.set_exception(ConnectionError("нет соединения с Home Assistant"))
+            return future
+
+        future = Future()
+        self._loop.call_soon_threadsafe(
+            self._request_nowait, command_type, payload, timeout, future)
+        return future
+
+    def send_command(self, command_type: str, payload: Optional[Dict] = None,
+                     callback: Optional[Callable[[Any], None]] = None) -> Future:
+        """Команда с колбэком; при ошибке колбэк получает None"""
+        if not self.is_connected():
+            text_logger.warning(
+                "[WS] Попытка отправки команды без соединения.")
+
+        future = self.request(command_type, payload)
+
+        def on_done(f: Future):
+            error = f.exception()
+            if error is not None and not isinstance(error, ConnectionError):
+                text_logger.warning(f"[WS] Команда {command_type} не выполнена: {error}")
+            if callback:
+                try:
+                    callback(None if error is not None else f.result())
+                except Exception as e:
+                    text_logger.error(f"[WS] Ошибка в колбэке {command_type}: {e}")
+
+        future.add_done_callback(on_done)
+        return future
 
     def subscribe_event(self, event_type: str, handler: Callable[[Dict[str, Any]], None]):
-        self._events[event_type] = handler
-        self.send_command("subscribe_events", {"event_type": event_type})
+        """Добавление обработчика события (подписка сохраняется при переподключении)"""
+        with self._events_lock:
+            handlers = self._events.setdefault(event_type, [])
+            handlers.append(handler)
+        if self.is_connected():
+            self._loop.call_soon_threadsafe(self._subscribe, event_type)
+
+    def _subscribe(self, event_type: str):
+        """Подписка текущего соединения на событие (один раз на тип)"""
+        if event_type in self._subscribed or self._ws is None:
+            return
+        self._subscribed.add(event_type)
+
+        def on_done(f: Future):
+            if f.exception() is not None:
+                self._subscribed.discard(event_type)
+                text_logger.warning(f"[WS] Не удалось подписаться на {event_type}: {f.exception()}")
+
+        self._request_nowait("subscribe_events", {"event_type": event_type}).add_done_callback(on_done)
+
+    def unsubscribe_event(self, event_type: str, handler: Callable[[Dict[str, Any]], None]):
+        """Удаление обработчика события (подписка на сервере остается)"""
+        with self._events_lock:
+            handlers = self._events.get(event_type, [])
+            if handler in handlers:
+                handlers.remove(handler)
+
+    def add_connection_listener(self, listener: Callable[[bool], None]):
+        """Уведомление об установке (True) и потере (False) соединения"""
+        self._connection_listeners.append(listener)
+
+    def _notify_connection(self, connected: bool):
+        for listener in list(self._connection_listeners):
+            try:
+                listener(connected)
+            except Exception as e:
+                text_logger.error(f"[WS] Ошибка обработчика соединения: {e}")
+
+    def wait_connected(self, timeout: Optional[float] = None) -> bool:
+        """Ожидание соединения (без опроса)"""
+        return self._connected_event.wait(timeout)
 
     def is_connected(self) -> bool:
-        return self._connected and self._ws is not None
+        return self._connected_event.is_set() and self._ws is not None
+
+    def close(self):
+        """Закрытие соединения без переподключения"""
+        if self._closed:
+            return
+        self._closed = True
+
+        async def shutdown():
+            if self._ws is not None:
+                await self._ws.close()
+
+        if self._loop.is_running():
+            asyncio.run_coroutine_threadsafe(shutdown(), self._loop)
+        if HomeAssistantWSClient._instance is self:
+            HomeAssistantWSClient._instance = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Метрики соединения"""
+        with self._events_lock:
+            subscriptions = {event_type: len(handlers)
+                             for event_type, handlers in self._events.items()}
+        return {
+            "connected": self.is_connected(),
+            "connects": self.connects,
+            "reconnects": self.reconnects,
+            "pending": len(self._pending),
+            "timeouts": self.timeouts,
+            "latency_ms": self.latency_ms,
+            "subscriptions": subscriptions,
+            "last_error": self.last_error
+        }
+
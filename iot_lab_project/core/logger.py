@@ -1,7 +1,58 @@
+import os
+import html
+import logging
+from collections import deque
 from datetime import datetime
+from logging.handlers import RotatingFileHandler
+from threading import Lock
+from typing import List, Optional, Tuple
+
+# Уровни записей журнала
+LEVELS = {"debug": 10, "info": 20, "success": 25, "warning": 30, "error": 40}
+
+# Иконки уровней в окне журнала
+ICONS = {"debug": "info", "info": "info", "success": "success",
+         "warning": "warning", "error": "error"}
+
+# Число хранимых записей
+LOG_CAPACITY = int(os.getenv("IOT_LAB_LOG_CAPACITY", "2000"))
+
+# Файл журнала (необязательно) и параметры его ротации
+LOG_FILE = os.getenv("IOT_LAB_LOG_FILE")
+LOG_FILE_MAX_BYTES = int(os.getenv("IOT_LAB_LOG_FILE_MAX_BYTES", str(1024 * 1024)))
+LOG_FILE_BACKUPS = int(os.getenv("IOT_LAB_LOG_FILE_BACKUPS", "3"))
+
+
+class LogRecord:
+    """Запись журнала"""
+
+    __slots__ = ("seq", "time", "level", "message")
+
+    def __init__(self, seq: int, time: datetime, level: str, message: str):
+        self.seq = seq
+        self.time = time
+        self.level = level
+        self.message = message
+
+    def to_html(self) -> str:
+        """HTML-строка записи для окна журнала (переводы строк сохраняются)"""
+        icon_html = (f'<img src=":/icon/icons/{ICONS[self.level]}.png" '
+                     f'width="16" height="16" style="vertical-align:middle;">')
+        message = html.escape(self.message).replace("\n", "<br/>")
+        return f"[{self.time.strftime('%H:%M:%S')}] {icon_html} {message}"
+
+    def to_text(self) -> str:
+        return f"{self.time.isoformat(sep=' ', timespec='seconds')} {self.level.upper():7} {self.message}"
 
 
 class Logger:
+    """Журнал приложения
+
+    Записи хранятся в кольцевом буфере фиксированного размера, HTML строится
+    только при показе. Окно журнала запрашивает записи после последней
+    показанной (records_since) и дописывает их, не перерисовывая журнал целиком.
+    """
+
     _instance = None
 
     def __new__(cls, *args, **kwargs):
@@ -11,23 +62,91 @@ class Logger:
         return cls._instance
 
     def _init_internal(self):
-        self.text_log = []
+        self._lock = Lock()
+        self._records = deque(maxlen=LOG_CAPACITY)
+        self._seq = 0
+        # Записи ниже этого уровня не сохраняются
+        self.level = LEVELS["debug"]
+        self._file_logger: Optional[logging.Logger] = None
+        if LOG_FILE:
+            self.set_file_sink(LOG_FILE)
+
+    @property
+    def capacity(self) -> int:
+        return self._records.maxlen
 
     def info(self, message: str): self._add("info", message)
     def warning(self, message: str): self._add("warning", message)
     def error(self, message: str): self._add("error", message)
     def success(self, message: str): self._add("success", message)
+    def debug(self, message: str): self._add("debug", message)
+
+    def set_level(self, level: str):
+        """Минимальный уровень сохраняемых записей"""
+        self.level = LEVELS[level]
+
+    def set_file_sink(self, path: Optional[str], max_bytes: int = LOG_FILE_MAX_BYTES,
+                      backup_count: int = LOG_FILE_BACKUPS):
+        """Дублирование записей в файл с ротацией (None - отключить)"""
+        with self._lock:
+            if self._file_logger:
+                for handler in self._file_logger.handlers[:]:
+                    handler.close()
+                    self._file_logger.removeHandler(handler)
+                self._file_logger = None
+            if not path:
+                return
+
+            handler = RotatingFileHandler(
+                path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            file_logger = logging.getLogger("iot_lab.client")
+            file_logger.propagate = False
+            file_logger.setLevel(logging.DEBUG)
+            file_logger.addHandler(handler)
+            self._file_logger = file_logger
+
+    def _add(self, level: str, message: str):
+        if LEVELS[level] < self.level:
+            return
+        with self._lock:
+            self._seq += 1
+            record = LogRecord(self._seq, datetime.now(), level, str(message))
+            self._records.append(record)
+            file_logger = self._file_logger
+        if file_logger:
+            file_logger.info(record.to_text())
+
+    def records_since(self, seq: int, min_level: str = "debug") -> Tuple[int, List[LogRecord], bool]:
+        """Записи после seq: (номер последней записи, записи, нужен сброс окна)
 
-    def debug(self, message: str): self._add(
-        "info", message)  # Добавляем метод debug
+        Сброс нужен, если часть записей после seq уже вытеснена из буфера.
+        """
+        threshold = LEVELS[min_level]
+        with self._lock:
+            last = self._seq
+            if seq >= last:
+                return last, [], False
+            first = self._records[0].seq if self._records else last + 1
+            reset = seq < first - 1
+            # Новые записи находятся в конце буфера
+            records = []
+            for record in reversed(self._records):
+                if record.seq <= seq:
+                    break
+                if LEVELS[record.level] >= threshold:
+                    records.append(record)
+        records.reverse()
+        return last, records, reset
 
-    def _add(self, icon: str, message: str):
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        icon_html = f'<img src=":/icon/icons/{icon}.png" width="16" height="16" style="vertical-align:middle;">'
-        self.text_log.append(f"[{timestamp}] {icon_html} {message}<br/>")
+    def get_text_log(self, min_level: str = "debug") -> str:
+        """Весь журнал в HTML"""
+        _, records, _ = self.records_since(0, min_level)
+        return "".join(f"{record.to_html()}<br/>" for record in records)
 
-    def get_text_log(self) -> str:
-        return "".join(self.text_log)
+    def clear(self):
+        with self._lock:
+            self._records.clear()
 
 
 def get_logger() -> Logger:
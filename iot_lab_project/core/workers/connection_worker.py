@@ -45,12 +45,12 @@ class ConnectionWorker(BaseWorker):
         rest_url = _rest_url(self.raw_url)
         ws_client = HomeAssistantWSClient.init(ws_url, self.token)
 
+        # Ожидание соединения по событию клиента (с проверкой отмены)
         for _ in range(15):
             if self._abort:
                 return
-            if ws_client.is_connected():
+            if ws_client.wait_connected(0.3):
                 break
-            self.msleep(300)
         else:
             self.connection_failed.emit("Не удалось подключиться к WebSocket.")
             return
@@ -66,6 +66,7 @@ class ConnectionWorker(BaseWorker):
                 self.logger.info(f"[HA] Обновление: {entity_id}")
                 self.state_changed.emit(entity_id, new_state)
 
-        ws_client.subscribe_event("state_changed", on_state_change)
+        # Локальные состояния сущностей обновляются раньше подписчиков
+        entity_manager.add_state_listener(on_state_change)
         self.connection_success.emit(
             ws_client, rest_client, entity_manager, device_manager, ws_url)
@@ -3,9 +3,23 @@ from typing import List, Dict, Optional
 from core.workers.base_worker import BaseWorker
 from core.ha.entity_manager import EntityManager
 
+# Домены сущностей, обновляемых перед чтением состояния
+SENSOR_DOMAINS = ("sensor", "binary_sensor")
+
+# Время ожидания пакетного обновления датчиков, секунды
+REFRESH_TIMEOUT = 30.0
+
 
 class StateLoaderThread(BaseWorker):
+    """Загрузка состояний сущностей с предварительным обновлением датчиков
+
+    Датчики обновляются одним вызовом update_entity для всех сущностей.
+    Изменившиеся состояния передаются сигналом state_received по мере
+    поступления событий, итоговый набор - сигналом states_loaded.
+    """
+
     states_loaded = Signal(dict)
+    state_received = Signal(str, dict)
 
     def __init__(self, entity_manager: EntityManager, entity_ids: Optional[List[str]] = None):
         super().__init__()
@@ -16,13 +30,10 @@ class StateLoaderThread(BaseWorker):
         self.run_safe(self._task)
 
     def _task(self):
-        if self.entity_ids:
-            for entity_id in self.entity_ids:
-                domain = entity_id.split('.')[0]
-                if domain in ["sensor", "binary_sensor"]:
-                    self.entity_manager.update_sensor(entity_id)
-
-        self.msleep(500)
+        sensors = [entity_id for entity_id in self.entity_ids or []
+                   if entity_id.split('.')[0] in SENSOR_DOMAINS]
+        if sensors:
+            self._refresh_sensors(sensors)
 
         if self.entity_ids and len(self.entity_ids) == 1:
             entity_id = self.entity_ids[0]
@@ -42,3 +53,23 @@ class StateLoaderThread(BaseWorker):
                 self.states_loaded.emit(state_map)
 
         self.entity_manager.get_states(callback=on_states_loaded)
+
+    def _refresh_sensors(self, sensors: List[str]):
+        """Пакетное обновление датчиков с передачей новых состояний по мере прихода"""
+        waiting = set(sensors)
+
+        def on_state_change(event):
+            data = event.get("data", {})
+            entity_id = data.get("entity_id")
+            new_state = data.get("new_state")
+            if new_state and entity_id in waiting:
+                waiting.discard(entity_id)
+                self.state_received.emit(entity_id, new_state)
+
+        self.entity_manager.add_state_listener(on_state_change)
+        try:
+            self.entity_manager.update_sensors(sensors, timeout=REFRESH_TIMEOUT).result(REFRESH_TIMEOUT)
+        except Exception as e:
+            self.logger.warning(f"[HA] Не удалось обновить датчики ({len(sensors)}): {e}")
+        finally:
+            self.entity_manager.remove_state_listener(on_state_change)
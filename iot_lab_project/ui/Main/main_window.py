@@ -1,7 +1,8 @@
 from PySide6.QtWidgets import (
     QMainWindow, QPushButton, QFrame, QDialog, QMessageBox, QTabWidget,
-    QTableWidgetItem
+    QTableWidgetItem, QComboBox, QHBoxLayout, QLabel
 )
+from PySide6.QtGui import QTextCursor
 from PySide6.QtGui import QIcon
 from PySide6.QtCore import Qt, QTimer, QSettings
 from ui.Main.main_ui import Ui_MainWindow
@@ -18,8 +19,9 @@ from ui.panels.lab.lab_results_panel import LabResultsPanel
 from core.logger import get_logger
 from core.api import api_client
 from core.api.api_worker import (
-    GetDevicesWorker, GetDeviceWorker, SendDeviceCommandWorker
+    GetDeviceWorker, SendDeviceCommandWorker
 )
+from core.api.task_pool import task_pool, PRIORITY_USER
 from core.booking import booking_manager
 from core.permissions import has_permission, Permission, get_role_label
 import websocket
@@ -38,7 +40,6 @@ class MainWindow(QMainWindow):
         self.ws_thread = None
         self.entity_widgets = {}
         self._last_tabbar_state = None
-        self._workers = []  # Список для хранения рабочих потоков
 
         self.ui = Ui_MainWindow()
         self.ui.setupUi(self)
@@ -57,6 +58,8 @@ class MainWindow(QMainWindow):
             QTimer.singleShot(500, self._start_websocket)
 
     def _init_ui(self):
+        self._init_logs_view()
+
         self.devices_panel = DevicesPanel()
         self.ui.layoutDeviceList.setContentsMargins(0, 0, 0, 0)
         self.ui.layoutDeviceList.addWidget(self.devices_panel)
@@ -450,82 +453,9 @@ class MainWindow(QMainWindow):
 
         self.logger.info("Загрузка устройств...")
         self._refresh_logs()
-        self.devices_panel.clear_devices()
-        self.devices_panel.show_loading_indicator("Загрузка устройств...")
-
-        # Используем API Worker для асинхронной загрузки
-        worker = GetDevicesWorker(api_client)
-        worker.result_ready.connect(self._on_devices_loaded)
-        worker.error_occurred.connect(self._show_error)
-        self._workers.append(worker)  # Сохраняем ссылку на поток
-        worker.start()
-
-    def _on_devices_loaded(self, devices):
-        """Обработка загруженных устройств"""
-        if not devices:
-            self.devices_panel.clear_devices()
-            self.logger.error("Не удалось загрузить устройства")
-            return
-
-        # Преобразуем устройства в формат, понятный для DevicesPanel
-        categorized_devices = self._categorize_devices(devices)
-
-        # Обновляем панель устройств
-        self.devices_panel.update_devices(categorized_devices)
-        self.logger.success("Устройства успешно загружены")
-        self._refresh_logs()
-
-    def _categorize_devices(self, devices):
-        """Категоризация устройств"""
-        categories = {
-            "Датчики": [],
-            "Исполнительные устройства": [],
-            "Системные": [],
-            "Прочее": []
-        }
-
-        for device_id, device in devices.items():
-            # Добавляем ID устройства в данные
-            device_data = dict(device)
-            device_data["id"] = device_id
-
-            # Определяем категорию устройства
-            category = self._determine_device_category(device_data)
-            categories[category].append(device_data)
 
-        return categories
-
-    def _determine_device_category(self, device):
-        """Определение категории устройства"""
-        # Проверяем по модели
-        model = (device.get("model") or "").lower()
-        name = (device.get("name") or "").lower()
-
-        # Проверяем по типу устройства
-        if "sensor" in model or "temp" in model or "hum" in model or "motion" in model:
-            return "Датчики"
-
-        if "switch" in model or "relay" in model or "light" in model or "plug" in model:
-            return "Исполнительные устройства"
-
-        # Проверяем по имени
-        if "sensor" in name or "датчик" in name:
-            return "Датчики"
-
-        if "switch" in name or "relay" in name or "light" in name or "plug" in name:
-            return "Исполнительные устройства"
-
-        # Проверяем по состоянию
-        state = device.get("state", {})
-        if isinstance(state, dict):
-            if "temperature" in state or "humidity" in state or "motion" in state:
-                return "Датчики"
-
-            if "state" in state and state["state"] in ["ON", "OFF"]:
-                return "Исполнительные устройства"
-
-        # По умолчанию
-        return "Прочее"
+        # Панель запрашивает только изменения с момента прошлой синхронизации
+        self.devices_panel.refresh_devices(PRIORITY_USER)
 
     def _open_device_dialog(self, device):
         """Открытие диалога устройства"""
@@ -537,7 +467,6 @@ class MainWindow(QMainWindow):
         worker.result_ready.connect(
             lambda device_info: self._show_device_dialog(device_info))
         worker.error_occurred.connect(self._show_error)
-        self._workers.append(worker)  # Сохраняем ссылку на поток
         worker.start()
 
     def _show_device_dialog(self, device_info):
@@ -654,7 +583,6 @@ class MainWindow(QMainWindow):
         worker.result_ready.connect(
             lambda success: self._on_command_sent(success, device_id, command))
         worker.error_occurred.connect(self._show_error)
-        self._workers.append(worker)  # Сохраняем ссылку на поток
         worker.start()
 
     def _on_command_sent(self, success, device_id, command):
@@ -667,11 +595,55 @@ class MainWindow(QMainWindow):
 
         self._refresh_logs()
 
+    def _init_logs_view(self):
+        """Окно журнала: фильтр уровня и ограничение числа строк"""
+        # Номер последней показанной записи журнала
+        self._log_seq = 0
+        self._log_level = "debug"
+
+        filter_layout = QHBoxLayout()
+        filter_layout.addWidget(QLabel("Уровень:"))
+        self.log_level_combo = QComboBox()
+        for title, level in (("Все", "debug"), ("Информация", "info"),
+                             ("Предупреждения", "warning"), ("Ошибки", "error")):
+            self.log_level_combo.addItem(title, level)
+        self.log_level_combo.currentIndexChanged.connect(self._on_log_level_changed)
+        filter_layout.addWidget(self.log_level_combo)
+        filter_layout.addStretch()
+        self.ui.verticalLayoutLogs.insertLayout(0, filter_layout)
+
+        # Окно хранит не больше строк, чем буфер журнала
+        self.ui.textEditLogs.document().setMaximumBlockCount(self.logger.capacity)
+
+        # Записи из рабочих потоков показываются без отдельного вызова
+        self._logs_timer = QTimer(self)
+        self._logs_timer.setInterval(1000)
+        self._logs_timer.timeout.connect(self._refresh_logs)
+        self._logs_timer.start()
+
+    def _on_log_level_changed(self, index: int):
+        """Смена уровня: журнал показывается заново с новым фильтром"""
+        self._log_level = self.log_level_combo.itemData(index)
+        self._log_seq = 0
+        self.ui.textEditLogs.clear()
+        self._refresh_logs()
+
     def _refresh_logs(self):
-        self.ui.textEditLogs.setHtml(self.logger.get_text_log())
-        self.ui.textEditLogs.verticalScrollBar().setValue(
-            self.ui.textEditLogs.verticalScrollBar().maximum()
-        )
+        """Дописывание в окно журнала только новых записей"""
+        seq, records, reset = self.logger.records_since(self._log_seq, self._log_level)
+        if reset:
+            self.ui.textEditLogs.clear()
+        self._log_seq = seq
+        if not records:
+            return
+
+        scroll = self.ui.textEditLogs.verticalScrollBar()
+        at_bottom = scroll.value() >= scroll.maximum() - 4
+        for record in records:
+            self.ui.textEditLogs.append(record.to_html())
+        if at_bottom:
+            self.ui.textEditLogs.moveCursor(QTextCursor.End)
+            scroll.setValue(scroll.maximum())
 
     def _logout(self):
         # Закрываем WebSocket соединение
@@ -740,22 +712,8 @@ class MainWindow(QMainWindow):
         # Очищаем рабочие потоки менеджера бронирования
         booking_manager.cleanup_workers()
 
-        # Останавливаем все активные потоки API
-        for worker in getattr(self, "_workers", []):
-            if worker.isRunning():
-                worker.quit()
-                worker.wait(1000)
-                if worker.isRunning():
-                    worker.terminate()
-
-        # Очищаем потоки устройств
-        if hasattr(self.devices_panel, "_workers"):
-            for worker in self.devices_panel._workers:
-                if worker.isRunning():
-                    worker.quit()
-                    worker.wait(1000)
-                    if worker.isRunning():
-                        worker.terminate()
+        # Снимаем запросы API с очереди и ждем выполняемые
+        task_pool.shutdown(1000)
 
         # Принимаем событие закрытия
         event.accept()
@@ -8,7 +8,8 @@ from ui.widgets.flow_layout import FlowLayout
 from ui.widgets.device_card import DeviceCard
 from core.logger import get_logger
 from core.api import api_client
-from core.api.api_worker import GetDevicesWorker
+from core.api.api_worker import GetDeviceChangesWorker
+from core.api.task_pool import PRIORITY_USER
 
 
 class DevicesPanel(QWidget):
@@ -18,8 +19,17 @@ class DevicesPanel(QWidget):
         super().__init__(parent)
         self.devices_by_category = {}
         self.categories = []
+        # Локальная копия устройств и курсор синхронизации с сервером
+        self._devices = {}
+        self._sync_seq = None
+        # Реестр карточек: ID устройства -> карточка (переиспользуются между
+        # обновлениями и переключениями категорий)
+        self._cards = {}
+        # entity_id -> ID устройства для обновлений состояния по сущности
+        self._entity_index = {}
+        # ID устройств, карточки которых сейчас показаны (в порядке показа)
+        self._shown = None
         self.logger = get_logger()
-        self._workers = []  # Список для хранения рабочих потоков
         self._build_ui()
 
         # Запускаем таймер для отложенной загрузки устройств
@@ -42,7 +52,7 @@ class DevicesPanel(QWidget):
 
         # Кнопка обновления
         refresh_btn = QPushButton("Обновить устройства")
-        refresh_btn.clicked.connect(self.refresh_devices)
+        refresh_btn.clicked.connect(lambda: self.refresh_devices(PRIORITY_USER))
         panel_layout.addWidget(refresh_btn)
 
         self.scroll_area = QScrollArea()
@@ -56,31 +66,63 @@ class DevicesPanel(QWidget):
         panel_layout.addWidget(self.scroll_area)
         layout.addWidget(self.panel)
 
-    def refresh_devices(self):
-        """Обновление списка устройств"""
-        try:
-            # Показываем индикатор загрузки
-            self.clear_devices()
-            self.show_loading_indicator("Загрузка устройств...")
+    def refresh_devices(self, priority=None):
+        """Обновление списка устройств (запрашиваются только изменения с прошлой синхронизации)
 
+        По умолчанию запрос фоновый; обновление по кнопке передает PRIORITY_USER.
+        """
+        try:
             # Проверяем подключение к API
             if not api_client.is_connected():
                 self.logger.warning("Нет активного подключения к API")
+                self._sync_seq = None
+                self.clear_devices()
                 self.show_loading_indicator("Нет подключения к серверу")
                 return
 
+            # Индикатор загрузки только при первой (полной) загрузке
+            if self._sync_seq is None:
+                self.clear_devices()
+                self.show_loading_indicator("Загрузка устройств...")
+
             # Используем API Worker для асинхронной загрузки
-            worker = GetDevicesWorker(api_client)
-            worker.result_ready.connect(self._on_devices_loaded)
+            worker = GetDeviceChangesWorker(api_client, self._sync_seq)
+            worker.result_ready.connect(self._on_changes_loaded)
             worker.error_occurred.connect(self._show_error)
-            self._workers.append(worker)  # Сохраняем ссылку на поток
-            worker.start()
+            worker.start(priority)
 
             self.logger.info("Запрос на получение устройств отправлен")
         except Exception as e:
             self.logger.error(f"Ошибка при запросе устройств: {e}")
             self.show_loading_indicator(f"Ошибка: {e}")
 
+    def _on_changes_loaded(self, changes):
+        """Применение изменений устройств к локальной копии"""
+        if not changes:
+            # Ошибка запроса: уже показанные устройства остаются на месте
+            if not self._devices:
+                self._on_devices_loaded(self._devices)
+            return
+
+        if changes.get("resync"):
+            self._devices = dict(changes.get("devices", {}))
+            changed = True
+        else:
+            updated = changes.get("devices", {})
+            removed = changes.get("removed", [])
+            self._devices.update(updated)
+            for device_id in removed:
+                self._devices.pop(device_id, None)
+            changed = bool(updated or removed)
+
+        self._sync_seq = changes.get("seq")
+
+        if not changed:
+            self.logger.info("Изменений устройств нет")
+            return
+
+        self._on_devices_loaded(self._devices)
+
     def _on_devices_loaded(self, devices):
         """Обработка загруженных устройств"""
         if not devices:
@@ -93,14 +135,11 @@ class DevicesPanel(QWidget):
         # Преобразуем устройства в формат, понятный для DevicesPanel
         categorized_devices = self._categorize_devices(devices)
 
-        # Обновляем панель устройств
+        # Обновляем панель устройств (карточки обновляются по разнице)
         self.update_devices(categorized_devices)
         self.logger.success(
             f"Устройства успешно загружены: {len(devices)} устройств")
 
-        # Очищаем завершенные рабочие потоки
-        self._cleanup_workers()
-
     def _categorize_devices(self, devices):
         """Категоризация устройств"""
         categories = {
@@ -155,9 +194,11 @@ class DevicesPanel(QWidget):
 
     def update_devices(self, categorized_devices: dict):
         """Обновить устройства, сгруппированные по категориям"""
-        self.logger.info(
-            f"Обновление панели устройств: получено {len(categorized_devices)} категорий")
         self.devices_by_category = categorized_devices
+        self._sync_cards(categorized_devices)
+
+        row = self.category_list.currentRow()
+        previous = self.categories[row] if 0 <= row < len(self.categories) else None
 
         # Определяем порядок категорий
         ordered_categories = []
@@ -176,23 +217,69 @@ class DevicesPanel(QWidget):
         if "Прочее" in categorized_devices and categorized_devices["Прочее"]:
             ordered_categories.append("Прочее")
 
-        self.categories = ordered_categories
-
-        self.category_list.clear()
-        for cat in self.categories:
-            icon = self._get_icon_for_category(cat)
-            item = QListWidgetItem(icon, cat)
-            self.category_list.addItem(item)
+        # Список категорий перестраивается только при изменении их набора
+        if ordered_categories != self.categories or self.category_list.count() != len(ordered_categories):
             self.logger.info(
-                f"Добавлена категория: {cat} с {len(categorized_devices[cat])} устройствами")
-
-        # Первая категория по умолчанию
+                f"Обновление панели устройств: получено {len(ordered_categories)} категорий")
+            self.categories = ordered_categories
+            self.category_list.blockSignals(True)
+            self.category_list.clear()
+            for cat in self.categories:
+                icon = self._get_icon_for_category(cat)
+                item = QListWidgetItem(icon, cat)
+                self.category_list.addItem(item)
+            self.category_list.blockSignals(False)
+
+        # Сохраняем выбранную категорию, иначе первая по умолчанию
         if self.categories:
-            self.category_list.setCurrentRow(0)
+            current = self.categories.index(previous) if previous in self.categories else 0
+            self.category_list.blockSignals(True)
+            self.category_list.setCurrentRow(current)
+            self.category_list.blockSignals(False)
+            self._show_category(current)
         else:
             self.logger.warning("Не получено ни одной категории устройств")
             self.show_loading_indicator("Нет доступных устройств")
 
+    def _sync_cards(self, categorized_devices: dict):
+        """Приведение реестра карточек к новому списку устройств
+
+        Новые устройства получают карточки, измененные обновляются на месте,
+        карточки исчезнувших устройств удаляются.
+        """
+        current = {}
+        for devices in categorized_devices.values():
+            for device in devices:
+                current[device["id"]] = device
+
+        added = updated = 0
+        for device_id, device in current.items():
+            card = self._cards.get(device_id)
+            if card is None:
+                card = DeviceCard(device, self.scroll_content)
+                card.hide()
+                card.clicked.connect(self.device_selected.emit)
+                self._cards[device_id] = card
+                added += 1
+            elif card.device != device:
+                card.set_device(device)
+                updated += 1
+
+        removed = [device_id for device_id in self._cards if device_id not in current]
+        if removed and self._shown and not set(removed).isdisjoint(self._shown):
+            self._clear()
+        for device_id in removed:
+            self._cards.pop(device_id).deleteLater()
+
+        self._entity_index = {
+            device["entity_id"]: device_id
+            for device_id, device in current.items() if device.get("entity_id")
+        }
+
+        if added or updated or removed:
+            self.logger.info(
+                f"Карточки устройств: добавлено {added}, обновлено {updated}, удалено {len(removed)}")
+
     def _get_icon_for_category(self, category: str) -> QIcon:
         # Прямое сопоставление категорий с иконками
         if category == "Системные":
@@ -220,17 +307,23 @@ class DevicesPanel(QWidget):
             return QIcon(":/icon/icons/other.png")
 
     def _show_category(self, index=None):
-        self._clear()
-
         if index is None or index < 0 or index >= len(self.categories):
+            self._clear()
             return
 
         category = self.categories[index]
-        devices = self.devices_by_category.get(category, [])
-        for device in devices:
-            card = DeviceCard(device)
-            card.clicked.connect(self.device_selected.emit)
+        device_ids = [device["id"] for device in self.devices_by_category.get(category, [])]
+
+        # Те же карточки в том же порядке уже показаны
+        if device_ids == self._shown:
+            return
+
+        self._clear()
+        for device_id in device_ids:
+            card = self._cards[device_id]
             self.flow_layout.addWidget(card)
+            card.show()
+        self._shown = device_ids
 
     def show_loading_indicator(self, message="Загрузка..."):
         self._clear()
@@ -243,34 +336,31 @@ class DevicesPanel(QWidget):
         self.flow_layout.addWidget(label)
 
     def clear_devices(self):
+        """Удаление всех карточек вместе с реестром"""
         self._clear()
+        for card in self._cards.values():
+            card.deleteLater()
+        self._cards.clear()
+        self._entity_index.clear()
 
     def _clear(self):
+        """Очистка области карточек: карточки скрываются для повторного использования"""
         while self.flow_layout.count():
             item = self.flow_layout.takeAt(0)
-            if item.widget():
-                item.widget().deleteLater()
+            widget = item.widget()
+            if isinstance(widget, DeviceCard):
+                widget.hide()
+            elif widget:
+                widget.deleteLater()
+        self._shown = None
 
     def update_device_state(self, device_id: str, state_data: dict):
-        """Обновляет состояние устройства по его ID"""
-        for i in range(self.flow_layout.count()):
-            widget = self.flow_layout.itemAt(i).widget()
-            if isinstance(widget, DeviceCard):
-                if widget.device.get("id") == device_id or widget.device.get("entity_id") == device_id:
-                    widget.update_state(state_data)
-                    break
+        """Обновляет состояние устройства по его ID (или entity_id)"""
+        card = self._cards.get(device_id) or self._cards.get(self._entity_index.get(device_id))
+        if card is not None:
+            card.update_state(state_data)
 
     def _show_error(self, error: str):
         """Отображение ошибки"""
         self.logger.error(f"Ошибка при загрузке устройств: {error}")
         self.show_loading_indicator(f"Ошибка: {error}")
-
-        # Очищаем завершенные рабочие потоки
-        self._cleanup_workers()
-
-    def _cleanup_workers(self):
-        """Очистка завершенных рабочих потоков"""
-        for worker in self._workers[:]:
-            if not worker.isRunning():
-                worker.deleteLater()
-                self._workers.remove(worker)
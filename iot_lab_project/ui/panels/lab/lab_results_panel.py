@@ -4,11 +4,11 @@ from PySide6.QtWidgets import (
     QComboBox, QSpinBox, QDoubleSpinBox, QLineEdit, QTextEdit,
     QDialog, QFormLayout, QFrame, QScrollArea
 )
-from PySide6.QtCore import Qt, Signal
+from PySide6.QtCore import Qt, Signal, QTimer
 from typing import Dict, List, Any, Optional
 from core.api import api_client
 from core.api.api_worker import (
-    GetLabsWorker, GetLabResultsWorker, GetLabResultWorker,
+    GetLabsWorker, GetLabResultsPageWorker, GetLabResultWorker,
     UpdateLabResultWorker, UpdateTaskResultWorker
 )
 from core.logger import get_logger
@@ -17,11 +17,27 @@ from core.logger import get_logger
 class LabResultsPanel(QWidget):
     """Панель для просмотра и оценки результатов выполнения лабораторных работ"""
 
+    # Размер страницы результатов
+    PAGE_SIZE = 50
+
+    # Столбцы таблицы, по которым сервер умеет сортировать
+    SORT_COLUMNS = {0: "student", 1: "status", 2: "submitted_at", 3: "score"}
+
     def __init__(self, parent=None):
         super().__init__(parent)
         self.logger = get_logger()
         self.selected_lab_id = None
 
+        # Параметры постраничной загрузки
+        self.page = 1
+        self.total_pages = 0
+        self.sort_by = "student"
+        self.sort_order = "asc"
+
+        # ФИО студентов, полученные вместе со страницами результатов
+        self.student_names: Dict[int, str] = {}
+        self._results_worker = None
+
         self._build_ui()
         self._load_labs()
 
@@ -50,6 +66,27 @@ class LabResultsPanel(QWidget):
         self.lab_combo.currentIndexChanged.connect(self._on_lab_selected)
         lab_selection.addWidget(self.lab_combo)
 
+        lab_selection.addWidget(QLabel("Статус:"))
+
+        self.status_filter = QComboBox()
+        self.status_filter.addItem("Все", None)
+        self.status_filter.addItem("В процессе", "in_progress")
+        self.status_filter.addItem("На проверке", "submitted")
+        self.status_filter.addItem("Проверено", "reviewed")
+        self.status_filter.currentIndexChanged.connect(self._on_filter_changed)
+        lab_selection.addWidget(self.status_filter)
+
+        self.search_edit = QLineEdit()
+        self.search_edit.setPlaceholderText("Поиск студента...")
+        lab_selection.addWidget(self.search_edit)
+
+        # Поиск выполняется после паузы в наборе, а не на каждый символ
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(400)
+        self.search_timer.timeout.connect(self._on_filter_changed)
+        self.search_edit.textChanged.connect(self.search_timer.start)
+
         lab_selection.addStretch()
 
         layout.addLayout(lab_selection)
@@ -61,8 +98,30 @@ class LabResultsPanel(QWidget):
         self.results_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
         self.results_table.setEditTriggers(QTableWidget.NoEditTriggers)
         self.results_table.setAlternatingRowColors(True)
+        self.results_table.horizontalHeader().setSortIndicatorShown(True)
+        self.results_table.horizontalHeader().setSortIndicator(0, Qt.AscendingOrder)
+        self.results_table.horizontalHeader().sectionClicked.connect(self._on_header_clicked)
         layout.addWidget(self.results_table)
 
+        # Навигация по страницам
+        pagination = QHBoxLayout()
+        pagination.addStretch()
+
+        self.prev_page_btn = QPushButton("< Назад")
+        self.prev_page_btn.setEnabled(False)
+        self.prev_page_btn.clicked.connect(lambda: self._change_page(-1))
+        pagination.addWidget(self.prev_page_btn)
+
+        self.page_label = QLabel("")
+        pagination.addWidget(self.page_label)
+
+        self.next_page_btn = QPushButton("Вперед >")
+        self.next_page_btn.setEnabled(False)
+        self.next_page_btn.clicked.connect(lambda: self._change_page(1))
+        pagination.addWidget(self.next_page_btn)
+
+        layout.addLayout(pagination)
+
     def _load_labs(self):
         """Загрузка списка лабораторных работ"""
         self.logger.info("Загрузка списка лабораторных работ")
@@ -102,9 +161,12 @@ class LabResultsPanel(QWidget):
         if index <= 0:
             self.selected_lab_id = None
             self.results_table.setRowCount(0)
+            self.page = 1
+            self._update_pagination(0, 0)
             return
 
         self.selected_lab_id = self.lab_combo.currentData()
+        self.page = 1
         self._load_results()
 
     def _load_results(self):
@@ -113,54 +175,51 @@ class LabResultsPanel(QWidget):
             return
 
         self.logger.info(
-            f"Загрузка результатов для лабораторной работы {self.selected_lab_id}")
+            f"Загрузка результатов для лабораторной работы {self.selected_lab_id}, страница {self.page}")
 
         # Очищаем таблицу
         self.results_table.setRowCount(0)
 
-        # Загружаем результаты
-        worker = GetLabResultsWorker(api_client, self.selected_lab_id)
-        worker.result_ready.connect(self._on_results_loaded)
-        worker.error_occurred.connect(self._show_error)
-        worker.start()
-
-    def _on_results_loaded(self, results: Optional[List[Dict[str, Any]]]):
-        """Обработка загруженных результатов"""
+        # Ответ на предыдущий запрос страницы больше не нужен
+        if self._results_worker is not None:
+            self._results_worker.cancel()
+
+        # Загружаем одну страницу результатов одним запросом
+        self._results_worker = GetLabResultsPageWorker(
+            api_client,
+            self.selected_lab_id,
+            self.page,
+            self.PAGE_SIZE,
+            self.sort_by,
+            self.sort_order,
+            self.status_filter.currentData(),
+            self.search_edit.text().strip() or None
+        )
+        self._results_worker.result_ready.connect(self._on_results_loaded)
+        self._results_worker.error_occurred.connect(self._show_error)
+        self._results_worker.start()
+
+    def _on_results_loaded(self, page: Optional[Dict[str, Any]]):
+        """Обработка загруженной страницы результатов"""
         # Очищаем таблицу
         self.results_table.setRowCount(0)
 
-        if not results:
+        if not page:
+            self._update_pagination(0, 0)
             return
 
+        results = page.get("items", [])
+        self.total_pages = page.get("pages", 0)
+        self._update_pagination(page.get("total", 0), self.total_pages)
+
         # Заполняем таблицу
         self.results_table.setRowCount(len(results))
 
         for i, result in enumerate(results):
-            # Студент
+            # Студент (ФИО приходит вместе с результатом)
             user_id = result.get("user_id")
-
-            # Получаем информацию о пользователе
-            from core.api.api_worker import GetUserWorker
-
-            worker = GetUserWorker(api_client, user_id)
-            worker.result_ready.connect(
-                lambda user, row=i: self._update_user_info(user, row))
-            worker.start()
-
-            # Студент
-            user_id = result.get("user_id")
-
-            # Получаем информацию о пользователе
-            from core.api.api_worker import GetUserWorker
-
-            worker = GetUserWorker(api_client, user_id)
-            worker.result_ready.connect(
-                lambda user, row=i: self._update_user_info(user, row))
-            worker.start()
-
-            # Временно устанавливаем ID пользователя
-            self.results_table.setItem(
-                i, 0, QTableWidgetItem(f"ID: {user_id}"))
+            student_name = result.get("student_name") or f"ID: {user_id}"
+            self.student_names[user_id] = student_name
 
             # Статус
             status = result.get("status", "")
@@ -202,27 +261,48 @@ class LabResultsPanel(QWidget):
             self.results_table.setCellWidget(i, 4, actions_widget)
 
             # Сохраняем данные результата
-            self.results_table.setItem(i, 0, QTableWidgetItem(""))
+            self.results_table.setItem(i, 0, QTableWidgetItem(student_name))
             self.results_table.item(i, 0).setData(Qt.UserRole, result)
 
-        self.logger.info(f"Загружено {len(results)} результатов")
+        self.logger.info(
+            f"Загружено {len(results)} результатов (страница {self.page} из {self.total_pages})")
+
+    def _update_pagination(self, total: int, pages: int):
+        """Обновление элементов навигации по страницам"""
+        self.page_label.setText(
+            f"Страница {self.page if pages else 0} из {pages} (всего: {total})")
+        self.prev_page_btn.setEnabled(self.page > 1)
+        self.next_page_btn.setEnabled(self.page < pages)
+
+    def _change_page(self, delta: int):
+        """Переход на соседнюю страницу"""
+        page = self.page + delta
+        if page < 1 or (self.total_pages and page > self.total_pages):
+            return
+        self.page = page
+        self._load_results()
 
-    def _update_user_info(self, user: Optional[Dict[str, Any]], row: int):
-        """Обновление информации о пользователе в таблице"""
-        if not user or row >= self.results_table.rowCount():
+    def _on_header_clicked(self, column: int):
+        """Сортировка на сервере по щелчку на заголовке столбца"""
+        sort_by = self.SORT_COLUMNS.get(column)
+        if not sort_by:
             return
 
-        # Формируем ФИО
-        last_name = user.get("last_name", "")
-        first_name = user.get("first_name", "")
-        middle_name = user.get("middle_name", "")
+        if self.sort_by == sort_by:
+            self.sort_order = "desc" if self.sort_order == "asc" else "asc"
+        else:
+            self.sort_by = sort_by
+            self.sort_order = "asc"
 
-        fio = f"{last_name} {first_name} {middle_name}".strip()
-        if not fio:
-            fio = user.get("login", "")
+        self.results_table.horizontalHeader().setSortIndicator(
+            column, Qt.AscendingOrder if self.sort_order == "asc" else Qt.DescendingOrder)
+        self.page = 1
+        self._load_results()
 
-        # Обновляем ячейку
-        self.results_table.item(row, 0).setText(fio)
+    def _on_filter_changed(self):
+        """Применение фильтров со сбросом на первую страницу"""
+        self.page = 1
+        self._load_results()
 
     def _view_result(self, result: Dict[str, Any]):
         """Просмотр результата выполнения лабораторной работы"""
@@ -290,16 +370,19 @@ class LabResultsPanel(QWidget):
         # Информация о студенте
         user_id = result.get("user_id")
 
-        # Получаем информацию о пользователе
-        from core.api.api_worker import GetUserWorker
+        # ФИО студента известно из страницы результатов; запрашиваем только при его отсутствии
+        student_name = self.student_names.get(user_id)
+        if student_name is None:
+            from core.api.api_worker import GetUserWorker
 
-        worker = GetUserWorker(api_client, user_id)
-        worker.result_ready.connect(
-            lambda user: self._update_student_info(dialog, user))
-        worker.start()
+            worker = GetUserWorker(api_client, user_id)
+            worker.result_ready.connect(
+                lambda user: self._update_student_info(dialog, user))
+            worker.start()
 
         # Временная информация о студенте
-        layout.addWidget(QLabel(f"<b>Студент:</b> ID {user_id}"))
+        layout.addWidget(
+            QLabel(f"<b>Студент:</b> {student_name or f'ID {user_id}'}"))
 
         # Статус
         status = result.get("status", "")
@@ -539,16 +622,19 @@ class LabResultsPanel(QWidget):
         # Информация о студенте
         user_id = result.get("user_id")
 
-        # Получаем информацию о пользователе
-        from core.api.api_worker import GetUserWorker
+        # ФИО студента известно из страницы результатов; запрашиваем только при его отсутствии
+        student_name = self.student_names.get(user_id)
+        if student_name is None:
+            from core.api.api_worker import GetUserWorker
 
-        worker = GetUserWorker(api_client, user_id)
-        worker.result_ready.connect(
-            lambda user: self._update_student_info(dialog, user))
-        worker.start()
+            worker = GetUserWorker(api_client, user_id)
+            worker.result_ready.connect(
+                lambda user: self._update_student_info(dialog, user))
+            worker.start()
 
         # Временная информация о студенте
-        layout.addWidget(QLabel(f"<b>Студент:</b> ID {user_id}"))
+        layout.addWidget(
+            QLabel(f"<b>Студент:</b> {student_name or f'ID {user_id}'}"))
 
         # Общая оценка
         form = QFormLayout()
@@ -20,37 +20,52 @@ class DeviceCard(QFrame):
         layout = QVBoxLayout(inner)
         layout.setAlignment(Qt.AlignTop)
 
-        # Название устройства
-        layout.addWidget(
-            QLabel(f"<b>{self.device.get('name', 'Без названия')}</b>"))
+        # Название, модель и производитель, сущности или состояние
+        self.name_label = QLabel()
+        self.model_label = QLabel()
+        self.state_label = QLabel()
+        layout.addWidget(self.name_label)
+        layout.addWidget(self.model_label)
+        layout.addWidget(self.state_label)
+
+        outer.addWidget(inner)
+        self.setMinimumSize(200, 120)
+        self.setMaximumHeight(150)
+        self._render()
+
+    def _render(self):
+        """Заполнение подписей по данным устройства"""
+        self.name_label.setText(f"<b>{self.device.get('name', 'Без названия')}</b>")
 
-        # Модель и производитель
         model = self.device.get("model", "—")
         manuf = self.device.get("manufacturer", "")
-        layout.addWidget(QLabel(f"{manuf} {model}".strip()))
+        self.model_label.setText(f"{manuf} {model}".strip())
 
         # Количество сущностей или состояние
+        self._shows_state = False
         entities = self.device.get("entities", [])
+        state = self.device.get("state", {})
         if entities:
-            layout.addWidget(QLabel(f"Сущности: {len(entities)}"))
-        else:
-            # Состояние для API устройств
-            state = self.device.get("state", {})
-            if isinstance(state, dict) and state:
-                state_text = ", ".join(f"{k}: {v}" for k, v in state.items())
-                self.state_label = QLabel(f"Состояние: {state_text}")
-                layout.addWidget(self.state_label)
-            elif isinstance(state, str) and state:
-                self.state_label = QLabel(f"Состояние: {state}")
-                layout.addWidget(self.state_label)
+            self.state_label.setText(f"Сущности: {len(entities)}")
+        elif isinstance(state, dict) and state:
+            state_text = ", ".join(f"{k}: {v}" for k, v in state.items())
+            self.state_label.setText(f"Состояние: {state_text}")
+            self._shows_state = True
+        elif isinstance(state, str) and state:
+            self.state_label.setText(f"Состояние: {state}")
+            self._shows_state = True
+        self.state_label.setVisible(bool(entities) or self._shows_state)
 
-        outer.addWidget(inner)
-        self.setMinimumSize(200, 120)
-        self.setMaximumHeight(150)
+    def set_device(self, device_data: dict):
+        """Обновление карточки новыми данными устройства без пересоздания"""
+        if device_data == self.device:
+            return
+        self.device = device_data
+        self._render()
 
     def update_state(self, state_data):
         """Обновляет отображение состояния устройства"""
-        if not hasattr(self, 'state_label') or not state_data:
+        if not self._shows_state or not state_data:
             return
 
         state = state_data.get("state", {})
@@ -0,0 +1,195 @@
+"""Нагрузочный тест одновременного бронирования одного устройства
+
+Запуск из каталога server/server:
+
+    python -m benchmarks.booking_load --requests 400 --concurrency 32
+    python -m benchmarks.booking_load --url http://localhost:8000 --device 0x00124b0001 \
+        --login admin --password admin123
+
+Без --url создает временную базу и вызывает сервис бронирования из потоков
+напрямую. С --url отправляет запросы к работающему серверу. Интервалы
+соседних слотов пересекаются, поэтому запросы конкурируют за одно и то же
+время. После прогона проверяет, что среди активных бронирований устройства
+нет пересечений, и выводит задержки p50/p99. При пересечениях или ошибках
+завершается с кодом 1.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import urllib.request
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+# Шаг начала слотов и длительность бронирования (соседние слоты пересекаются)
+SLOT_STEP = timedelta(minutes=30)
+SLOT_DURATION = timedelta(minutes=45)
+
+
+def percentile(values, fraction: float) -> float:
+    """Перцентиль по отсортированному списку"""
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(fraction * (len(values) - 1))))
+    return values[index]
+
+
+def find_overlaps(bookings):
+    """Пары пересекающихся бронирований"""
+    ordered = sorted(bookings, key=lambda b: b["start_time"])
+    overlaps = []
+    for previous, current in zip(ordered, ordered[1:]):
+        if current["start_time"] < previous["end_time"]:
+            overlaps.append((previous["id"], current["id"]))
+    return overlaps
+
+
+class DirectTarget:
+    """Вызов сервиса бронирования в процессе на временной базе"""
+
+    def __init__(self, device_id: str):
+        db_dir = tempfile.mkdtemp(prefix="iot_lab_bench_")
+        os.environ["DB_PATH"] = os.path.join(db_dir, "bench.db")
+
+        import database
+        from fastapi import HTTPException
+        from services.booking import booking_service
+
+        self.database = database
+        self.service = booking_service
+        self.conflict_error = HTTPException
+        self.device_id = device_id
+
+        database.init_db()
+        self.user_id = database.create_user(
+            "bench_booking", "", "Студент", "Тест", "", "student", password_hash="-")
+
+    def book(self, start: datetime, end: datetime) -> bool:
+        try:
+            self.service.create_booking(
+                self.device_id, self.user_id, start, end, "Нагрузочный тест")
+            return True
+        except self.conflict_error as e:
+            if e.status_code == 409:
+                return False
+            raise
+
+    def active_bookings(self):
+        with self.database.get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id, start_time, end_time FROM device_bookings
+                WHERE device_id = ? AND status = 'active'
+            """, (self.device_id,))
+            return [dict(row) for row in cursor.fetchall()]
+
+    def close(self):
+        self.database.pool.close_all()
+
+
+class HttpTarget:
+    """Запросы к работающему серверу"""
+
+    def __init__(self, url: str, device_id: str, login: str, password: str):
+        self.url = url.rstrip("/")
+        self.device_id = device_id
+        response = self._request("POST", "/api/auth/login",
+                                 {"username": login, "password": password})
+        self.token = response["access_token"]
+
+    def _request(self, method: str, path: str, payload=None, token: str = None):
+        data = json.dumps(payload).encode() if payload is not None else None
+        request = urllib.request.Request(self.url + path, data=data, method=method)
+        request.add_header("Content-Type", "application/json")
+        if token:
+            request.add_header("Authorization", f"Bearer {token}")
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return json.loads(response.read().decode())
+
+    def book(self, start: datetime, end: datetime) -> bool:
+        result = self._request("POST", f"/api/booking/devices/{self.device_id}", {
+            "device_id": self.device_id,
+            "start_time": start.isoformat(),
+            "end_time": end.isoformat(),
+            "purpose": "Нагрузочный тест"
+        }, self.token)
+        return bool(result.get("success"))
+
+    def active_bookings(self):
+        return self._request(
+            "GET", f"/api/booking/devices/{self.device_id}/queue", token=self.token)
+
+    def close(self):
+        pass
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=400,
+                        help="число запросов на бронирование")
+    parser.add_argument("--concurrency", type=int, default=32,
+                        help="число одновременных клиентов")
+    parser.add_argument("--slots", type=int, default=40,
+                        help="число различных слотов, за которые идет конкуренция")
+    parser.add_argument("--url", help="адрес сервера (без него - прямой вызов сервиса)")
+    parser.add_argument("--device", default="0xbench",
+                        help="ID устройства")
+    parser.add_argument("--login", default="admin")
+    parser.add_argument("--password", default="admin123")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    if args.url:
+        target = HttpTarget(args.url, args.device, args.login, args.password)
+    else:
+        target = DirectTarget(args.device)
+
+    # Слоты начинаются завтра, чтобы время начала не оказалось в прошлом
+    base = (datetime.now() + timedelta(days=1)).replace(
+        minute=0, second=0, microsecond=0)
+    rng = random.Random(args.seed)
+    starts = [base + SLOT_STEP * rng.randrange(args.slots)
+              for _ in range(args.requests)]
+
+    def attempt(start: datetime):
+        started = time.perf_counter()
+        try:
+            ok = target.book(start, start + SLOT_DURATION)
+            error = None
+        except Exception as e:
+            ok, error = False, str(e)
+        return ok, error, time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        results = list(executor.map(attempt, starts))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(r[2] * 1000 for r in results)
+    booked = sum(1 for r in results if r[0])
+    errors = [r[1] for r in results if r[1]]
+    overlaps = find_overlaps(target.active_bookings())
+    target.close()
+
+    print(f"Запросов: {args.requests}, клиентов: {args.concurrency}, слотов: {args.slots}")
+    print(f"Забронировано: {booked}, отказов: {args.requests - booked - len(errors)}, "
+          f"ошибок: {len(errors)}")
+    print(f"Время: {elapsed:.2f} с, {args.requests / elapsed:.1f} запросов/с")
+    print(f"Задержка p50: {percentile(latencies, 0.5):.2f} мс, "
+          f"p99: {percentile(latencies, 0.99):.2f} мс, "
+          f"max: {latencies[-1] if latencies else 0:.2f} мс")
+    print(f"Пересечений: {len(overlaps)}")
+
+    for error in errors[:5]:
+        print(f"  ошибка: {error}")
+    for pair in overlaps[:5]:
+        print(f"  пересекаются бронирования {pair[0]} и {pair[1]}")
+
+    return 1 if overlaps or errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
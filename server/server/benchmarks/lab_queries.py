@@ -0,0 +1,104 @@
+"""Регрессионный бенчмарк числа SQL-запросов при загрузке лабораторных работ
+
+Запуск из каталога server/server:
+
+    python -m benchmarks.lab_queries --results 150 --tasks 10
+
+Создает временную базу, заполняет ее лабораторной работой с заданиями и
+результатами студентов и проверяет, что число SELECT-запросов на загрузку
+не зависит от количества заданий и результатов. При превышении бюджета
+завершается с кодом 1.
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+# Бюджет SELECT-запросов на одну операцию
+QUERY_BUDGET = {
+    "get_lab": 3,
+    "get_lab_results": 2,
+    "get_user_lab_results": 2,
+}
+
+
+def seed(database, tasks: int, results: int, devices_per_task: int = 2):
+    """Заполнение базы тестовыми данными"""
+    teacher_id = database.create_user(
+        "bench_teacher", "", "Преподаватель", "Тест", "", "teacher", password_hash="-")
+    lab_id = database.create_lab("Бенчмарк", "", {}, teacher_id)
+
+    task_ids = []
+    for index in range(tasks):
+        task_id = database.create_task(
+            lab_id, f"Задание {index}", "", "device_interaction", {}, index, 10)
+        for device in range(devices_per_task):
+            database.add_device_to_task(
+                task_id, f"0x{index:04x}{device:04x}", {"state": "ON"})
+        task_ids.append(task_id)
+
+    student_ids = []
+    for index in range(results):
+        student_id = database.create_user(
+            f"bench_student_{index}", "", "Студент", str(index), "", "student", password_hash="-")
+        result_id = database.create_lab_result(lab_id, student_id)
+        database.create_task_results(result_id, task_ids)
+        student_ids.append(student_id)
+
+    return lab_id, student_ids
+
+
+def measure(database, func, *args):
+    """Число SELECT-запросов и время выполнения функции"""
+    statements = []
+    database.pool.set_trace_callback(statements.append)
+    started = time.perf_counter()
+    try:
+        func(*args)
+    finally:
+        database.pool.set_trace_callback(None)
+    elapsed = time.perf_counter() - started
+    selects = sum(1 for sql in statements if sql.lstrip().upper().startswith("SELECT"))
+    return selects, elapsed
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--results", type=int, default=150,
+                        help="число результатов студентов")
+    parser.add_argument("--tasks", type=int, default=10,
+                        help="число заданий в лабораторной работе")
+    args = parser.parse_args()
+
+    db_dir = tempfile.mkdtemp(prefix="iot_lab_bench_")
+    os.environ["DB_PATH"] = os.path.join(db_dir, "bench.db")
+
+    import database
+    from services import labs as labs_service
+
+    database.init_db()
+    lab_id, student_ids = seed(database, args.tasks, args.results)
+
+    checks = [
+        ("get_lab", labs_service.get_lab, lab_id),
+        ("get_lab_results", labs_service.get_lab_results, lab_id),
+        ("get_user_lab_results", labs_service.get_user_lab_results, student_ids[0]),
+    ]
+
+    failed = False
+    print(f"Заданий: {args.tasks}, результатов: {args.results}")
+    for name, func, arg in checks:
+        selects, elapsed = measure(database, func, arg)
+        budget = QUERY_BUDGET[name]
+        status = "OK" if selects <= budget else "FAIL"
+        failed = failed or selects > budget
+        print(f"{name:24} запросов: {selects:4} (бюджет {budget}), "
+              f"время: {elapsed * 1000:8.2f} мс  {status}")
+
+    database.pool.close_all()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -30,22 +30,58 @@ MQTT_PORT = int(os.getenv("MQTT_PORT", "1883"))
 MQTT_TOPIC_SUBSCRIBE = os.getenv("MQTT_TOPIC_SUBSCRIBE", "zigbee2mqtt/#")
 MQTT_TOPIC_PUBLISH_PREFIX = os.getenv(
     "MQTT_TOPIC_PUBLISH_PREFIX", "zigbee2mqtt")
+# Время ожидания ответа моста zigbee2mqtt на запрос (секунды)
+MQTT_REQUEST_TIMEOUT = float(os.getenv("MQTT_REQUEST_TIMEOUT", "5.0"))
 
 # Настройки базы данных
 DB_PATH = os.getenv("DB_PATH", "iot_lab_data.db")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10.0"))  # секунды
+
+# Пулы потоков для блокирующих операций асинхронных обработчиков
+CPU_EXECUTOR_WORKERS = int(os.getenv(
+    "CPU_EXECUTOR_WORKERS", str(min(4, os.cpu_count() or 1))))
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", str(DB_POOL_SIZE)))
+
+# Настройки буферизованной записи показаний сенсоров
+SENSOR_BATCH_SIZE = int(os.getenv("SENSOR_BATCH_SIZE", "200"))
+SENSOR_FLUSH_INTERVAL = float(os.getenv("SENSOR_FLUSH_INTERVAL", "1.0"))  # секунды
+SENSOR_QUEUE_MAXSIZE = int(os.getenv("SENSOR_QUEUE_MAXSIZE", "10000"))
+
+# Очередь обновлений состояний для автоматической проверки заданий
+VERIFIER_QUEUE_MAXSIZE = int(os.getenv("VERIFIER_QUEUE_MAXSIZE", "10000"))
 
 # Настройки API
 API_KEY = os.getenv("API_KEY", str(uuid.uuid4()))
 API_HOST = os.getenv("API_HOST", "0.0.0.0")
 API_PORT = int(os.getenv("API_PORT", "8000"))
+# Минимальный размер ответа для сжатия gzip, байты
+GZIP_MIN_SIZE = int(os.getenv("GZIP_MIN_SIZE", "1024"))
 LOCAL_IP = get_local_ip()
 
+# Настройки WebSocket
+# Окно объединения обновлений состояния устройства (секунды): в пределах окна
+# подписчикам уходит только последнее состояние
+WS_COALESCE_WINDOW = float(os.getenv("WS_COALESCE_WINDOW", "0.25"))
+# Максимальная длина очереди отправки одного соединения; при переполнении
+# клиент считается медленным и отключается
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "10.0"))  # секунды
+
 # Настройки JWT
 SECRET_KEY = os.getenv(
     "SECRET_KEY", "your-secret-key-for-jwt-please-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24  # 24 часа
 
+# Кэш проверенных токенов и пользователей
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60.0"))  # секунды
+USER_CACHE_MAX_TOKENS = int(os.getenv("USER_CACHE_MAX_TOKENS", "10000"))
+
+# Число полос блокировок бронирования (бронирования одного устройства
+# выполняются последовательно, разных устройств - параллельно)
+BOOKING_LOCK_STRIPES = int(os.getenv("BOOKING_LOCK_STRIPES", "64"))
+
 # Глобальные кэши для хранения данных
 devices_cache = {}  # Кэш устройств из bridge/devices
 device_availability = {}  # Статус доступности устройств
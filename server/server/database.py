@@ -1,219 +1,272 @@
-import sqlite3
 import json
 import bcrypt
 from datetime import datetime
 from typing import Dict, List, Any, Optional
-from config import DB_PATH, logger
+from config import DB_PATH, DB_POOL_SIZE, DB_POOL_TIMEOUT, logger
+from db_pool import ConnectionPool, PooledConnection
+from utils.user_cache import user_cache
+from utils.response_cache import response_cache, LABS
+import timeseries
+import rollups
+
+# Максимальное число параметров в одном условии IN (лимит SQLite - 999)
+IN_CLAUSE_LIMIT = 500
+
+# Общий пул соединений с базой данных
+pool = ConnectionPool(DB_PATH, max_size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT)
 
 
 def init_db():
     """Инициализация базы данных"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    # Таблица для данных сенсоров
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS sensor_data (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        device_id TEXT NOT NULL,
-        timestamp DATETIME NOT NULL,
-        data JSON NOT NULL
-    )
-    ''')
-
-    # Таблица для групп устройств
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS device_groups (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT NOT NULL,
-        description TEXT,
-        devices JSON NOT NULL
-    )
-    ''')
-
-    # Таблица для автоматизаций
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS automations (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT NOT NULL,
-        description TEXT,
-        enabled BOOLEAN DEFAULT 1,
-        trigger JSON NOT NULL,
-        actions JSON NOT NULL
-    )
-    ''')
-
-    # Таблица пользователей
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS users (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        login TEXT UNIQUE NOT NULL,
-        password_hash TEXT NOT NULL,
-        last_name TEXT,
-        first_name TEXT,
-        middle_name TEXT,
-        role TEXT NOT NULL,
-        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-    )
-    ''')
-
-    # Таблица лабораторных работ
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS labs (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        title TEXT NOT NULL,
-        description TEXT,
-        content JSON NOT NULL,
-        created_by INTEGER NOT NULL,
-        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (created_by) REFERENCES users(id)
-    )
-    ''')
-
-    # Таблица заданий в лабораторных работах
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS lab_tasks (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        lab_id INTEGER NOT NULL,
-        title TEXT NOT NULL,
-        description TEXT,
-        task_type TEXT NOT NULL,
-        content JSON NOT NULL,
-        order_index INTEGER NOT NULL,
-        max_score REAL NOT NULL DEFAULT 10.0,
-        FOREIGN KEY (lab_id) REFERENCES labs(id) ON DELETE CASCADE
-    )
-    ''')
-
-    # Таблица для связи устройств с заданиями
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS task_devices (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        task_id INTEGER NOT NULL,
-        device_id TEXT NOT NULL,
-        required_state JSON,
-        FOREIGN KEY (task_id) REFERENCES lab_tasks(id) ON DELETE CASCADE
-    )
-    ''')
-
-    # Таблица результатов выполнения лабораторных работ
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS lab_results (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        lab_id INTEGER NOT NULL,
-        user_id INTEGER NOT NULL,
-        status TEXT NOT NULL DEFAULT 'in_progress',
-        started_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-        submitted_at DATETIME,
-        score REAL,
-        feedback TEXT,
-        reviewed_by INTEGER,
-        reviewed_at DATETIME,
-        FOREIGN KEY (lab_id) REFERENCES labs(id),
-        FOREIGN KEY (user_id) REFERENCES users(id),
-        FOREIGN KEY (reviewed_by) REFERENCES users(id)
-    )
-    ''')
-
-    # Таблица результатов выполнения заданий
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS task_results (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        lab_result_id INTEGER NOT NULL,
-        task_id INTEGER NOT NULL,
-        answer JSON,
-        score REAL,
-        feedback TEXT,
-        FOREIGN KEY (lab_result_id) REFERENCES lab_results(id) ON DELETE CASCADE,
-        FOREIGN KEY (task_id) REFERENCES lab_tasks(id)
-    )
-    ''')
-
-    # Таблица устройств (для хранения метаданных)
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS devices (
-        id TEXT PRIMARY KEY,
-        name TEXT NOT NULL,
-        type TEXT NOT NULL,
-        description TEXT,
-        location TEXT,
-        metadata JSON
-    )
-    ''')
-
-    # Таблица бронирования устройств
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS device_bookings (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        device_id TEXT NOT NULL,
-        user_id INTEGER NOT NULL,
-        start_time DATETIME NOT NULL,
-        end_time DATETIME NOT NULL,
-        purpose TEXT NOT NULL,
-        status TEXT NOT NULL DEFAULT 'active',
-        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (device_id) REFERENCES devices(id),
-        FOREIGN KEY (user_id) REFERENCES users(id)
-    )
-    ''')
-
-    # Таблица сессий пользователей
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS user_sessions (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER NOT NULL,
-        token TEXT NOT NULL,
-        ip_address TEXT,
-        user_agent TEXT,
-        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-        expires_at DATETIME NOT NULL,
-        is_active BOOLEAN DEFAULT 1,
-        FOREIGN KEY (user_id) REFERENCES users(id)
-    )
-    ''')
-
-    # Создаем администратора по умолчанию, если его нет
-    cursor.execute("SELECT COUNT(*) FROM users WHERE role = 'admin'")
-    if cursor.fetchone()[0] == 0:
-        hashed = bcrypt.hashpw("admin123".encode(), bcrypt.gensalt()).decode()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+
+        # Таблица для данных сенсоров (новые показания хранятся в помесячных секциях)
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sensor_data (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            device_id TEXT NOT NULL,
+            timestamp DATETIME NOT NULL,
+            data JSON NOT NULL
+        )
+        ''')
+
+        # Каталог помесячных секций показаний сенсоров
+        timeseries.init_timeseries(cursor)
+
+        # Агрегаты показаний (1 минута, 1 час, 1 сутки)
+        rollups.init_rollups(cursor)
+
+        # Таблица для групп устройств
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS device_groups (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            description TEXT,
+            devices JSON NOT NULL
+        )
+        ''')
+
+        # Таблица для автоматизаций
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS automations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            description TEXT,
+            enabled BOOLEAN DEFAULT 1,
+            trigger JSON NOT NULL,
+            actions JSON NOT NULL
+        )
+        ''')
+
+        # Таблица пользователей
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            login TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            last_name TEXT,
+            first_name TEXT,
+            middle_name TEXT,
+            role TEXT NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+
+        # Таблица лабораторных работ
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS labs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            description TEXT,
+            content JSON NOT NULL,
+            created_by INTEGER NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (created_by) REFERENCES users(id)
+        )
+        ''')
+
+        # Таблица заданий в лабораторных работах
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS lab_tasks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            lab_id INTEGER NOT NULL,
+            title TEXT NOT NULL,
+            description TEXT,
+            task_type TEXT NOT NULL,
+            content JSON NOT NULL,
+            order_index INTEGER NOT NULL,
+            max_score REAL NOT NULL DEFAULT 10.0,
+            FOREIGN KEY (lab_id) REFERENCES labs(id) ON DELETE CASCADE
+        )
+        ''')
+
+        # Таблица для связи устройств с заданиями
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS task_devices (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            task_id INTEGER NOT NULL,
+            device_id TEXT NOT NULL,
+            required_state JSON,
+            FOREIGN KEY (task_id) REFERENCES lab_tasks(id) ON DELETE CASCADE
+        )
+        ''')
+
+        # Таблица результатов выполнения лабораторных работ
         cursor.execute('''
-            INSERT INTO users (login, password_hash, role, last_name, first_name)
-            VALUES (?, ?, ?, ?, ?)
-        ''', ("admin", hashed, "admin", "Администратор", "Системный"))
+        CREATE TABLE IF NOT EXISTS lab_results (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            lab_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'in_progress',
+            started_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            submitted_at DATETIME,
+            score REAL,
+            feedback TEXT,
+            reviewed_by INTEGER,
+            reviewed_at DATETIME,
+            FOREIGN KEY (lab_id) REFERENCES labs(id),
+            FOREIGN KEY (user_id) REFERENCES users(id),
+            FOREIGN KEY (reviewed_by) REFERENCES users(id)
+        )
+        ''')
+
+        # Таблица результатов выполнения заданий
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS task_results (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            lab_result_id INTEGER NOT NULL,
+            task_id INTEGER NOT NULL,
+            answer JSON,
+            score REAL,
+            feedback TEXT,
+            FOREIGN KEY (lab_result_id) REFERENCES lab_results(id) ON DELETE CASCADE,
+            FOREIGN KEY (task_id) REFERENCES lab_tasks(id)
+        )
+        ''')
+
+        # Таблица устройств (для хранения метаданных)
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS devices (
+            id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            type TEXT NOT NULL,
+            description TEXT,
+            location TEXT,
+            metadata JSON
+        )
+        ''')
+
+        # Таблица бронирования устройств
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS device_bookings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            device_id TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            start_time DATETIME NOT NULL,
+            end_time DATETIME NOT NULL,
+            purpose TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'active',
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (device_id) REFERENCES devices(id),
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+        ''')
+
+        # Таблица сессий пользователей
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS user_sessions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            token TEXT NOT NULL,
+            ip_address TEXT,
+            user_agent TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            expires_at DATETIME NOT NULL,
+            is_active BOOLEAN DEFAULT 1,
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+        ''')
+
+        # Индексы по внешним ключам для выборок заданий и результатов наборами
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_lab_tasks_lab ON lab_tasks (lab_id, order_index)")
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_task_devices_task ON task_devices (task_id)")
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_lab_results_lab ON lab_results (lab_id)")
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_lab_results_user ON lab_results (user_id)")
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_task_results_result ON task_results (lab_result_id)")
+
+        # Индексы для выборок бронирований устройства и пользователя по времени
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_device_bookings_device ON device_bookings (device_id, status, start_time)")
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_device_bookings_user ON device_bookings (user_id, start_time)")
+
+        # Создаем администратора по умолчанию, если его нет
+        cursor.execute("SELECT COUNT(*) FROM users WHERE role = 'admin'")
+        if cursor.fetchone()[0] == 0:
+            hashed = bcrypt.hashpw("admin123".encode(), bcrypt.gensalt()).decode()
+            cursor.execute('''
+                INSERT INTO users (login, password_hash, role, last_name, first_name)
+                VALUES (?, ?, ?, ?, ?)
+            ''', ("admin", hashed, "admin", "Администратор", "Системный"))
 
-    conn.commit()
-    conn.close()
     logger.info("База данных инициализирована")
 
 
-def get_db_connection():
-    """Получение соединения с базой данных"""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+def get_db_connection() -> PooledConnection:
+    """Получение соединения с базой данных из пула
+
+    Используется как контекстный менеджер: при выходе из блока with
+    транзакция фиксируется (или откатывается при ошибке), а соединение
+    возвращается в пул.
+    """
+    return pool.connection()
+
+
+def get_pool_stats() -> Dict[str, Any]:
+    """Метрики пула соединений с базой данных"""
+    return pool.get_stats()
 
 
 def save_to_db(device_id, data):
     """Сохранение данных устройства в БД"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    timestamp = datetime.now().isoformat()
-    cursor.execute(
-        "INSERT INTO sensor_data (device_id, timestamp, data) VALUES (?, ?, ?)",
-        (device_id, timestamp, json.dumps(data))
-    )
-    conn.commit()
-    conn.close()
+    save_many_to_db([(device_id, datetime.now().isoformat(), data)])
+
+
+def save_many_to_db(rows: List[tuple]) -> int:
+    """Пакетное сохранение показаний устройств в одной транзакции
+
+    rows - список кортежей (device_id, timestamp, data). Строки
+    распределяются по помесячным секциям sensor_data_ГГГГ_ММ, а агрегаты
+    числовых полей обновляются в той же транзакции.
+    """
+    if not rows:
+        return 0
+
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        timeseries.insert_rows(
+            cursor,
+            [(device_id, timestamp, json.dumps(data))
+             for device_id, timestamp, data in rows]
+        )
+        rollups.apply_rows(cursor, rows)
+
+    return len(rows)
 
 
 def get_user_by_id(user_id: int) -> Optional[Dict]:
     """Получение пользователя по ID"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM users WHERE id = ?", (user_id,))
-    user = cursor.fetchone()
-    conn.close()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM users WHERE id = ?", (user_id,))
+        user = cursor.fetchone()
 
     if user:
         return dict(user)
@@ -222,31 +275,29 @@ def get_user_by_id(user_id: int) -> Optional[Dict]:
 
 def get_user_by_login(login: str) -> Optional[Dict]:
     """Получение пользователя по логину"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM users WHERE login = ?", (login,))
-    user = cursor.fetchone()
-    conn.close()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM users WHERE login = ?", (login,))
+        user = cursor.fetchone()
 
     if user:
         return dict(user)
     return None
 
 
-def create_user(login: str, password: str, last_name: str, first_name: str, middle_name: str, role: str) -> int:
-    """Создание нового пользователя"""
-    hashed_password = bcrypt.hashpw(
+def create_user(login: str, password: str, last_name: str, first_name: str, middle_name: str, role: str,
+                password_hash: Optional[str] = None) -> int:
+    """Создание нового пользователя (password_hash - заранее вычисленный хеш пароля)"""
+    hashed_password = password_hash or bcrypt.hashpw(
         password.encode(), bcrypt.gensalt()).decode()
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO users (login, password_hash, last_name, first_name, middle_name, role) VALUES (?, ?, ?, ?, ?, ?)",
-        (login, hashed_password, last_name, first_name, middle_name, role)
-    )
-    user_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT INTO users (login, password_hash, last_name, first_name, middle_name, role) VALUES (?, ?, ?, ?, ?, ?)",
+            (login, hashed_password, last_name, first_name, middle_name, role)
+        )
+        user_id = cursor.lastrowid
 
     return user_id
 
@@ -276,7 +327,10 @@ def update_user(user_id: int, data: Dict) -> bool:
         fields.append("role = ?")
         values.append(data['role'])
 
-    if 'password' in data and data['password']:
+    if 'password_hash' in data and data['password_hash']:
+        fields.append("password_hash = ?")
+        values.append(data['password_hash'])
+    elif 'password' in data and data['password']:
         fields.append("password_hash = ?")
         hashed = bcrypt.hashpw(
             data['password'].encode(), bcrypt.gensalt()).decode()
@@ -287,67 +341,61 @@ def update_user(user_id: int, data: Dict) -> bool:
 
     values.append(user_id)
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        f"UPDATE users SET {', '.join(fields)} WHERE id = ?",
-        values
-    )
-    success = cursor.rowcount > 0
-    conn.commit()
-    conn.close()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"UPDATE users SET {', '.join(fields)} WHERE id = ?",
+            values
+        )
+        success = cursor.rowcount > 0
 
+    user_cache.invalidate_user(user_id)
     return success
 
 
 def delete_user(user_id: int) -> bool:
     """Удаление пользователя"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM users WHERE id = ?", (user_id,))
-    success = cursor.rowcount > 0
-    conn.commit()
-    conn.close()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM users WHERE id = ?", (user_id,))
+        success = cursor.rowcount > 0
 
+    user_cache.invalidate_user(user_id)
     return success
 
 
 def get_all_users() -> List[Dict]:
     """Получение списка всех пользователей"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM users")
-    users = [dict(user) for user in cursor.fetchall()]
-    conn.close()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM users")
+        users = [dict(user) for user in cursor.fetchall()]
 
     return users
 
 
 def create_user_session(user_id: int, token: str, ip_address: str, user_agent: str, expires_at: datetime) -> int:
     """Создание новой сессии пользователя"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO user_sessions (user_id, token, ip_address, user_agent, expires_at) VALUES (?, ?, ?, ?, ?)",
-        (user_id, token, ip_address, user_agent, expires_at.isoformat())
-    )
-    session_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT INTO user_sessions (user_id, token, ip_address, user_agent, expires_at) VALUES (?, ?, ?, ?, ?)",
+            (user_id, token, ip_address, user_agent, expires_at.isoformat())
+        )
+        session_id = cursor.lastrowid
 
     return session_id
 
 
 def get_session_by_token(token: str) -> Optional[Dict]:
     """Получение сессии по токену"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "SELECT * FROM user_sessions WHERE token = ? AND is_active = 1 AND expires_at > ?",
-        (token, datetime.now().isoformat())
-    )
-    session = cursor.fetchone()
-    conn.close()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT * FROM user_sessions WHERE token = ? AND is_active = 1 AND expires_at > ?",
+            (token, datetime.now().isoformat())
+        )
+        session = cursor.fetchone()
 
     if session:
         return dict(session)
@@ -356,72 +404,67 @@ def get_session_by_token(token: str) -> Optional[Dict]:
 
 def invalidate_session(token: str) -> bool:
     """Инвалидация сессии (выход)"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "UPDATE user_sessions SET is_active = 0 WHERE token = ?",
-        (token,)
-    )
-    success = cursor.rowcount > 0
-    conn.commit()
-    conn.close()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "UPDATE user_sessions SET is_active = 0 WHERE token = ?",
+            (token,)
+        )
+        success = cursor.rowcount > 0
 
+    user_cache.invalidate_token(token)
     return success
 
 
 def invalidate_all_user_sessions(user_id: int) -> int:
     """Инвалидация всех сессий пользователя (выход со всех устройств)"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "UPDATE user_sessions SET is_active = 0 WHERE user_id = ? AND is_active = 1",
-        (user_id,)
-    )
-    count = cursor.rowcount
-    conn.commit()
-    conn.close()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "UPDATE user_sessions SET is_active = 0 WHERE user_id = ? AND is_active = 1",
+            (user_id,)
+        )
+        count = cursor.rowcount
 
+    user_cache.invalidate_user(user_id)
     return count
 
 
 def save_device_metadata(device_id: str, name: str, device_type: str, description: str = None, location: str = None, metadata: Dict = None) -> bool:
     """Сохранение метаданных устройства"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    # Проверяем, существует ли устройство
-    cursor.execute("SELECT id FROM devices WHERE id = ?", (device_id,))
-    exists = cursor.fetchone() is not None
-
-    if exists:
-        # Обновляем существующее устройство
-        cursor.execute(
-            "UPDATE devices SET name = ?, type = ?, description = ?, location = ?, metadata = ? WHERE id = ?",
-            (name, device_type, description, location, json.dumps(
-                metadata) if metadata else None, device_id)
-        )
-    else:
-        # Создаем новое устройство
-        cursor.execute(
-            "INSERT INTO devices (id, name, type, description, location, metadata) VALUES (?, ?, ?, ?, ?, ?)",
-            (device_id, name, device_type, description, location,
-             json.dumps(metadata) if metadata else None)
-        )
-
-    success = cursor.rowcount > 0
-    conn.commit()
-    conn.close()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+
+        # Проверяем, существует ли устройство
+        cursor.execute("SELECT id FROM devices WHERE id = ?", (device_id,))
+        exists = cursor.fetchone() is not None
+
+        if exists:
+            # Обновляем существующее устройство
+            cursor.execute(
+                "UPDATE devices SET name = ?, type = ?, description = ?, location = ?, metadata = ? WHERE id = ?",
+                (name, device_type, description, location, json.dumps(
+                    metadata) if metadata else None, device_id)
+            )
+        else:
+            # Создаем новое устройство
+            cursor.execute(
+                "INSERT INTO devices (id, name, type, description, location, metadata) VALUES (?, ?, ?, ?, ?, ?)",
+                (device_id, name, device_type, description, location,
+                 json.dumps(metadata) if metadata else None)
+            )
+
+        success = cursor.rowcount > 0
 
     return success
 
 
 def get_device_metadata(device_id: str) -> Optional[Dict]:
     """Получение метаданных устройства"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM devices WHERE id = ?", (device_id,))
-    device = cursor.fetchone()
-    conn.close()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM devices WHERE id = ?", (device_id,))
+        device = cursor.fetchone()
 
     if device:
         device_dict = dict(device)
@@ -433,88 +476,147 @@ def get_device_metadata(device_id: str) -> Optional[Dict]:
 
 def get_all_devices_metadata() -> List[Dict]:
     """Получение метаданных всех устройств"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM devices")
-    devices = []
-    for device in cursor.fetchall():
-        device_dict = dict(device)
-        if device_dict.get("metadata"):
-            device_dict["metadata"] = json.loads(device_dict["metadata"])
-        devices.append(device_dict)
-    conn.close()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM devices")
+        devices = []
+        for device in cursor.fetchall():
+            device_dict = dict(device)
+            if device_dict.get("metadata"):
+                device_dict["metadata"] = json.loads(device_dict["metadata"])
+            devices.append(device_dict)
 
     return devices
 
 
 def create_lab(title: str, description: str, content: Dict, created_by: int) -> int:
     """Создание новой лабораторной работы"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO labs (title, description, content, created_by) VALUES (?, ?, ?, ?)",
-        (title, description, json.dumps(content), created_by)
-    )
-    lab_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT INTO labs (title, description, content, created_by) VALUES (?, ?, ?, ?)",
+            (title, description, json.dumps(content), created_by)
+        )
+        lab_id = cursor.lastrowid
 
+    response_cache.bump(LABS)
     return lab_id
 
 
-def get_lab(lab_id: int) -> Optional[Dict]:
-    """Получение лабораторной работы по ID"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM labs WHERE id = ?", (lab_id,))
-    lab = cursor.fetchone()
-
-    if not lab:
-        conn.close()
-        return None
-
-    lab_dict = dict(lab)
-    lab_dict['content'] = json.loads(lab_dict['content'])
-
-    # Получаем задания для лабораторной работы
-    cursor.execute(
-        "SELECT * FROM lab_tasks WHERE lab_id = ? ORDER BY order_index", (lab_id,))
-    tasks = []
-    for task in cursor.fetchall():
-        task_dict = dict(task)
-        task_dict['content'] = json.loads(task_dict['content'])
-
-        # Получаем устройства для задания
+def _placeholders(values: List[Any]) -> str:
+    """Список параметров для условия IN (...)"""
+    return ", ".join("?" for _ in values)
+
+
+def _chunks(values: List[Any], size: int = IN_CLAUSE_LIMIT) -> List[List[Any]]:
+    """Разбиение значений на части, не превышающие лимит параметров SQLite"""
+    return [values[i:i + size] for i in range(0, len(values), size)]
+
+
+def _attach_tasks(cursor, labs: List[Dict]):
+    """Загрузка заданий и их устройств для набора лабораторных работ
+
+    Выполняет два запроса на весь набор (задания и устройства заданий)
+    вместо отдельного запроса устройств на каждое задание.
+    """
+    if not labs:
+        return
+
+    lab_ids = [lab['id'] for lab in labs]
+    tasks_by_lab: Dict[int, List[Dict]] = {lab_id: [] for lab_id in lab_ids}
+    tasks_by_id: Dict[int, Dict] = {}
+
+    for chunk in _chunks(lab_ids):
         cursor.execute(
-            "SELECT * FROM task_devices WHERE task_id = ?", (task_dict['id'],))
-        devices = []
-        for device in cursor.fetchall():
-            device_dict = dict(device)
-            if device_dict['required_state']:
-                device_dict['required_state'] = json.loads(
-                    device_dict['required_state'])
-            devices.append(device_dict)
+            f"SELECT * FROM lab_tasks WHERE lab_id IN ({_placeholders(chunk)}) ORDER BY lab_id, order_index",
+            chunk
+        )
+        for task in cursor.fetchall():
+            task_dict = dict(task)
+            task_dict['content'] = json.loads(task_dict['content'])
+            task_dict['devices'] = []
+            tasks_by_lab[task_dict['lab_id']].append(task_dict)
+            tasks_by_id[task_dict['id']] = task_dict
+
+    if tasks_by_id:
+        for chunk in _chunks(lab_ids):
+            cursor.execute(f'''
+                SELECT td.* FROM task_devices td
+                JOIN lab_tasks t ON t.id = td.task_id
+                WHERE t.lab_id IN ({_placeholders(chunk)})
+                ORDER BY td.id
+            ''', chunk)
+            for device in cursor.fetchall():
+                device_dict = dict(device)
+                if device_dict['required_state']:
+                    device_dict['required_state'] = json.loads(
+                        device_dict['required_state'])
+                tasks_by_id[device_dict['task_id']]['devices'].append(device_dict)
+
+    for lab in labs:
+        lab['tasks'] = tasks_by_lab[lab['id']]
+
+
+def _attach_task_results(cursor, results: List[Dict]):
+    """Загрузка результатов заданий для набора результатов одним запросом на часть"""
+    if not results:
+        return
+
+    result_ids = [result['id'] for result in results]
+    by_result: Dict[int, List[Dict]] = {result_id: [] for result_id in result_ids}
+
+    for chunk in _chunks(result_ids):
+        cursor.execute(
+            f"SELECT * FROM task_results WHERE lab_result_id IN ({_placeholders(chunk)}) ORDER BY id",
+            chunk
+        )
+        for task_result in cursor.fetchall():
+            task_result_dict = dict(task_result)
+            if task_result_dict['answer']:
+                task_result_dict['answer'] = json.loads(task_result_dict['answer'])
+            by_result[task_result_dict['lab_result_id']].append(task_result_dict)
+
+    for result in results:
+        result['task_results'] = by_result[result['id']]
+
+
+def get_labs(lab_ids: List[int]) -> List[Dict]:
+    """Получение набора лабораторных работ с заданиями и устройствами (3 запроса)"""
+    if not lab_ids:
+        return []
+
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        labs = []
+        for chunk in _chunks(list(lab_ids)):
+            cursor.execute(
+                f"SELECT * FROM labs WHERE id IN ({_placeholders(chunk)})", chunk)
+            for lab in cursor.fetchall():
+                lab_dict = dict(lab)
+                lab_dict['content'] = json.loads(lab_dict['content'])
+                labs.append(lab_dict)
+
+        _attach_tasks(cursor, labs)
 
-        task_dict['devices'] = devices
-        tasks.append(task_dict)
+    return labs
 
-    lab_dict['tasks'] = tasks
-    conn.close()
 
-    return lab_dict
+def get_lab(lab_id: int) -> Optional[Dict]:
+    """Получение лабораторной работы по ID"""
+    labs = get_labs([lab_id])
+    return labs[0] if labs else None
 
 
 def get_all_labs() -> List[Dict]:
     """Получение списка всех лабораторных работ"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM labs")
-    labs = []
-    for lab in cursor.fetchall():
-        lab_dict = dict(lab)
-        lab_dict['content'] = json.loads(lab_dict['content'])
-        labs.append(lab_dict)
-    conn.close()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM labs")
+        labs = []
+        for lab in cursor.fetchall():
+            lab_dict = dict(lab)
+            lab_dict['content'] = json.loads(lab_dict['content'])
+            labs.append(lab_dict)
 
     return labs
 
@@ -544,44 +646,41 @@ def update_lab(lab_id: int, data: Dict) -> bool:
 
     values.append(lab_id)
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        f"UPDATE labs SET {', '.join(fields)} WHERE id = ?",
-        values
-    )
-    success = cursor.rowcount > 0
-    conn.commit()
-    conn.close()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"UPDATE labs SET {', '.join(fields)} WHERE id = ?",
+            values
+        )
+        success = cursor.rowcount > 0
 
+    response_cache.bump(LABS)
     return success
 
 
 def delete_lab(lab_id: int) -> bool:
     """Удаление лабораторной работы"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM labs WHERE id = ?", (lab_id,))
-    success = cursor.rowcount > 0
-    conn.commit()
-    conn.close()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM labs WHERE id = ?", (lab_id,))
+        success = cursor.rowcount > 0
 
+    response_cache.bump(LABS)
     return success
 
 
 def create_task(lab_id: int, title: str, description: str, task_type: str, content: Dict, order_index: int, max_score: float) -> int:
     """Создание нового задания для лабораторной работы"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO lab_tasks (lab_id, title, description, task_type, content, order_index, max_score) VALUES (?, ?, ?, ?, ?, ?, ?)",
-        (lab_id, title, description, task_type,
-         json.dumps(content), order_index, max_score)
-    )
-    task_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT INTO lab_tasks (lab_id, title, description, task_type, content, order_index, max_score) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (lab_id, title, description, task_type,
+             json.dumps(content), order_index, max_score)
+        )
+        task_id = cursor.lastrowid
 
+    response_cache.bump(LABS)
     return task_id
 
 
@@ -615,129 +714,232 @@ def update_task(task_id: int, data: Dict) -> bool:
 
     values.append(task_id)
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        f"UPDATE lab_tasks SET {', '.join(fields)} WHERE id = ?",
-        values
-    )
-    success = cursor.rowcount > 0
-    conn.commit()
-    conn.close()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"UPDATE lab_tasks SET {', '.join(fields)} WHERE id = ?",
+            values
+        )
+        success = cursor.rowcount > 0
 
+    response_cache.bump(LABS)
     return success
 
 
 def delete_task(task_id: int) -> bool:
     """Удаление задания"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM lab_tasks WHERE id = ?", (task_id,))
-    success = cursor.rowcount > 0
-    conn.commit()
-    conn.close()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM lab_tasks WHERE id = ?", (task_id,))
+        success = cursor.rowcount > 0
 
+    response_cache.bump(LABS)
     return success
 
 
 def add_device_to_task(task_id: int, device_id: str, required_state: Optional[Dict] = None) -> int:
     """Добавление устройства к заданию"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO task_devices (task_id, device_id, required_state) VALUES (?, ?, ?)",
-        (task_id, device_id, json.dumps(required_state) if required_state else None)
-    )
-    device_task_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT INTO task_devices (task_id, device_id, required_state) VALUES (?, ?, ?)",
+            (task_id, device_id, json.dumps(required_state) if required_state else None)
+        )
+        device_task_id = cursor.lastrowid
 
+    response_cache.bump(LABS)
     return device_task_id
 
 
+def set_task_devices(task_id: int, devices: List[Dict]) -> int:
+    """Замена списка устройств задания одной транзакцией"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM task_devices WHERE task_id = ?", (task_id,))
+        cursor.executemany(
+            "INSERT INTO task_devices (task_id, device_id, required_state) VALUES (?, ?, ?)",
+            [(task_id, device['device_id'],
+              json.dumps(device['required_state']) if device.get('required_state') else None)
+             for device in devices]
+        )
+
+    response_cache.bump(LABS)
+    return len(devices)
+
+
 def remove_device_from_task(task_id: int, device_id: str) -> bool:
     """Удаление устройства из задания"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "DELETE FROM task_devices WHERE task_id = ? AND device_id = ?",
-        (task_id, device_id)
-    )
-    success = cursor.rowcount > 0
-    conn.commit()
-    conn.close()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "DELETE FROM task_devices WHERE task_id = ? AND device_id = ?",
+            (task_id, device_id)
+        )
+        success = cursor.rowcount > 0
 
+    response_cache.bump(LABS)
     return success
 
 
 def create_lab_result(lab_id: int, user_id: int) -> int:
     """Создание результата выполнения лабораторной работы"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO lab_results (lab_id, user_id) VALUES (?, ?)",
-        (lab_id, user_id)
-    )
-    result_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT INTO lab_results (lab_id, user_id) VALUES (?, ?)",
+            (lab_id, user_id)
+        )
+        result_id = cursor.lastrowid
 
     return result_id
 
 
 def get_lab_result(result_id: int) -> Optional[Dict]:
     """Получение результата выполнения лабораторной работы по ID"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM lab_results WHERE id = ?", (result_id,))
-    result = cursor.fetchone()
-
-    if not result:
-        conn.close()
-        return None
-
-    result_dict = dict(result)
-
-    # Получаем результаты заданий
-    cursor.execute(
-        "SELECT * FROM task_results WHERE lab_result_id = ?", (result_id,))
-    task_results = []
-    for task_result in cursor.fetchall():
-        task_result_dict = dict(task_result)
-        if task_result_dict['answer']:
-            task_result_dict['answer'] = json.loads(task_result_dict['answer'])
-        task_results.append(task_result_dict)
-
-    result_dict['task_results'] = task_results
-    conn.close()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM lab_results WHERE id = ?", (result_id,))
+        result = cursor.fetchone()
+
+        if not result:
+            return None
+
+        result_dict = dict(result)
+
+        # Получаем результаты заданий
+        _attach_task_results(cursor, [result_dict])
 
     return result_dict
 
 
+def get_lab_results_full(lab_id: Optional[int] = None, user_id: Optional[int] = None) -> List[Dict]:
+    """Получение результатов лабораторных работ вместе с результатами заданий
+
+    Независимо от числа результатов выполняются два запроса: выборка
+    результатов по фильтру и выборка всех их результатов заданий.
+    """
+    conditions = []
+    params: List[Any] = []
+
+    if lab_id is not None:
+        conditions.append("lab_id = ?")
+        params.append(lab_id)
+
+    if user_id is not None:
+        conditions.append("user_id = ?")
+        params.append(user_id)
+
+    query = "SELECT * FROM lab_results"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY id"
+
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        results = [dict(result) for result in cursor.fetchall()]
+        _attach_task_results(cursor, results)
+
+    return results
+
+
+# Допустимые поля сортировки страницы результатов
+LAB_RESULT_SORT_FIELDS = {
+    "id": "r.id",
+    "student": "u.last_name COLLATE NOCASE {order}, u.first_name COLLATE NOCASE",
+    "status": "r.status",
+    "started_at": "r.started_at",
+    "submitted_at": "r.submitted_at",
+    "score": "r.score",
+}
+
+
+def get_lab_results_page(lab_id: int, page: int, page_size: int, sort_by: str = "id", order: str = "asc",
+                         status: Optional[str] = None, search: Optional[str] = None) -> Dict[str, Any]:
+    """Страница результатов лабораторной работы с данными студентов
+
+    Данные студента присоединяются в том же запросе, поэтому страница любого
+    размера загружается двумя запросами (количество и сама страница).
+    Результаты заданий в страницу не включаются.
+    """
+    direction = "DESC" if order.lower() == "desc" else "ASC"
+    sort_expr = LAB_RESULT_SORT_FIELDS[sort_by].format(order=direction)
+
+    conditions = ["r.lab_id = ?"]
+    params: List[Any] = [lab_id]
+
+    if status:
+        conditions.append("r.status = ?")
+        params.append(status)
+
+    if search:
+        pattern = f"%{search}%"
+        conditions.append(
+            "(u.last_name LIKE ? OR u.first_name LIKE ? OR u.middle_name LIKE ? OR u.login LIKE ?)")
+        params.extend([pattern] * 4)
+
+    where = " AND ".join(conditions)
+    offset = (page - 1) * page_size
+
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT COUNT(*) FROM lab_results r
+            LEFT JOIN users u ON u.id = r.user_id
+            WHERE {where}
+        ''', params)
+        total = cursor.fetchone()[0]
+
+        cursor.execute(f'''
+            SELECT r.*,
+                   u.login AS student_login,
+                   u.last_name AS student_last_name,
+                   u.first_name AS student_first_name,
+                   u.middle_name AS student_middle_name
+            FROM lab_results r
+            LEFT JOIN users u ON u.id = r.user_id
+            WHERE {where}
+            ORDER BY {sort_expr} {direction}, r.id {direction}
+            LIMIT ? OFFSET ?
+        ''', params + [page_size, offset])
+        items = [dict(row) for row in cursor.fetchall()]
+
+    for item in items:
+        name = " ".join(part for part in (
+            item["student_last_name"], item["student_first_name"], item["student_middle_name"]) if part)
+        item["student_name"] = name or item["student_login"]
+
+    return {
+        "items": items,
+        "total": total,
+        "page": page,
+        "page_size": page_size,
+        "pages": (total + page_size - 1) // page_size
+    }
+
+
 def get_lab_results_by_user(user_id: int) -> List[Dict]:
     """Получение результатов выполнения лабораторных работ пользователя"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM lab_results WHERE user_id = ?", (user_id,))
-    results = []
-    for result in cursor.fetchall():
-        result_dict = dict(result)
-        results.append(result_dict)
-    conn.close()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM lab_results WHERE user_id = ?", (user_id,))
+        results = []
+        for result in cursor.fetchall():
+            result_dict = dict(result)
+            results.append(result_dict)
 
     return results
 
 
 def get_lab_results_by_lab(lab_id: int) -> List[Dict]:
     """Получение результатов выполнения лабораторной работы"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM lab_results WHERE lab_id = ?", (lab_id,))
-    results = []
-    for result in cursor.fetchall():
-        result_dict = dict(result)
-        results.append(result_dict)
-    conn.close()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM lab_results WHERE lab_id = ?", (lab_id,))
+        results = []
+        for result in cursor.fetchall():
+            result_dict = dict(result)
+            results.append(result_dict)
 
     return results
 
@@ -778,34 +980,45 @@ def update_lab_result(result_id: int, data: Dict) -> bool:
 
     values.append(result_id)
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        f"UPDATE lab_results SET {', '.join(fields)} WHERE id = ?",
-        values
-    )
-    success = cursor.rowcount > 0
-    conn.commit()
-    conn.close()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"UPDATE lab_results SET {', '.join(fields)} WHERE id = ?",
+            values
+        )
+        success = cursor.rowcount > 0
 
     return success
 
 
 def create_task_result(lab_result_id: int, task_id: int, answer: Optional[Dict] = None) -> int:
     """Создание результата выполнения задания"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO task_results (lab_result_id, task_id, answer) VALUES (?, ?, ?)",
-        (lab_result_id, task_id, json.dumps(answer) if answer else None)
-    )
-    task_result_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT INTO task_results (lab_result_id, task_id, answer) VALUES (?, ?, ?)",
+            (lab_result_id, task_id, json.dumps(answer) if answer else None)
+        )
+        task_result_id = cursor.lastrowid
 
     return task_result_id
 
 
+def create_task_results(lab_result_id: int, task_ids: List[int]) -> int:
+    """Создание пустых результатов для набора заданий одной транзакцией"""
+    if not task_ids:
+        return 0
+
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.executemany(
+            "INSERT INTO task_results (lab_result_id, task_id) VALUES (?, ?)",
+            [(lab_result_id, task_id) for task_id in task_ids]
+        )
+
+    return len(task_ids)
+
+
 def update_task_result(task_result_id: int, data: Dict) -> bool:
     """Обновление результата выполнения задания"""
     fields = []
@@ -828,14 +1041,12 @@ def update_task_result(task_result_id: int, data: Dict) -> bool:
 
     values.append(task_result_id)
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        f"UPDATE task_results SET {', '.join(fields)} WHERE id = ?",
-        values
-    )
-    success = cursor.rowcount > 0
-    conn.commit()
-    conn.close()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"UPDATE task_results SET {', '.join(fields)} WHERE id = ?",
+            values
+        )
+        success = cursor.rowcount > 0
 
     return success
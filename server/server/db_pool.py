@@ -0,0 +1,212 @@
+import sqlite3
+import time
+import queue
+from threading import Lock
+from typing import Dict, Any, Optional, Callable
+from config import logger
+
+
+class PoolTimeoutError(sqlite3.OperationalError):
+    """Не удалось получить соединение из пула за отведенное время"""
+
+
+class PooledConnection:
+    """Соединение, выданное пулом
+
+    Повторяет интерфейс sqlite3.Connection. close() не закрывает соединение,
+    а возвращает его в пул. В блоке with транзакция фиксируется при успешном
+    выходе и откатывается при исключении, после чего соединение возвращается.
+    """
+
+    def __init__(self, pool: "ConnectionPool", conn: sqlite3.Connection):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        conn = self.__dict__.get("_conn")
+        if conn is None:
+            raise sqlite3.ProgrammingError(
+                "Соединение уже возвращено в пул")
+        return getattr(conn, name)
+
+    def close(self):
+        """Возврат соединения в пул"""
+        conn = self._conn
+        if conn is None:
+            return
+        self._conn = None
+        self._pool.release(conn)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        conn = self._conn
+        if conn is not None:
+            try:
+                if exc_type is None:
+                    conn.commit()
+                else:
+                    conn.rollback()
+            finally:
+                self.close()
+        return False
+
+
+class ConnectionPool:
+    """Ограниченный пул постоянных соединений SQLite
+
+    Соединения создаются лениво до max_size, переводятся в режим WAL и
+    настраиваются один раз при создании. Подготовленные выражения
+    переиспользуются за счет кэша cached_statements каждого соединения.
+    """
+
+    PRAGMAS = (
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        "PRAGMA temp_store=MEMORY",
+        "PRAGMA cache_size=-16000",
+        "PRAGMA mmap_size=67108864",
+    )
+
+    def __init__(self, db_path: str, max_size: int = 8, timeout: float = 10.0,
+                 busy_timeout: float = 5.0, cached_statements: int = 256):
+        self.db_path = db_path
+        self.max_size = max(1, max_size)
+        self.timeout = timeout
+        self.busy_timeout = busy_timeout
+        self.cached_statements = cached_statements
+
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._lock = Lock()
+        self._closed = False
+        # Обработчик выполняемых SQL-запросов (для профилирования)
+        self._trace: Optional[Callable[[str], None]] = None
+
+        # Метрики
+        self.created = 0
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.acquired = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.total_wait_time = 0.0
+
+    def _create(self) -> sqlite3.Connection:
+        """Создание и настройка нового соединения"""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout,
+            check_same_thread=False,
+            cached_statements=self.cached_statements
+        )
+        conn.row_factory = sqlite3.Row
+        for pragma in self.PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        """Получение соединения из пула"""
+        if self._closed:
+            raise sqlite3.ProgrammingError("Пул соединений закрыт")
+
+        conn = None
+        create = False
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                if self.created < self.max_size:
+                    self.created += 1
+                    create = True
+
+        if create:
+            try:
+                conn = self._create()
+            except Exception:
+                with self._lock:
+                    self.created -= 1
+                raise
+        elif conn is None:
+            started = time.perf_counter()
+            try:
+                conn = self._idle.get(timeout=self.timeout)
+            except queue.Empty:
+                with self._lock:
+                    self.waits += 1
+                    self.timeouts += 1
+                raise PoolTimeoutError(
+                    f"Нет свободных соединений с БД ({self.max_size} занято)")
+            with self._lock:
+                self.waits += 1
+                self.total_wait_time += time.perf_counter() - started
+
+        with self._lock:
+            self.acquired += 1
+            self.in_use += 1
+            if self.in_use > self.peak_in_use:
+                self.peak_in_use = self.in_use
+
+        conn.set_trace_callback(self._trace)
+        return conn
+
+    def set_trace_callback(self, callback: Optional[Callable[[str], None]]):
+        """Установка обработчика SQL-запросов для выдаваемых соединений (None - отключить)"""
+        self._trace = callback
+
+    def release(self, conn: sqlite3.Connection):
+        """Возврат соединения в пул"""
+        with self._lock:
+            self.in_use -= 1
+
+        try:
+            # Не оставляем незавершенных транзакций для следующего владельца
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error as e:
+            logger.warning(f"Соединение с БД повреждено и будет закрыто: {e}")
+            self._discard(conn)
+            return
+
+        if self._closed:
+            self._discard(conn)
+        else:
+            self._idle.put(conn)
+
+    def _discard(self, conn: sqlite3.Connection):
+        """Закрытие соединения без возврата в пул"""
+        with self._lock:
+            self.created -= 1
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def connection(self) -> PooledConnection:
+        """Получение соединения с поддержкой протокола контекстного менеджера"""
+        return PooledConnection(self, self.acquire())
+
+    def close_all(self):
+        """Закрытие всех свободных соединений пула"""
+        self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Метрики пула соединений"""
+        with self._lock:
+            return {
+                "max_size": self.max_size,
+                "created": self.created,
+                "in_use": self.in_use,
+                "idle": self._idle.qsize(),
+                "peak_in_use": self.peak_in_use,
+                "acquired": self.acquired,
+                "waits": self.waits,
+                "timeouts": self.timeouts,
+                "avg_wait_ms": round(self.total_wait_time / self.waits * 1000, 3) if self.waits else 0.0
+            }
@@ -1,4 +1,5 @@
 import time
+import asyncio
 import webbrowser
 import uvicorn
 import subprocess
@@ -7,15 +8,21 @@ import signal
 import atexit
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Depends, HTTPException, status, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from typing import Dict, Any
 from threading import Thread
 
-from config import API_HOST, API_PORT, LOCAL_IP, API_KEY, logger
+from config import API_HOST, API_PORT, LOCAL_IP, API_KEY, GZIP_MIN_SIZE, logger
 import database
 from routers import api_router
-from services.mqtt_client import MQTTClient
+from services.mqtt_client import mqtt_client
+from services.sensor_ingest import sensor_writer
+from services.task_verifier import task_verifier
 from services.websocket.ws_manager import ws_manager
+from services.websocket.device_bridge import device_bridge
+from services.booking.expiry_scheduler import expiry_scheduler
 from utils.security import get_current_user
+from utils.executors import shutdown_executors
 
 # Пути к исполняемым файлам - укажите правильные пути для вашей системы
 MOSQUITTO_PATH = r"C:\Program Files\mosquitto\mosquitto.exe"
@@ -114,6 +121,12 @@ def stop_all_processes():
 
 # Регистрируем функцию для выполнения при завершении работы
 atexit.register(stop_all_processes)
+# Закрываем соединения с БД после записи накопленных показаний
+atexit.register(database.pool.close_all)
+# Дожидаемся завершения операций, вынесенных в пулы потоков
+atexit.register(shutdown_executors)
+# Дописываем накопленные показания сенсоров при завершении работы
+atexit.register(sensor_writer.stop)
 
 # Инициализация базы данных
 database.init_db()
@@ -135,6 +148,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Сжатие крупных ответов (списки устройств, лабораторных работ, результатов)
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MIN_SIZE)
+
 # Подключение роутеров
 app.include_router(api_router)
 
@@ -173,18 +189,18 @@ async def websocket_endpoint(websocket: WebSocket):
         # Подключаем WebSocket
         await ws_manager.connect(websocket, user["id"], user["role"])
 
-        # Отправляем приветственное сообщение
-        await ws_manager.send_personal_message(
-            {
-                "type": "connection_established",
-                "message": "Соединение установлено",
-                "user_id": user["id"],
-                "role": user["role"]
-            },
-            websocket
-        )
-
         try:
+            # Отправляем приветственное сообщение
+            await ws_manager.send_personal_message(
+                {
+                    "type": "connection_established",
+                    "message": "Соединение установлено",
+                    "user_id": user["id"],
+                    "role": user["role"]
+                },
+                websocket
+            )
+
             # Ожидаем сообщения от клиента
             while True:
                 data = await websocket.receive_json()
@@ -205,8 +221,22 @@ async def websocket_endpoint(websocket: WebSocket):
                     if lab_id:
                         await ws_manager.subscribe_to_lab(websocket, lab_id)
 
+                # Пакетная подписка на темы ("device:<id>", "lab:<id>", шаблоны "device:*")
+                elif data.get("type") == "subscribe":
+                    topics = data.get("topics")
+                    if isinstance(topics, list):
+                        await ws_manager.subscribe_topics(websocket, topics)
+
+                # Пакетная отписка от тем
+                elif data.get("type") == "unsubscribe":
+                    topics = data.get("topics")
+                    if isinstance(topics, list):
+                        await ws_manager.unsubscribe_topics(websocket, topics)
+
         except WebSocketDisconnect:
-            # Отключаем WebSocket при разрыве соединения
+            pass
+        finally:
+            # Канал, группы и подписки освобождаются при любом завершении
             ws_manager.disconnect(websocket, user["id"], user["role"])
 
     except HTTPException:
@@ -215,6 +245,33 @@ async def websocket_endpoint(websocket: WebSocket):
         logger.error(f"WebSocket error: {e}")
         await websocket.close(code=1011, reason="Internal server error")
 
+# Подключение моста обновлений устройств к циклу событий сервера
+
+
+@app.on_event("startup")
+async def attach_device_bridge():
+    """Передача состояний устройств из MQTT подписчикам WebSocket"""
+    device_bridge.attach(asyncio.get_running_loop())
+
+# Завершение бронирований по времени окончания
+
+
+@app.on_event("startup")
+async def start_booking_expiry():
+    """Запуск планировщика завершения бронирований"""
+    await expiry_scheduler.attach(asyncio.get_running_loop())
+
+# Гарантированная запись буфера показаний при остановке сервера
+
+
+@app.on_event("shutdown")
+async def flush_sensor_data():
+    """Остановка записи показаний с сохранением накопленных данных"""
+    device_bridge.detach()
+    expiry_scheduler.detach()
+    task_verifier.stop()
+    sensor_writer.stop()
+
 # Middleware для логирования запросов
 
 
@@ -240,21 +297,6 @@ def open_api_docs():
     webbrowser.open(url)
     logger.info(f"Открыт браузер с документацией API: {url}")
 
-# Функция для периодической очистки истекших бронирований
-
-
-def cleanup_expired_bookings_task():
-    from services.booking import booking_service
-
-    while True:
-        try:
-            booking_service.cleanup_expired_bookings()
-        except Exception as e:
-            logger.error(f"Ошибка при очистке истекших бронирований: {e}")
-
-        # Проверяем каждые 5 минут
-        time.sleep(300)
-
 # Обработчик сигналов для корректного завершения
 
 
@@ -296,13 +338,14 @@ def main():
     logger.info(
         f"Для доступа к API с других устройств используйте заголовок 'X-API-Key: {API_KEY}'")
 
-    # Запуск MQTT клиента в отдельном потоке
-    mqtt_client = MQTTClient()
-    mqtt_thread = mqtt_client.start()
+    # Запуск потока пакетной записи показаний сенсоров
+    sensor_writer.start()
 
-    # Запуск задачи очистки истекших бронирований
-    cleanup_thread = Thread(target=cleanup_expired_bookings_task, daemon=True)
-    cleanup_thread.start()
+    # Запуск автоматической проверки заданий с устройствами
+    task_verifier.start()
+
+    # Запуск общего MQTT клиента в отдельном потоке
+    mqtt_thread = mqtt_client.start()
 
     # Запускаем отдельный поток для открытия браузера после запуска сервера
     # Задержка в 2 секунды, чтобы сервер успел запуститься
@@ -62,3 +62,16 @@ class BookingResponse(BaseModel):
     booking_id: Optional[int] = None
     message: str
     position_in_queue: Optional[int] = None
+
+
+class FreeSlot(BaseModel):
+    """Свободный промежуток времени"""
+    start: datetime
+    end: datetime
+
+
+class FreeSlotsResponse(BaseModel):
+    """Свободные промежутки нескольких устройств в заданном окне"""
+    start_time: datetime
+    end_time: datetime
+    devices: Dict[str, List[FreeSlot]]
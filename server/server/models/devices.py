@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, Dict, List, Any
 
 
@@ -12,6 +12,13 @@ class DeviceHistoryParams(BaseModel):
     end_date: Optional[str] = None
 
 
+class DeviceAggregateParams(BaseModel):
+    start_date: Optional[str] = None  # По умолчанию - последние сутки
+    end_date: Optional[str] = None
+    buckets: int = Field(100, ge=1, le=2000)
+    fields: Optional[str] = None  # Список полей через запятую
+
+
 class GroupModel(BaseModel):
     name: str
     devices: List[str]
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, Dict, List, Any
 
 
@@ -11,8 +11,13 @@ class TaskBase(BaseModel):
     max_score: float = 10.0
 
 
+class TaskDevice(BaseModel):
+    device_id: str
+    required_state: Optional[Dict[str, Any]] = None  # Условия автоматической проверки
+
+
 class TaskCreate(TaskBase):
-    pass
+    devices: Optional[List[TaskDevice]] = None
 
 
 class TaskUpdate(BaseModel):
@@ -21,6 +26,7 @@ class TaskUpdate(BaseModel):
     content: Optional[Dict[str, Any]] = None
     order_index: Optional[int] = None
     max_score: Optional[float] = None
+    devices: Optional[List[TaskDevice]] = None  # Заменяет список устройств задания
 
 
 class Task(TaskBase):
@@ -100,3 +106,29 @@ class LabResult(LabResultBase):
     reviewed_by: Optional[int] = None
     reviewed_at: Optional[str] = None
     task_results: Optional[List[TaskResult]] = None
+
+
+class LabResultsQuery(BaseModel):
+    expand: bool = False  # Постраничный ответ с данными студентов
+    page: int = Field(1, ge=1)
+    page_size: int = Field(50, ge=1, le=500)
+    sort_by: str = "id"  # "id", "student", "status", "started_at", "submitted_at", "score"
+    order: str = "asc"  # "asc", "desc"
+    status: Optional[str] = None  # Фильтр по статусу результата
+    search: Optional[str] = None  # Подстрока ФИО или логина студента
+
+
+class LabResultExpanded(LabResult):
+    student_login: Optional[str] = None
+    student_last_name: Optional[str] = None
+    student_first_name: Optional[str] = None
+    student_middle_name: Optional[str] = None
+    student_name: Optional[str] = None
+
+
+class LabResultsPage(BaseModel):
+    items: List[LabResultExpanded]
+    total: int
+    page: int
+    page_size: int
+    pages: int
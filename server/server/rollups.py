@@ -0,0 +1,221 @@
+import json
+import sqlite3
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Iterable, Tuple
+from config import logger
+import timeseries
+
+# Разрешения агрегатов: имя -> (шаг в секундах, длина префикса ISO-метки, дополнение)
+RESOLUTIONS = {
+    "1m": (60, 16, ":00"),
+    "1h": (3600, 13, ":00:00"),
+    "1d": (86400, 10, "T00:00:00"),
+}
+
+# Порядок от мелкого разрешения к крупному
+RESOLUTION_ORDER = ["1m", "1h", "1d"]
+
+
+def rollup_table(resolution: str) -> str:
+    """Имя таблицы агрегатов для разрешения"""
+    return f"sensor_rollup_{resolution}"
+
+
+def bucket_start(timestamp: str, resolution: str) -> str:
+    """Начало интервала агрегации для метки времени в формате ISO"""
+    _, prefix, suffix = RESOLUTIONS[resolution]
+    return timestamp[:prefix] + suffix
+
+
+def numeric_fields(data: Dict[str, Any]) -> Iterable[Tuple[str, float]]:
+    """Числовые поля показаний (логические значения не агрегируются)"""
+    for field, value in data.items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield field, float(value)
+
+
+def init_rollups(cursor: sqlite3.Cursor):
+    """Создание таблиц агрегатов и их первичное заполнение из секций показаний"""
+    created = False
+    for resolution in RESOLUTION_ORDER:
+        table = rollup_table(resolution)
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+        if cursor.fetchone() is None:
+            created = True
+        cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS {table} (
+            device_id TEXT NOT NULL,
+            field TEXT NOT NULL,
+            bucket_start DATETIME NOT NULL,
+            count INTEGER NOT NULL,
+            min REAL NOT NULL,
+            max REAL NOT NULL,
+            sum REAL NOT NULL,
+            last REAL NOT NULL,
+            last_ts DATETIME NOT NULL,
+            PRIMARY KEY (device_id, field, bucket_start)
+        ) WITHOUT ROWID
+        ''')
+
+    if created:
+        rebuild_rollups(cursor)
+
+
+def rebuild_rollups(cursor: sqlite3.Cursor, chunk_size: int = 5000) -> int:
+    """Полный пересчет агрегатов по всем секциям показаний"""
+    for resolution in RESOLUTION_ORDER:
+        cursor.execute(f"DELETE FROM {rollup_table(resolution)}")
+
+    total = 0
+    for _, name in reversed(timeseries.get_partitions()):
+        read_cursor = cursor.connection.cursor()
+        read_cursor.execute(
+            f"SELECT device_id, timestamp, data FROM {name} ORDER BY id")
+        while True:
+            chunk = read_cursor.fetchmany(chunk_size)
+            if not chunk:
+                break
+            rows = []
+            for device_id, timestamp, data in chunk:
+                try:
+                    rows.append((device_id, timestamp, json.loads(data)))
+                except (TypeError, ValueError):
+                    continue
+            apply_rows(cursor, rows)
+            total += len(chunk)
+
+    if total:
+        logger.info(f"Агрегаты показаний пересчитаны по {total} строкам")
+    return total
+
+
+def apply_rows(cursor: sqlite3.Cursor, rows: Iterable[Tuple[str, str, Dict[str, Any]]]) -> int:
+    """Учет пакета показаний (device_id, timestamp, data) во всех разрешениях
+
+    Пакет сначала сворачивается в памяти, затем каждый интервал объединяется
+    с уже сохраненным одним UPSERT-запросом.
+    """
+    # (разрешение, device_id, поле, начало интервала) -> [count, min, max, sum, last, last_ts]
+    buckets: Dict[Tuple[str, str, str, str], List[Any]] = {}
+
+    for device_id, timestamp, data in rows:
+        if not isinstance(data, dict):
+            continue
+        for field, value in numeric_fields(data):
+            for resolution in RESOLUTION_ORDER:
+                key = (resolution, device_id, field,
+                       bucket_start(timestamp, resolution))
+                agg = buckets.get(key)
+                if agg is None:
+                    buckets[key] = [1, value, value, value, value, timestamp]
+                    continue
+                agg[0] += 1
+                if value < agg[1]:
+                    agg[1] = value
+                if value > agg[2]:
+                    agg[2] = value
+                agg[3] += value
+                if timestamp >= agg[5]:
+                    agg[4] = value
+                    agg[5] = timestamp
+
+    by_resolution: Dict[str, List[tuple]] = {}
+    for (resolution, device_id, field, start), agg in buckets.items():
+        by_resolution.setdefault(resolution, []).append(
+            (device_id, field, start, *agg))
+
+    for resolution, params in by_resolution.items():
+        table = rollup_table(resolution)
+        cursor.executemany(f'''
+            INSERT INTO {table} (device_id, field, bucket_start, count, min, max, sum, last, last_ts)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (device_id, field, bucket_start) DO UPDATE SET
+                count = count + excluded.count,
+                min = MIN(min, excluded.min),
+                max = MAX(max, excluded.max),
+                sum = sum + excluded.sum,
+                last = CASE WHEN excluded.last_ts >= last_ts THEN excluded.last ELSE last END,
+                last_ts = MAX(last_ts, excluded.last_ts)
+        ''', params)
+
+    return len(buckets)
+
+
+def choose_resolution(span_seconds: float, buckets: int) -> str:
+    """Самое крупное разрешение, шаг которого не превышает ширину целевого интервала"""
+    target = span_seconds / max(1, buckets)
+    chosen = RESOLUTION_ORDER[0]
+    for resolution in RESOLUTION_ORDER:
+        if RESOLUTIONS[resolution][0] <= target:
+            chosen = resolution
+    return chosen
+
+
+def query_aggregate(cursor: sqlite3.Cursor, device_id: str, start: datetime, end: datetime,
+                    buckets: int, fields: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Агрегированная история устройства, разбитая на buckets интервалов"""
+    span = max(1.0, (end - start).total_seconds())
+    resolution = choose_resolution(span, buckets)
+    step = RESOLUTIONS[resolution][0]
+
+    # Ширина выходного интервала кратна шагу выбранного разрешения
+    width = max(step, -(-int(span) // max(1, buckets)))
+    width = -(-width // step) * step
+
+    query = f'''
+        SELECT field, bucket_start, count, min, max, sum, last, last_ts
+        FROM {rollup_table(resolution)}
+        WHERE device_id = ? AND bucket_start >= ? AND bucket_start < ?
+    '''
+    params: List[Any] = [
+        device_id,
+        bucket_start(start.isoformat(), resolution),
+        end.isoformat()
+    ]
+    if fields:
+        query += f" AND field IN ({', '.join('?' for _ in fields)})"
+        params.extend(fields)
+    query += " ORDER BY bucket_start"
+    cursor.execute(query, params)
+
+    # поле -> индекс выходного интервала -> [count, min, max, sum, last, last_ts]
+    merged: Dict[str, Dict[int, List[Any]]] = {}
+    for field, native_start, count, vmin, vmax, vsum, last, last_ts in cursor.fetchall():
+        offset = (datetime.fromisoformat(native_start) - start).total_seconds()
+        index = max(0, int(offset // width))
+        series = merged.setdefault(field, {})
+        agg = series.get(index)
+        if agg is None:
+            series[index] = [count, vmin, vmax, vsum, last, last_ts]
+            continue
+        agg[0] += count
+        agg[1] = min(agg[1], vmin)
+        agg[2] = max(agg[2], vmax)
+        agg[3] += vsum
+        if last_ts >= agg[5]:
+            agg[4] = last
+            agg[5] = last_ts
+
+    start_ts = start.timestamp()
+    result = {}
+    for field, series in merged.items():
+        result[field] = [
+            {
+                "timestamp": datetime.fromtimestamp(start_ts + index * width).isoformat(),
+                "count": agg[0],
+                "min": agg[1],
+                "max": agg[2],
+                "avg": agg[3] / agg[0],
+                "last": agg[4]
+            } for index, agg in sorted(series.items())
+        ]
+
+    return {
+        "device_id": device_id,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "resolution": resolution,
+        "bucket_seconds": width,
+        "series": result
+    }
@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from routers import auth, users, devices, groups, labs, network, pairing
+from routers import auth, users, devices, groups, labs, network, pairing, system
 from routers.booking import booking
 
 api_router = APIRouter()
@@ -12,3 +12,4 @@ api_router.include_router(labs.router)
 api_router.include_router(network.router)
 api_router.include_router(pairing.router)
 api_router.include_router(booking.router)
+api_router.include_router(system.router)
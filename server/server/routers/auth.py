@@ -16,7 +16,7 @@ router = APIRouter(
 @router.post("/token", response_model=Token)
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
     """Получение токена доступа"""
-    user = auth_service.authenticate_user(
+    user = await auth_service.authenticate_user(
         form_data.username, form_data.password)
     if not user:
         raise HTTPException(
@@ -37,7 +37,7 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
 @router.post("/login", response_model=Token)
 async def login(form_data: LoginForm):
     """Вход в систему"""
-    user = auth_service.authenticate_user(
+    user = await auth_service.authenticate_user(
         form_data.username, form_data.password)
     if not user:
         raise HTTPException(
@@ -58,7 +58,7 @@ async def login(form_data: LoginForm):
 @router.post("/register", response_model=User)
 async def register(user_data: UserCreate):
     """Регистрация нового пользователя"""
-    user = auth_service.register_user(
+    user = await auth_service.register_user(
         user_data.login,
         user_data.password,
         user_data.last_name,
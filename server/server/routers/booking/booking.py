@@ -1,10 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
-from typing import List, Dict, Any
+from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks, Query
+from typing import List, Dict, Any, Optional
 from datetime import datetime, timedelta
-from models.booking.booking import BookingCreate, BookingUpdate, Booking, DeviceAvailability, BookingRequest, BookingResponse
+from models.booking.booking import BookingCreate, BookingUpdate, Booking, DeviceAvailability, BookingRequest, BookingResponse, FreeSlotsResponse
 from services.booking import booking_service
 from utils.security import get_current_active_user
-from services.websocket import ws_manager
+from utils.executors import run_db
+from services.websocket.ws_manager import ws_manager
 
 router = APIRouter(
     prefix="/api/booking",
@@ -12,6 +13,45 @@ router = APIRouter(
     responses={401: {"description": "Unauthorized"}},
 )
 
+# Ограничения запроса свободных промежутков
+FREE_SLOTS_MAX_DEVICES = 100
+FREE_SLOTS_MAX_WINDOW = timedelta(days=31)
+
+
+@router.get("/devices/free-slots", response_model=FreeSlotsResponse)
+async def get_free_slots(
+    device_ids: List[str] = Query(..., alias="device_id"),
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+    min_duration: int = Query(0, ge=0, description="Минимальная длительность, минуты"),
+    current_user: Dict[str, Any] = Depends(get_current_active_user)
+):
+    """Свободные промежутки нескольких устройств в заданном окне (по умолчанию - ближайшие сутки)"""
+    start_time = max(start_time or datetime.now(), datetime.now())
+    end_time = end_time or start_time + timedelta(days=1)
+
+    if start_time >= end_time:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Время начала должно быть раньше времени окончания"
+        )
+    if end_time - start_time > FREE_SLOTS_MAX_WINDOW:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Окно поиска не может превышать {FREE_SLOTS_MAX_WINDOW.days} дней"
+        )
+
+    device_ids = list(dict.fromkeys(device_ids))
+    if len(device_ids) > FREE_SLOTS_MAX_DEVICES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Можно запросить не более {FREE_SLOTS_MAX_DEVICES} устройств"
+        )
+
+    devices = await run_db(
+        booking_service.get_free_slots, device_ids, start_time, end_time, timedelta(minutes=min_duration))
+    return FreeSlotsResponse(start_time=start_time, end_time=end_time, devices=devices)
+
 
 @router.get("/devices/{device_id}/availability")
 async def get_device_availability(
@@ -22,18 +62,15 @@ async def get_device_availability(
     # Проверяем, что устройство существует
     from services import devices as devices_service
     try:
-        devices_service.get_device(device_id)
+        await run_db(devices_service.get_device, device_id)
     except HTTPException:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Устройство не найдено"
         )
 
-    # Очищаем истекшие бронирования
-    booking_service.cleanup_expired_bookings()
-
     # Получаем информацию о доступности
-    availability = booking_service.get_device_availability(device_id)
+    availability = await run_db(booking_service.get_device_availability, device_id)
     return availability
 
 
@@ -46,18 +83,15 @@ async def get_device_queue(
     # Проверяем, что устройство существует
     from services import devices as devices_service
     try:
-        devices_service.get_device(device_id)
+        await run_db(devices_service.get_device, device_id)
     except HTTPException:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Устройство не найдено"
         )
 
-    # Очищаем истекшие бронирования
-    booking_service.cleanup_expired_bookings()
-
     # Получаем очередь
-    queue = booking_service.get_device_queue(device_id)
+    queue = await run_db(booking_service.get_device_queue, device_id)
     return queue
 
 
@@ -72,7 +106,7 @@ async def book_device(
     # Проверяем, что устройство существует
     from services import devices as devices_service
     try:
-        devices_service.get_device(device_id)
+        await run_db(devices_service.get_device, device_id)
     except HTTPException:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -93,52 +127,27 @@ async def book_device(
             detail="Время начала не может быть в прошлом"
         )
 
-    # Очищаем истекшие бронирования
-    booking_service.cleanup_expired_bookings()
-
-    # Проверяем доступность устройства
-    if not booking_service.is_device_available(device_id, booking_data.start_time, booking_data.end_time):
-        # Получаем информацию о текущей очереди
-        queue = booking_service.get_device_queue(device_id)
-
-        return BookingResponse(
-            success=False,
-            message="Устройство недоступно в указанное время",
-            position_in_queue=len(queue) + 1
-        )
-
     try:
-        # Создаем бронирование
-        booking_id = booking_service.create_booking(
+        # Проверка доступности и создание бронирования выполняются атомарно
+        booking_id = await run_db(
+            booking_service.create_booking,
             device_id,
             current_user["id"],
             booking_data.start_time,
             booking_data.end_time,
             booking_data.purpose
         )
+    except HTTPException as e:
+        if e.status_code != status.HTTP_409_CONFLICT:
+            raise
 
-        # Отправляем уведомление через WebSocket
-        background_tasks.add_task(
-            ws_manager.broadcast_booking_notification,
-            device_id,
-            current_user["id"],
-            "created",
-            {
-                "booking_id": booking_id,
-                "device_id": device_id,
-                "start_time": booking_data.start_time.isoformat(),
-                "end_time": booking_data.end_time.isoformat(),
-                "user": {
-                    "id": current_user["id"],
-                    "login": current_user["login"]
-                }
-            }
-        )
+        # Получаем информацию о текущей очереди
+        availability = await run_db(booking_service.get_device_availability, device_id)
 
         return BookingResponse(
-            success=True,
-            booking_id=booking_id,
-            message="Устройство успешно забронировано"
+            success=False,
+            message="Устройство недоступно в указанное время",
+            position_in_queue=availability.queue_length + 1
         )
     except Exception as e:
         raise HTTPException(
@@ -146,17 +155,38 @@ async def book_device(
             detail=f"Ошибка при бронировании: {str(e)}"
         )
 
+    # Отправляем уведомление через WebSocket
+    background_tasks.add_task(
+        ws_manager.broadcast_booking_notification,
+        device_id,
+        current_user["id"],
+        "created",
+        {
+            "booking_id": booking_id,
+            "device_id": device_id,
+            "start_time": booking_data.start_time.isoformat(),
+            "end_time": booking_data.end_time.isoformat(),
+            "user": {
+                "id": current_user["id"],
+                "login": current_user["login"]
+            }
+        }
+    )
+
+    return BookingResponse(
+        success=True,
+        booking_id=booking_id,
+        message="Устройство успешно забронировано"
+    )
+
 
 @router.get("/user/bookings")
 async def get_user_bookings(
     current_user: Dict[str, Any] = Depends(get_current_active_user)
 ):
     """Получение всех бронирований пользователя"""
-    # Очищаем истекшие бронирования
-    booking_service.cleanup_expired_bookings()
-
     # Получаем бронирования пользователя
-    bookings = booking_service.get_user_bookings(current_user["id"])
+    bookings = await run_db(booking_service.get_user_bookings, current_user["id"])
     return bookings
 
 
@@ -166,7 +196,7 @@ async def get_booking(
     current_user: Dict[str, Any] = Depends(get_current_active_user)
 ):
     """Получение информации о бронировании"""
-    booking = booking_service.get_booking(booking_id)
+    booking = await run_db(booking_service.get_booking, booking_id)
     if not booking:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -191,7 +221,7 @@ async def update_booking(
     current_user: Dict[str, Any] = Depends(get_current_active_user)
 ):
     """Обновление бронирования"""
-    booking = booking_service.get_booking(booking_id)
+    booking = await run_db(booking_service.get_booking, booking_id)
     if not booking:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -214,7 +244,7 @@ async def update_booking(
 
     # Обновляем данные
     data = booking_data.dict(exclude_unset=True)
-    success = booking_service.update_booking(booking_id, data)
+    success = await run_db(booking_service.update_booking, booking_id, data)
 
     if success:
         # Отправляем уведомление через WebSocket
@@ -245,7 +275,7 @@ async def cancel_booking(
     current_user: Dict[str, Any] = Depends(get_current_active_user)
 ):
     """Отмена бронирования"""
-    booking = booking_service.get_booking(booking_id)
+    booking = await run_db(booking_service.get_booking, booking_id)
     if not booking:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -263,7 +293,7 @@ async def cancel_booking(
         )
 
     # Отменяем бронирование
-    success = booking_service.cancel_booking(booking_id)
+    success = await run_db(booking_service.cancel_booking, booking_id)
 
     if success:
         # Отправляем уведомление через WebSocket
@@ -1,11 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
 from typing import Dict, List, Any, Optional
 import json
-from models.devices import CommandModel, DeviceHistoryParams
+from models.devices import CommandModel, DeviceHistoryParams, DeviceAggregateParams
 from services import devices as devices_service
 from utils.security import get_current_active_user
+from utils.executors import run_db
+from utils.response_cache import response_cache, DEVICES
 from config import devices_cache, device_states, API_KEY, groups_cache, MQTT_TOPIC_PUBLISH_PREFIX
-from services.mqtt_client import MQTTClient
+from services.mqtt_client import MQTTClient, BridgeRequestTimeout, get_mqtt_client
 
 router = APIRouter(
     prefix="/api/devices",
@@ -14,12 +16,25 @@ router = APIRouter(
 )
 
 
-@router.get("/")
-async def get_devices(current_user: Dict[str, Any] = Depends(get_current_active_user)):
-    """Получение списка всех устройств и их текущих состояний"""
+async def _build_devices():
     return devices_service.get_all_devices()
 
 
+@router.get("/")
+async def get_devices(request: Request, current_user: Dict[str, Any] = Depends(get_current_active_user)):
+    """Получение списка всех устройств и их текущих состояний (поддерживает If-None-Match)"""
+    return await response_cache.respond(request, DEVICES, _build_devices)
+
+
+@router.get("/changes")
+async def get_device_changes(
+    since: Optional[int] = Query(None, ge=0, description="Курсор из предыдущего ответа (seq)"),
+    current_user: Dict[str, Any] = Depends(get_current_active_user)
+):
+    """Устройства, изменившиеся после курсора since (или полный список с resync=true)"""
+    return devices_service.get_device_changes(since)
+
+
 @router.get("/{device_id}")
 async def get_device(device_id: str, current_user: Dict[str, Any] = Depends(get_current_active_user)):
     """Получение текущего состояния конкретного устройства"""
@@ -33,7 +48,8 @@ async def get_device_history(
     current_user: Dict[str, Any] = Depends(get_current_active_user)
 ):
     """Получение истории показаний устройства"""
-    return devices_service.get_device_history(
+    return await run_db(
+        devices_service.get_device_history,
         device_id,
         params.limit,
         params.start_date,
@@ -41,12 +57,36 @@ async def get_device_history(
     )
 
 
+@router.get("/{device_id}/history/aggregate")
+async def get_device_history_aggregate(
+    device_id: str,
+    params: DeviceAggregateParams = Depends(),
+    current_user: Dict[str, Any] = Depends(get_current_active_user)
+):
+    """
+    Получение агрегированной истории показаний устройства
+
+    - buckets: Количество интервалов, на которые разбивается период
+    - fields: Поля показаний через запятую (по умолчанию все числовые)
+    """
+    fields = [f.strip() for f in params.fields.split(",")
+              if f.strip()] if params.fields else None
+    return await run_db(
+        devices_service.get_device_history_aggregate,
+        device_id,
+        params.start_date,
+        params.end_date,
+        params.buckets,
+        fields
+    )
+
+
 @router.post("/{device_id}/command")
 async def send_device_command(
     device_id: str,
     command_data: CommandModel,
     current_user: Dict[str, Any] = Depends(get_current_active_user),
-    mqtt_client: MQTTClient = Depends(lambda: MQTTClient())
+    mqtt_client: MQTTClient = Depends(get_mqtt_client)
 ):
     """Отправить команду устройству"""
     if not command_data.command:
@@ -79,7 +119,7 @@ async def send_device_command(
 @router.post("/refresh")
 async def refresh_devices(
     current_user: Dict[str, Any] = Depends(get_current_active_user),
-    mqtt_client: MQTTClient = Depends(lambda: MQTTClient())
+    mqtt_client: MQTTClient = Depends(get_mqtt_client)
 ):
     """Принудительно обновить кэш устройств"""
     success = mqtt_client.request_devices()
@@ -100,7 +140,7 @@ async def remove_device(
     device_id: str,
     force: bool = Query(False),
     current_user: Dict[str, Any] = Depends(get_current_active_user),
-    mqtt_client: MQTTClient = Depends(lambda: MQTTClient())
+    mqtt_client: MQTTClient = Depends(get_mqtt_client)
 ):
     """
     Удалить устройство из сети
@@ -123,15 +163,17 @@ async def remove_device(
 
     try:
         # Отправляем команду в zigbee2mqtt для удаления устройства
-        mqtt_client.client.publish(
-            f"{MQTT_TOPIC_PUBLISH_PREFIX}/bridge/request/device/remove",
-            json.dumps({"id": device_id, "force": force})
-        )
+        await mqtt_client.bridge_request("device/remove", {"id": device_id, "force": force})
 
         # Запрашиваем обновление списка устройств
         mqtt_client.request_devices()
 
         return {"success": True, "message": f"Устройство {device_id} удалено"}
+    except BridgeRequestTimeout as e:
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -1,12 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Request
 from typing import Dict, List, Any, Optional
-import json
-import time
+import asyncio
 from models.devices import GroupModel
 from services import devices as devices_service
 from utils.security import get_current_active_user
-from config import MQTT_TOPIC_PUBLISH_PREFIX
-from services.mqtt_client import MQTTClient
+from utils.executors import run_db
+from utils.response_cache import response_cache, GROUPS
+from services.mqtt_client import MQTTClient, BridgeRequestTimeout, get_mqtt_client
 
 router = APIRouter(
     prefix="/api/groups",
@@ -16,22 +16,23 @@ router = APIRouter(
 
 
 @router.get("/")
-async def get_groups(current_user: Dict[str, Any] = Depends(get_current_active_user)):
-    """Получить все группы устройств"""
-    return devices_service.get_all_groups()
+async def get_groups(request: Request, current_user: Dict[str, Any] = Depends(get_current_active_user)):
+    """Получить все группы устройств (поддерживает If-None-Match)"""
+    return await response_cache.respond(
+        request, GROUPS, lambda: run_db(devices_service.get_all_groups))
 
 
 @router.get("/{group_id}")
 async def get_group(group_id: int, current_user: Dict[str, Any] = Depends(get_current_active_user)):
     """Получить группу по ID"""
-    return devices_service.get_group(group_id)
+    return await run_db(devices_service.get_group, group_id)
 
 
 @router.post("/")
 async def create_group(
     group: GroupModel,
     current_user: Dict[str, Any] = Depends(get_current_active_user),
-    mqtt_client: MQTTClient = Depends(lambda: MQTTClient())
+    mqtt_client: MQTTClient = Depends(get_mqtt_client)
 ):
     """Создать новую группу устройств"""
     # Проверяем, что пользователь имеет права администратора или преподавателя
@@ -41,28 +42,25 @@ async def create_group(
             detail="Недостаточно прав для создания групп"
         )
 
-    # Создаем группу в zigbee2mqtt
+    # Создаем группу в zigbee2mqtt и дожидаемся подтверждения моста
     try:
-        mqtt_client.client.publish(
-            f"{MQTT_TOPIC_PUBLISH_PREFIX}/bridge/request/group/add",
-            json.dumps({"friendly_name": group.name})
-        )
-
-        # Ждем небольшую паузу для обработки запроса
-        time.sleep(0.5)
+        await mqtt_client.bridge_request("group/add", {"friendly_name": group.name})
 
         # Добавляем устройства в группу
-        for device_id in group.devices:
-            mqtt_client.client.publish(
-                f"{MQTT_TOPIC_PUBLISH_PREFIX}/bridge/request/group/members/add",
-                json.dumps({
-                    "group": group.name,
-                    "device": device_id
-                })
-            )
+        await asyncio.gather(*[
+            mqtt_client.bridge_request("group/members/add", {
+                "group": group.name,
+                "device": device_id
+            }) for device_id in group.devices
+        ])
 
         # Запрашиваем обновление списка групп
         mqtt_client.request_groups()
+    except BridgeRequestTimeout as e:
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -70,8 +68,8 @@ async def create_group(
         )
 
     # Создаем группу в локальной БД
-    group_data = devices_service.create_group(
-        group.name, group.devices, group.description)
+    group_data = await run_db(
+        devices_service.create_group, group.name, group.devices, group.description)
 
     return group_data
 
@@ -81,7 +79,7 @@ async def update_group(
     group_id: int,
     group: GroupModel,
     current_user: Dict[str, Any] = Depends(get_current_active_user),
-    mqtt_client: MQTTClient = Depends(lambda: MQTTClient())
+    mqtt_client: MQTTClient = Depends(get_mqtt_client)
 ):
     """Обновить существующую группу устройств"""
     # Проверяем, что пользователь имеет права администратора или преподавателя
@@ -92,47 +90,41 @@ async def update_group(
         )
 
     # Получаем текущую информацию о группе
-    current_group = devices_service.get_group(group_id)
+    current_group = await run_db(devices_service.get_group, group_id)
 
     # Обновляем название группы в zigbee2mqtt, если оно изменилось
     try:
         if current_group["name"] != group.name:
-            mqtt_client.client.publish(
-                f"{MQTT_TOPIC_PUBLISH_PREFIX}/bridge/request/group/rename",
-                json.dumps({
-                    "old": current_group["name"],
-                    "new": group.name
-                })
-            )
+            await mqtt_client.bridge_request("group/rename", {
+                "old": current_group["name"],
+                "new": group.name
+            })
 
         # Обновляем состав устройств
         current_devices = set(current_group["devices"])
         new_devices = set(group.devices)
 
-        # Добавляем новые устройства в группу
+        # Добавляем новые устройства в группу и удаляем исключенные
         devices_to_add = new_devices - current_devices
-        for device_id in devices_to_add:
-            mqtt_client.client.publish(
-                f"{MQTT_TOPIC_PUBLISH_PREFIX}/bridge/request/group/members/add",
-                json.dumps({
-                    "group": group.name,
-                    "device": device_id
-                })
-            )
-
-        # Удаляем устройства из группы
         devices_to_remove = current_devices - new_devices
-        for device_id in devices_to_remove:
-            mqtt_client.client.publish(
-                f"{MQTT_TOPIC_PUBLISH_PREFIX}/bridge/request/group/members/remove",
-                json.dumps({
-                    "group": group.name,
-                    "device": device_id
-                })
-            )
+        await asyncio.gather(
+            *[mqtt_client.bridge_request("group/members/add", {
+                "group": group.name,
+                "device": device_id
+            }) for device_id in devices_to_add],
+            *[mqtt_client.bridge_request("group/members/remove", {
+                "group": group.name,
+                "device": device_id
+            }) for device_id in devices_to_remove]
+        )
 
         # Запрашиваем обновление списка групп
         mqtt_client.request_groups()
+    except BridgeRequestTimeout as e:
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -140,7 +132,7 @@ async def update_group(
         )
 
     # Обновляем группу в локальной БД
-    updated_group = devices_service.update_group(group_id, {
+    updated_group = await run_db(devices_service.update_group, group_id, {
         "name": group.name,
         "description": group.description,
         "devices": group.devices
@@ -153,7 +145,7 @@ async def update_group(
 async def delete_group(
     group_id: int,
     current_user: Dict[str, Any] = Depends(get_current_active_user),
-    mqtt_client: MQTTClient = Depends(lambda: MQTTClient())
+    mqtt_client: MQTTClient = Depends(get_mqtt_client)
 ):
     """Удалить группу устройств"""
     # Проверяем, что пользователь имеет права администратора или преподавателя
@@ -164,17 +156,19 @@ async def delete_group(
         )
 
     # Получаем информацию о группе
-    group = devices_service.get_group(group_id)
+    group = await run_db(devices_service.get_group, group_id)
 
     # Удаляем группу из zigbee2mqtt
     try:
-        mqtt_client.client.publish(
-            f"{MQTT_TOPIC_PUBLISH_PREFIX}/bridge/request/group/remove",
-            json.dumps({"group": group["name"]})
-        )
+        await mqtt_client.bridge_request("group/remove", {"group": group["name"]})
 
         # Запрашиваем обновление списка групп
         mqtt_client.request_groups()
+    except BridgeRequestTimeout as e:
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -182,6 +176,6 @@ async def delete_group(
         )
 
     # Удаляем группу из локальной БД
-    devices_service.delete_group(group_id)
+    await run_db(devices_service.delete_group, group_id)
 
     return {"status": "success", "message": f"Группа {group_id} удалена"}
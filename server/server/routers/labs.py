@@ -1,8 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List, Dict, Any, Optional
-from models.labs import Lab, LabCreate, LabUpdate, Task, TaskCreate, TaskUpdate, LabResult, LabResultCreate, LabResultUpdate, TaskResult, TaskResultUpdate
+from fastapi import APIRouter, Depends, HTTPException, status, Request
+from typing import List, Dict, Any, Optional, Union
+from models.labs import Lab, LabCreate, LabUpdate, Task, TaskCreate, TaskUpdate, LabResult, LabResultCreate, LabResultUpdate, TaskResult, TaskResultUpdate, LabResultsQuery, LabResultsPage
 from services import labs as labs_service
 from utils.security import get_current_active_user
+from utils.executors import run_db
+from utils.response_cache import response_cache, LABS
 import database
 
 router = APIRouter(
@@ -12,16 +14,21 @@ router = APIRouter(
 )
 
 
+async def _build_labs():
+    labs = await run_db(labs_service.get_all_labs)
+    return [Lab.model_validate(lab) for lab in labs]
+
+
 @router.get("/", response_model=List[Lab])
-async def get_labs(current_user: Dict[str, Any] = Depends(get_current_active_user)):
-    """Получение списка всех лабораторных работ"""
-    return labs_service.get_all_labs()
+async def get_labs(request: Request, current_user: Dict[str, Any] = Depends(get_current_active_user)):
+    """Получение списка всех лабораторных работ (поддерживает If-None-Match)"""
+    return await response_cache.respond(request, LABS, _build_labs)
 
 
 @router.get("/{lab_id}", response_model=Lab)
 async def get_lab(lab_id: int, current_user: Dict[str, Any] = Depends(get_current_active_user)):
     """Получение лабораторной работы по ID"""
-    return labs_service.get_lab(lab_id)
+    return await run_db(labs_service.get_lab, lab_id)
 
 
 @router.post("/", response_model=Lab)
@@ -34,7 +41,8 @@ async def create_lab(lab_data: LabCreate, current_user: Dict[str, Any] = Depends
             detail="Недостаточно прав для выполнения операции"
         )
 
-    lab = labs_service.create_lab(
+    lab = await run_db(
+        labs_service.create_lab,
         lab_data.title,
         lab_data.description,
         lab_data.content,
@@ -44,18 +52,20 @@ async def create_lab(lab_data: LabCreate, current_user: Dict[str, Any] = Depends
     # Если указаны задания, создаем их
     if lab_data.tasks:
         for task_data in lab_data.tasks:
-            labs_service.create_task(
+            await run_db(
+                labs_service.create_task,
                 lab["id"],
                 task_data.title,
                 task_data.description,
                 task_data.task_type,
                 task_data.content,
                 task_data.order_index,
-                task_data.max_score
+                task_data.max_score,
+                [device.dict() for device in task_data.devices] if task_data.devices else None
             )
 
         # Получаем обновленную лабораторную работу с заданиями
-        lab = labs_service.get_lab(lab["id"])
+        lab = await run_db(labs_service.get_lab, lab["id"])
 
     return lab
 
@@ -75,7 +85,7 @@ async def update_lab(
         )
 
     # Проверяем, что лабораторная работа существует
-    lab = labs_service.get_lab(lab_id)
+    lab = await run_db(labs_service.get_lab, lab_id)
 
     # Проверяем, что пользователь является создателем или администратором
     if current_user["role"] != "admin" and lab["created_by"] != current_user["id"]:
@@ -85,7 +95,8 @@ async def update_lab(
         )
 
     # Обновляем лабораторную работу
-    updated_lab = labs_service.update_lab(
+    updated_lab = await run_db(
+        labs_service.update_lab,
         lab_id, lab_data.dict(exclude_unset=True))
 
     return updated_lab
@@ -102,7 +113,7 @@ async def delete_lab(lab_id: int, current_user: Dict[str, Any] = Depends(get_cur
         )
 
     # Проверяем, что лабораторная работа существует
-    lab = labs_service.get_lab(lab_id)
+    lab = await run_db(labs_service.get_lab, lab_id)
 
     # Проверяем, что пользователь является создателем или администратором
     if current_user["role"] != "admin" and lab["created_by"] != current_user["id"]:
@@ -112,7 +123,7 @@ async def delete_lab(lab_id: int, current_user: Dict[str, Any] = Depends(get_cur
         )
 
     # Удаляем лабораторную работу
-    labs_service.delete_lab(lab_id)
+    await run_db(labs_service.delete_lab, lab_id)
 
     return {"message": "Лабораторная работа успешно удалена"}
 
@@ -132,7 +143,7 @@ async def create_task(
         )
 
     # Проверяем, что лабораторная работа существует
-    lab = labs_service.get_lab(lab_id)
+    lab = await run_db(labs_service.get_lab, lab_id)
 
     # Проверяем, что пользователь является создателем или администратором
     if current_user["role"] != "admin" and lab["created_by"] != current_user["id"]:
@@ -142,14 +153,16 @@ async def create_task(
         )
 
     # Создаем задание
-    task = labs_service.create_task(
+    task = await run_db(
+        labs_service.create_task,
         lab_id,
         task_data.title,
         task_data.description,
         task_data.task_type,
         task_data.content,
         task_data.order_index,
-        task_data.max_score
+        task_data.max_score,
+        [device.dict() for device in task_data.devices] if task_data.devices else None
     )
 
     return task
@@ -171,7 +184,7 @@ async def update_task(
         )
 
     # Проверяем, что лабораторная работа существует
-    lab = labs_service.get_lab(lab_id)
+    lab = await run_db(labs_service.get_lab, lab_id)
 
     # Проверяем, что пользователь является создателем или администратором
     if current_user["role"] != "admin" and lab["created_by"] != current_user["id"]:
@@ -181,7 +194,8 @@ async def update_task(
         )
 
     # Обновляем задание
-    task = labs_service.update_task(
+    task = await run_db(
+        labs_service.update_task,
         task_id, task_data.dict(exclude_unset=True))
 
     return task
@@ -202,7 +216,7 @@ async def delete_task(
         )
 
     # Проверяем, что лабораторная работа существует
-    lab = labs_service.get_lab(lab_id)
+    lab = await run_db(labs_service.get_lab, lab_id)
 
     # Проверяем, что пользователь является создателем или администратором
     if current_user["role"] != "admin" and lab["created_by"] != current_user["id"]:
@@ -212,7 +226,7 @@ async def delete_task(
         )
 
     # Удаляем задание
-    labs_service.delete_task(task_id)
+    await run_db(labs_service.delete_task, task_id)
 
     return {"message": "Задание успешно удалено"}
 
@@ -221,10 +235,10 @@ async def delete_task(
 async def start_lab(lab_id: int, current_user: Dict[str, Any] = Depends(get_current_active_user)):
     """Начало выполнения лабораторной работы"""
     # Проверяем, что лабораторная работа существует
-    labs_service.get_lab(lab_id)
+    await run_db(labs_service.get_lab, lab_id)
 
     # Создаем результат выполнения
-    result = labs_service.create_lab_result(lab_id, current_user["id"])
+    result = await run_db(labs_service.create_lab_result, lab_id, current_user["id"])
 
     return result
 
@@ -233,7 +247,7 @@ async def start_lab(lab_id: int, current_user: Dict[str, Any] = Depends(get_curr
 async def get_lab_result(result_id: int, current_user: Dict[str, Any] = Depends(get_current_active_user)):
     """Получение результата выполнения лабораторной работы"""
     # Получаем результат
-    result = labs_service.get_lab_result(result_id)
+    result = await run_db(labs_service.get_lab_result, result_id)
 
     # Проверяем, что пользователь имеет права на просмотр результата
     if current_user["role"] not in ["admin", "teacher"] and result["user_id"] != current_user["id"]:
@@ -253,7 +267,7 @@ async def update_lab_result(
 ):
     """Обновление результата выполнения лабораторной работы"""
     # Получаем результат
-    result = labs_service.get_lab_result(result_id)
+    result = await run_db(labs_service.get_lab_result, result_id)
 
     # Проверяем права на обновление результата
     if result["user_id"] != current_user["id"] and current_user["role"] not in ["admin", "teacher"]:
@@ -277,7 +291,7 @@ async def update_lab_result(
         )
 
     # Обновляем результат
-    updated_result = labs_service.update_lab_result(result_id, result_data.dict(
+    updated_result = await run_db(labs_service.update_lab_result, result_id, result_data.dict(
         exclude_unset=True), current_user["id"] if current_user["role"] in ["admin", "teacher"] else None)
 
     return updated_result
@@ -292,7 +306,7 @@ async def update_task_result(
 ):
     """Обновление результата выполнения задания"""
     # Получаем результат лабораторной работы
-    result = labs_service.get_lab_result(result_id)
+    result = await run_db(labs_service.get_lab_result, result_id)
 
     # Проверяем права на обновление результата задания
     if result["user_id"] != current_user["id"] and current_user["role"] not in ["admin", "teacher"]:
@@ -309,7 +323,8 @@ async def update_task_result(
         )
 
     # Обновляем результат задания
-    updated_task_result = labs_service.update_task_result(
+    updated_task_result = await run_db(
+        labs_service.update_task_result,
         task_result_id, task_result_data.dict(exclude_unset=True))
 
     return updated_task_result
@@ -325,21 +340,26 @@ async def get_user_lab_results(user_id: int, current_user: Dict[str, Any] = Depe
             detail="Недостаточно прав для просмотра результатов этого пользователя"
         )
 
-    # Получаем результаты
-    results = database.get_lab_results_by_user(user_id)
-
-    # Для каждого результата получаем полную информацию
-    full_results = []
-    for result in results:
-        full_result = labs_service.get_lab_result(result["id"])
-        full_results.append(full_result)
+    # Получаем результаты вместе с результатами заданий
+    return await run_db(labs_service.get_user_lab_results, user_id)
 
-    return full_results
 
-
-@router.get("/{lab_id}/results", response_model=List[LabResult])
-async def get_lab_results(lab_id: int, current_user: Dict[str, Any] = Depends(get_current_active_user)):
-    """Получение результатов выполнения лабораторной работы"""
+@router.get("/{lab_id}/results", response_model=Union[LabResultsPage, List[LabResult]])
+async def get_lab_results(
+    lab_id: int,
+    params: LabResultsQuery = Depends(),
+    current_user: Dict[str, Any] = Depends(get_current_active_user)
+):
+    """
+    Получение результатов выполнения лабораторной работы
+
+    - expand: Вернуть страницу результатов с ФИО студентов (без результатов заданий)
+    - page, page_size: Номер и размер страницы (только с expand)
+    - sort_by: id, student, status, started_at, submitted_at, score
+    - order: asc или desc
+    - status: Фильтр по статусу результата
+    - search: Поиск по ФИО или логину студента
+    """
     # Проверяем, что пользователь имеет права преподавателя или администратора
     if current_user["role"] not in ["admin", "teacher"]:
         raise HTTPException(
@@ -347,13 +367,17 @@ async def get_lab_results(lab_id: int, current_user: Dict[str, Any] = Depends(ge
             detail="Недостаточно прав для просмотра результатов"
         )
 
-    # Получаем результаты
-    results = database.get_lab_results_by_lab(lab_id)
-
-    # Для каждого результата получаем полную информацию
-    full_results = []
-    for result in results:
-        full_result = labs_service.get_lab_result(result["id"])
-        full_results.append(full_result)
+    if params.expand:
+        return await run_db(
+            labs_service.get_lab_results_page,
+            lab_id,
+            params.page,
+            params.page_size,
+            params.sort_by,
+            params.order,
+            params.status,
+            params.search
+        )
 
-    return full_results
+    # Получаем результаты вместе с результатами заданий
+    return await run_db(labs_service.get_lab_results, lab_id)
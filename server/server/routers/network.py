@@ -2,7 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from typing import Dict, Any
 from utils.security import get_current_active_user
 from config import network_info
-from services.mqtt_client import MQTTClient
+from services.mqtt_client import MQTTClient, get_mqtt_client
 
 router = APIRouter(
     prefix="/api/network",
@@ -20,7 +20,7 @@ async def get_network_info(current_user: Dict[str, Any] = Depends(get_current_ac
 @router.post("/refresh")
 async def refresh_network_info(
     current_user: Dict[str, Any] = Depends(get_current_active_user),
-    mqtt_client: MQTTClient = Depends(lambda: MQTTClient())
+    mqtt_client: MQTTClient = Depends(get_mqtt_client)
 ):
     """Принудительно обновить информацию о сети Zigbee"""
     success = mqtt_client.request_network_info()
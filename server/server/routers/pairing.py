@@ -1,11 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
 from typing import Dict, Any
 from datetime import datetime, timedelta
-import time
+import asyncio
 from models.devices import PairingMode, DeviceAddResponse
 from utils.security import get_current_active_user
-from config import pairing_mode_active, pairing_end_time, discovered_devices, devices_cache
-from services.mqtt_client import MQTTClient
+import config
+from config import discovered_devices
+from services.mqtt_client import MQTTClient, get_mqtt_client
 
 router = APIRouter(
     prefix="/api/pairing",
@@ -19,7 +20,7 @@ async def start_pairing_mode(
     pairing_config: PairingMode,
     background_tasks: BackgroundTasks,
     current_user: Dict[str, Any] = Depends(get_current_active_user),
-    mqtt_client: MQTTClient = Depends(lambda: MQTTClient())
+    mqtt_client: MQTTClient = Depends(get_mqtt_client)
 ):
     """Включить режим сопряжения для добавления новых устройств"""
     # Проверяем, что пользователь имеет права администратора или преподавателя
@@ -29,13 +30,11 @@ async def start_pairing_mode(
             detail="Недостаточно прав для включения режима сопряжения"
         )
 
-    global pairing_mode_active, pairing_end_time, discovered_devices
-
-    if pairing_mode_active:
+    if config.pairing_mode_active:
         return {"success": True, "message": "Режим сопряжения уже активен"}
 
     # Включаем режим сопряжения
-    success = mqtt_client.start_pairing(pairing_config.duration)
+    success = await mqtt_client.start_pairing(pairing_config.duration)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -43,24 +42,26 @@ async def start_pairing_mode(
         )
 
     # Запускаем таймер для автоматического отключения режима сопряжения
-    background_tasks.add_task(
-        lambda: (time.sleep(pairing_config.duration),
-                 mqtt_client.stop_pairing())
-    )
+    async def stop_pairing_later():
+        await asyncio.sleep(pairing_config.duration)
+        if config.pairing_mode_active:
+            await mqtt_client.stop_pairing()
+
+    background_tasks.add_task(stop_pairing_later)
 
     return {
         "success": True,
         "message": f"Режим сопряжения активирован на {pairing_config.duration} секунд",
-        "expires_at": pairing_end_time.isoformat() if pairing_end_time else None
+        "expires_at": config.pairing_end_time.isoformat() if config.pairing_end_time else None
     }
 
 
 @router.get("/status")
 async def get_pairing_status(current_user: Dict[str, Any] = Depends(get_current_active_user)):
     """Получить текущий статус режима сопряжения и список обнаруженных устройств"""
-    global pairing_mode_active, pairing_end_time, discovered_devices
+    pairing_end_time = config.pairing_end_time
 
-    if not pairing_mode_active:
+    if not config.pairing_mode_active:
         return {
             "active": False,
             "message": "Режим сопряжения неактивен",
@@ -70,7 +71,7 @@ async def get_pairing_status(current_user: Dict[str, Any] = Depends(get_current_
     time_left = (pairing_end_time - datetime.now()
                  ).total_seconds() if pairing_end_time else 0
     if time_left <= 0:
-        pairing_mode_active = False
+        config.pairing_mode_active = False
         return {
             "active": False,
             "message": "Режим сопряжения завершен",
@@ -93,7 +94,7 @@ async def get_pairing_status(current_user: Dict[str, Any] = Depends(get_current_
 @router.post("/stop")
 async def stop_pairing_mode(
     current_user: Dict[str, Any] = Depends(get_current_active_user),
-    mqtt_client: MQTTClient = Depends(lambda: MQTTClient())
+    mqtt_client: MQTTClient = Depends(get_mqtt_client)
 ):
     """Принудительно отключить режим сопряжения"""
     # Проверяем, что пользователь имеет права администратора или преподавателя
@@ -103,13 +104,11 @@ async def stop_pairing_mode(
             detail="Недостаточно прав для отключения режима сопряжения"
         )
 
-    global pairing_mode_active, pairing_end_time
-
-    if not pairing_mode_active:
+    if not config.pairing_mode_active:
         return {"success": True, "message": "Режим сопряжения уже неактивен"}
 
     # Отключаем режим сопряжения
-    success = mqtt_client.stop_pairing()
+    success = await mqtt_client.stop_pairing()
     if not success:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -123,7 +122,7 @@ async def stop_pairing_mode(
 async def add_device(
     device_id: str,
     current_user: Dict[str, Any] = Depends(get_current_active_user),
-    mqtt_client: MQTTClient = Depends(lambda: MQTTClient())
+    mqtt_client: MQTTClient = Depends(get_mqtt_client)
 ):
     """Добавить обнаруженное устройство в сеть"""
     # Проверяем, что пользователь имеет права администратора или преподавателя
@@ -133,23 +132,16 @@ async def add_device(
             detail="Недостаточно прав для добавления устройств"
         )
 
-    global discovered_devices
-
     if device_id not in discovered_devices:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Устройство не найдено в списке обнаруженных устройств"
         )
 
-    # Запрашиваем обновление списка устройств для подтверждения
-    mqtt_client.request_devices()
-
-    # Ждем небольшую паузу для обновления кэша
-    time.sleep(0.5)
+    # Запрашиваем обновление списка устройств и ждем появления устройства в кэше
+    device_info = await mqtt_client.wait_for_device(device_id)
 
-    # Проверяем, есть ли устройство в кэше
-    if device_id in devices_cache:
-        device_info = devices_cache[device_id]
+    if device_info is not None:
 
         # Удаляем устройство из списка обнаруженных, так как оно теперь подключено
         if device_id in discovered_devices:
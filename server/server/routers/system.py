@@ -0,0 +1,47 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from typing import Dict, Any
+from utils.security import get_current_active_user
+from services.sensor_ingest import sensor_writer
+from services.mqtt_client import mqtt_client
+from services.websocket.device_bridge import device_bridge
+from services.websocket.ws_manager import ws_manager
+from utils.user_cache import user_cache
+from utils.executors import get_executor_stats
+from utils.response_cache import response_cache
+from services.device_changes import device_changes
+from services.booking.booking_index import booking_index
+from services.booking.expiry_scheduler import expiry_scheduler
+from services.task_verifier import task_verifier
+import database
+
+router = APIRouter(
+    prefix="/api/system",
+    tags=["system"],
+    responses={401: {"description": "Unauthorized"}},
+)
+
+
+@router.get("/stats")
+async def get_system_stats(current_user: Dict[str, Any] = Depends(get_current_active_user)):
+    """Получить метрики внутренних подсистем сервера"""
+    # Проверяем, что пользователь имеет права администратора
+    if current_user["role"] != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Недостаточно прав для выполнения операции"
+        )
+
+    return {
+        "sensor_ingest": sensor_writer.get_stats(),
+        "db_pool": database.get_pool_stats(),
+        "device_bridge": device_bridge.get_stats(),
+        "websocket": ws_manager.get_stats(),
+        "user_cache": user_cache.get_stats(),
+        "executors": get_executor_stats(),
+        "mqtt": mqtt_client.get_stats(),
+        "booking_index": booking_index.get_stats(),
+        "booking_expiry": expiry_scheduler.get_stats(),
+        "response_cache": response_cache.get_stats(),
+        "device_changes": device_changes.get_stats(),
+        "task_verifier": task_verifier.get_stats()
+    }
@@ -2,7 +2,8 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from typing import List, Dict, Any
 from models.users import User, UserCreate, UserUpdate
 import database
-from utils.security import get_current_active_user
+from utils.security import get_current_active_user, get_password_hash
+from utils.executors import run_cpu, run_db
 
 router = APIRouter(
     prefix="/api/users",
@@ -21,7 +22,7 @@ async def get_users(current_user: Dict[str, Any] = Depends(get_current_active_us
             detail="Недостаточно прав для выполнения операции"
         )
 
-    users = database.get_all_users()
+    users = await run_db(database.get_all_users)
     return users
 
 
@@ -36,7 +37,7 @@ async def get_user(user_id: int, current_user: Dict[str, Any] = Depends(get_curr
             detail="Недостаточно прав для выполнения операции"
         )
 
-    user = database.get_user_by_id(user_id)
+    user = await run_db(database.get_user_by_id, user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -57,25 +58,28 @@ async def create_user(user_data: UserCreate, current_user: Dict[str, Any] = Depe
         )
 
     # Проверяем, что пользователь с таким логином не существует
-    existing_user = database.get_user_by_login(user_data.login)
+    existing_user = await run_db(database.get_user_by_login, user_data.login)
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Пользователь с таким логином уже существует"
         )
 
-    # Создаем пользователя
-    user_id = database.create_user(
+    # Хешируем пароль и создаем пользователя
+    password_hash = await run_cpu(get_password_hash, user_data.password)
+    user_id = await run_db(
+        database.create_user,
         user_data.login,
         user_data.password,
         user_data.last_name,
         user_data.first_name,
         user_data.middle_name,
-        user_data.role
+        user_data.role,
+        password_hash=password_hash
     )
 
     # Получаем созданного пользователя
-    user = database.get_user_by_id(user_id)
+    user = await run_db(database.get_user_by_id, user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -100,7 +104,7 @@ async def update_user(
         )
 
     # Проверяем, что пользователь существует
-    user = database.get_user_by_id(user_id)
+    user = await run_db(database.get_user_by_id, user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -116,7 +120,7 @@ async def update_user(
 
     # Если указан новый логин, проверяем его уникальность
     if user_data.login and user_data.login != user["login"]:
-        existing_user = database.get_user_by_login(user_data.login)
+        existing_user = await run_db(database.get_user_by_login, user_data.login)
         if existing_user:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -124,7 +128,10 @@ async def update_user(
             )
 
     # Обновляем пользователя
-    success = database.update_user(user_id, user_data.dict(exclude_unset=True))
+    update_data = user_data.dict(exclude_unset=True)
+    if update_data.get("password"):
+        update_data["password_hash"] = await run_cpu(get_password_hash, update_data.pop("password"))
+    success = await run_db(database.update_user, user_id, update_data)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -132,7 +139,7 @@ async def update_user(
         )
 
     # Получаем обновленного пользователя
-    updated_user = database.get_user_by_id(user_id)
+    updated_user = await run_db(database.get_user_by_id, user_id)
     if not updated_user:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -160,7 +167,7 @@ async def delete_user(user_id: int, current_user: Dict[str, Any] = Depends(get_c
         )
 
     # Проверяем, что пользователь существует
-    user = database.get_user_by_id(user_id)
+    user = await run_db(database.get_user_by_id, user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -168,7 +175,7 @@ async def delete_user(user_id: int, current_user: Dict[str, Any] = Depends(get_c
         )
 
     # Удаляем пользователя
-    success = database.delete_user(user_id)
+    success = await run_db(database.delete_user, user_id)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
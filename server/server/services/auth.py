@@ -4,16 +4,17 @@ from fastapi import HTTPException, status
 from jose import jwt
 from config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
 from utils.security import verify_password, get_password_hash
+from utils.executors import run_cpu, run_db
 import database
 
 
-def authenticate_user(login: str, password: str) -> Optional[Dict[str, Any]]:
+async def authenticate_user(login: str, password: str) -> Optional[Dict[str, Any]]:
     """Аутентификация пользователя"""
-    user = database.get_user_by_login(login)
+    user = await run_db(database.get_user_by_login, login)
     if not user:
         return None
 
-    if not verify_password(password, user["password_hash"]):
+    if not await run_cpu(verify_password, password, user["password_hash"]):
         return None
 
     return user
@@ -34,22 +35,24 @@ def create_access_token(user_id: int, role: str) -> str:
     return encoded_jwt
 
 
-def register_user(login: str, password: str, last_name: str, first_name: str, middle_name: str, role: str = "student") -> Dict[str, Any]:
+async def register_user(login: str, password: str, last_name: str, first_name: str, middle_name: str, role: str = "student") -> Dict[str, Any]:
     """Регистрация нового пользователя"""
     # Проверяем, что пользователь с таким логином не существует
-    existing_user = database.get_user_by_login(login)
+    existing_user = await run_db(database.get_user_by_login, login)
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Пользователь с таким логином уже существует"
         )
 
-    # Создаем пользователя
-    user_id = database.create_user(
-        login, password, last_name, first_name, middle_name, role)
+    # Хешируем пароль и создаем пользователя
+    password_hash = await run_cpu(get_password_hash, password)
+    user_id = await run_db(
+        database.create_user, login, password, last_name, first_name, middle_name, role,
+        password_hash=password_hash)
 
     # Получаем созданного пользователя
-    user = database.get_user_by_id(user_id)
+    user = await run_db(database.get_user_by_id, user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
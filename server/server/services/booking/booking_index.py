@@ -0,0 +1,216 @@
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from threading import RLock
+from typing import Dict, List, Any, Optional, Tuple, Iterable
+import database
+
+
+def to_datetime(value: Any) -> datetime:
+    """Приведение метки времени (datetime или строка ISO) к datetime"""
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value))
+
+
+class DeviceIntervals:
+    """Отсортированные по началу интервалы активных бронирований одного устройства
+
+    Активные бронирования устройства не пересекаются, поэтому список,
+    упорядоченный по началу, упорядочен и по окончанию. Это позволяет
+    отвечать на запросы бинарным поиском.
+    """
+
+    def __init__(self):
+        self.starts: List[datetime] = []
+        self.ends: List[datetime] = []
+        self.ids: List[int] = []
+        # booking_id -> начало интервала (для удаления по ID)
+        self.by_id: Dict[int, datetime] = {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, booking_id: int, start: datetime, end: datetime):
+        """Добавление интервала с сохранением порядка"""
+        if booking_id in self.by_id:
+            self.remove(booking_id)
+        index = bisect_right(self.starts, start)
+        self.starts.insert(index, start)
+        self.ends.insert(index, end)
+        self.ids.insert(index, booking_id)
+        self.by_id[booking_id] = start
+
+    def remove(self, booking_id: int) -> bool:
+        """Удаление интервала по ID бронирования"""
+        start = self.by_id.pop(booking_id, None)
+        if start is None:
+            return False
+        index = bisect_left(self.starts, start)
+        while index < len(self.ids) and self.ids[index] != booking_id:
+            index += 1
+        if index < len(self.ids):
+            del self.starts[index]
+            del self.ends[index]
+            del self.ids[index]
+        return True
+
+    def prune(self, now: datetime) -> int:
+        """Удаление завершившихся интервалов (они всегда в начале списка)"""
+        count = bisect_right(self.ends, now)
+        if count:
+            for booking_id in self.ids[:count]:
+                self.by_id.pop(booking_id, None)
+            del self.starts[:count]
+            del self.ends[:count]
+            del self.ids[:count]
+        return count
+
+    def conflicts(self, start: datetime, end: datetime, exclude_booking_id: Optional[int] = None) -> bool:
+        """Есть ли активное бронирование, пересекающееся с [start, end)"""
+        index = bisect_left(self.starts, end) - 1
+        while index >= 0:
+            if self.ids[index] == exclude_booking_id:
+                index -= 1
+                continue
+            return self.ends[index] > start
+        return False
+
+    def current(self, now: datetime) -> Optional[int]:
+        """ID бронирования, действующего в момент now"""
+        index = bisect_right(self.starts, now) - 1
+        if index >= 0 and self.ends[index] > now:
+            return self.ids[index]
+        return None
+
+    def upcoming(self, now: datetime) -> Tuple[int, Optional[datetime]]:
+        """Число бронирований, начинающихся после now, и начало ближайшего из них"""
+        index = bisect_right(self.starts, now)
+        count = len(self.ids) - index
+        return count, self.starts[index] if count else None
+
+    def free_slots(self, start: datetime, end: datetime, min_duration: float = 0) -> List[Tuple[datetime, datetime]]:
+        """Свободные промежутки в окне [start, end) длительностью не меньше min_duration секунд"""
+        slots = []
+        cursor = start
+        index = bisect_right(self.ends, start)
+        while index < len(self.ids) and self.starts[index] < end:
+            busy_start = self.starts[index]
+            if busy_start > cursor and (busy_start - cursor).total_seconds() >= min_duration:
+                slots.append((cursor, busy_start))
+            if self.ends[index] > cursor:
+                cursor = self.ends[index]
+            index += 1
+        if end > cursor and (end - cursor).total_seconds() >= min_duration:
+            slots.append((cursor, end))
+        return slots
+
+
+class BookingIndex:
+    """Индекс активных бронирований в памяти процесса
+
+    Интервалы устройства загружаются из БД при первом обращении и далее
+    поддерживаются сервисом бронирования при каждой записи.
+    """
+
+    def __init__(self):
+        self._devices: Dict[str, DeviceIntervals] = {}
+        self._lock = RLock()
+
+        # Метрики
+        self.loads = 0
+        self.lookups = 0
+
+    def _load(self, device_id: str) -> DeviceIntervals:
+        """Загрузка активных бронирований устройства из БД"""
+        intervals = DeviceIntervals()
+        with database.get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id, start_time, end_time FROM device_bookings
+                WHERE device_id = ? AND status = 'active' AND end_time > ?
+                ORDER BY start_time
+            """, (device_id, datetime.now().isoformat()))
+            for row in cursor.fetchall():
+                intervals.add(row["id"], to_datetime(
+                    row["start_time"]), to_datetime(row["end_time"]))
+
+        self.loads += 1
+        return intervals
+
+    def _get(self, device_id: str) -> DeviceIntervals:
+        """Интервалы устройства без завершившихся бронирований (вызывается под блокировкой)"""
+        intervals = self._devices.get(device_id)
+        if intervals is None:
+            intervals = self._load(device_id)
+            self._devices[device_id] = intervals
+        intervals.prune(datetime.now())
+        self.lookups += 1
+        return intervals
+
+    def add(self, device_id: str, booking_id: int, start: Any, end: Any):
+        """Учет нового или измененного активного бронирования"""
+        with self._lock:
+            intervals = self._devices.get(device_id)
+            if intervals is not None:
+                intervals.add(booking_id, to_datetime(start), to_datetime(end))
+
+    def remove(self, device_id: str, booking_id: int):
+        """Удаление бронирования из индекса (отмена, завершение)"""
+        with self._lock:
+            intervals = self._devices.get(device_id)
+            if intervals is not None:
+                intervals.remove(booking_id)
+
+    def invalidate(self, device_id: Optional[str] = None):
+        """Сброс индекса устройства (или всех устройств) для перезагрузки из БД"""
+        with self._lock:
+            if device_id is None:
+                self._devices.clear()
+            else:
+                self._devices.pop(device_id, None)
+
+    def is_available(self, device_id: str, start: Any, end: Any,
+                     exclude_booking_id: Optional[int] = None) -> bool:
+        """Свободно ли устройство в интервале [start, end)"""
+        with self._lock:
+            return not self._get(device_id).conflicts(
+                to_datetime(start), to_datetime(end), exclude_booking_id)
+
+    def availability(self, device_id: str, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """Текущее бронирование, число ожидающих и ближайший момент доступности"""
+        now = now or datetime.now()
+        with self._lock:
+            intervals = self._get(device_id)
+            current_id = intervals.current(now)
+            queue_length, next_start = intervals.upcoming(now)
+            current_end = intervals.ends[intervals.ids.index(current_id)] \
+                if current_id is not None else None
+
+        return {
+            "current_booking_id": current_id,
+            "queue_length": queue_length,
+            "next_available": current_end if current_id is not None else next_start
+        }
+
+    def free_slots(self, device_ids: Iterable[str], start: datetime, end: datetime,
+                   min_duration: float = 0) -> Dict[str, List[Tuple[datetime, datetime]]]:
+        """Свободные промежутки для набора устройств в окне [start, end)"""
+        with self._lock:
+            return {
+                device_id: self._get(device_id).free_slots(start, end, min_duration)
+                for device_id in device_ids
+            }
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Метрики индекса"""
+        with self._lock:
+            return {
+                "devices": len(self._devices),
+                "intervals": sum(len(i) for i in self._devices.values()),
+                "loads": self.loads,
+                "lookups": self.lookups
+            }
+
+
+# Глобальный экземпляр индекса бронирований
+booking_index = BookingIndex()
@@ -1,49 +1,92 @@
 from typing import List, Dict, Any, Optional
 from datetime import datetime, timedelta
+from threading import Lock
 from fastapi import HTTPException, status
 import database
 import json
 from models.booking.booking import Booking, DeviceAvailability
-from config import logger
+from services.booking.booking_index import booking_index, to_datetime
+from services.booking.expiry_scheduler import expiry_scheduler
+from config import BOOKING_LOCK_STRIPES, logger
+
+# Полосы блокировок по устройствам: проверка пересечений и запись
+# бронирования одного устройства выполняются под одной блокировкой
+_device_locks = [Lock() for _ in range(max(1, BOOKING_LOCK_STRIPES))]
+
+
+def _device_lock(device_id: str) -> Lock:
+    """Блокировка полосы, к которой относится устройство"""
+    return _device_locks[hash(device_id) % len(_device_locks)]
+
+
+def _has_conflict(cursor, device_id: str, start_time: datetime, end_time: datetime,
+                  exclude_booking_id: int = None) -> bool:
+    """Проверка пересечения с активными бронированиями внутри открытой транзакции"""
+    query = """
+        SELECT 1 FROM device_bookings
+        WHERE device_id = ?
+        AND status = 'active'
+        AND start_time < ?
+        AND end_time > ?
+    """
+    params = [device_id, end_time.isoformat(), start_time.isoformat()]
+
+    if exclude_booking_id:
+        query += " AND id != ?"
+        params.append(exclude_booking_id)
+
+    cursor.execute(query + " LIMIT 1", params)
+    return cursor.fetchone() is not None
+
+
+def _unavailable() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="Устройство недоступно в указанное время"
+    )
 
 
 def get_device_bookings(device_id: str) -> List[Dict[str, Any]]:
     """Получение всех бронирований для устройства"""
-    conn = database.get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT * FROM device_bookings 
-        WHERE device_id = ? 
-        ORDER BY start_time
-    """, (device_id,))
-    bookings = [dict(row) for row in cursor.fetchall()]
-    conn.close()
+    with database.get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT * FROM device_bookings 
+            WHERE device_id = ? 
+            ORDER BY start_time
+        """, (device_id,))
+        bookings = [dict(row) for row in cursor.fetchall()]
     return bookings
 
 
 def get_user_bookings(user_id: int) -> List[Dict[str, Any]]:
-    """Получение всех бронирований пользователя"""
-    conn = database.get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT b.*, d.name as device_name 
-        FROM device_bookings b
-        LEFT JOIN devices d ON b.device_id = d.id
-        WHERE b.user_id = ? 
-        ORDER BY b.start_time
-    """, (user_id,))
-    bookings = [dict(row) for row in cursor.fetchall()]
-    conn.close()
+    """Получение всех бронирований пользователя
+
+    Истекшие, но еще не обработанные планировщиком бронирования
+    возвращаются со статусом completed.
+    """
+    with database.get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT b.id, b.device_id, b.user_id, b.start_time, b.end_time,
+                b.purpose, b.created_at, d.name as device_name,
+                CASE WHEN b.status = 'active' AND b.end_time < ?
+                    THEN 'completed' ELSE b.status END AS status
+            FROM device_bookings b
+            LEFT JOIN devices d ON b.device_id = d.id
+            WHERE b.user_id = ? 
+            ORDER BY b.start_time
+        """, (datetime.now().isoformat(), user_id))
+        bookings = [dict(row) for row in cursor.fetchall()]
     return bookings
 
 
 def get_booking(booking_id: int) -> Optional[Dict[str, Any]]:
     """Получение информации о бронировании по ID"""
-    conn = database.get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM device_bookings WHERE id = ?", (booking_id,))
-    booking = cursor.fetchone()
-    conn.close()
+    with database.get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM device_bookings WHERE id = ?", (booking_id,))
+        booking = cursor.fetchone()
 
     if booking:
         return dict(booking)
@@ -52,32 +95,42 @@ def get_booking(booking_id: int) -> Optional[Dict[str, Any]]:
 
 def create_booking(device_id: str, user_id: int, start_time: datetime,
                    end_time: datetime, purpose: str) -> int:
-    """Создание нового бронирования"""
-    # Проверяем, доступно ли устройство в указанное время
-    if not is_device_available(device_id, start_time, end_time):
-        raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT,
-            detail="Устройство недоступно в указанное время"
-        )
+    """Создание нового бронирования
 
-    conn = database.get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO device_bookings 
-        (device_id, user_id, start_time, end_time, purpose, status, created_at) 
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    """, (
-        device_id,
-        user_id,
-        start_time.isoformat(),
-        end_time.isoformat(),
-        purpose,
-        "active",
-        datetime.now().isoformat()
-    ))
-    booking_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
+    Проверка пересечений и вставка выполняются атомарно: под блокировкой
+    устройства в процессе и в транзакции BEGIN IMMEDIATE в базе данных.
+    """
+    with _device_lock(device_id):
+        # Быстрый отказ по индексу без открытия транзакции на запись
+        if not booking_index.is_available(device_id, start_time, end_time):
+            raise _unavailable()
+
+        with database.get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            if _has_conflict(cursor, device_id, start_time, end_time):
+                # Бронирование записано в обход индекса (другим процессом)
+                booking_index.invalidate(device_id)
+                raise _unavailable()
+
+            cursor.execute("""
+                INSERT INTO device_bookings 
+                (device_id, user_id, start_time, end_time, purpose, status, created_at) 
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (
+                device_id,
+                user_id,
+                start_time.isoformat(),
+                end_time.isoformat(),
+                purpose,
+                "active",
+                datetime.now().isoformat()
+            ))
+            booking_id = cursor.lastrowid
+
+        booking_index.add(device_id, booking_id, start_time, end_time)
+
+    expiry_scheduler.schedule(booking_id, end_time)
 
     logger.info(
         f"Создано бронирование {booking_id} для устройства {device_id} пользователем {user_id}")
@@ -93,18 +146,6 @@ def update_booking(booking_id: int, data: Dict[str, Any]) -> bool:
             detail="Бронирование не найдено"
         )
 
-    # Если меняется время, проверяем доступность
-    if ('start_time' in data or 'end_time' in data) and booking['status'] == 'active':
-        start_time = data.get('start_time', booking['start_time'])
-        end_time = data.get('end_time', booking['end_time'])
-
-        # Проверяем, не пересекается ли с другими бронированиями
-        if not is_device_available(booking['device_id'], start_time, end_time, exclude_booking_id=booking_id):
-            raise HTTPException(
-                status_code=status.HTTP_409_CONFLICT,
-                detail="Устройство недоступно в указанное время"
-            )
-
     fields = []
     values = []
 
@@ -120,16 +161,38 @@ def update_booking(booking_id: int, data: Dict[str, Any]) -> bool:
         return False
 
     values.append(booking_id)
+    device_id = booking['device_id']
+
+    with _device_lock(device_id):
+        with database.get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+
+            # Если меняется время, проверяем, не пересекается ли с другими бронированиями
+            if ('start_time' in data or 'end_time' in data) and booking['status'] == 'active':
+                start_time = to_datetime(data.get('start_time') or booking['start_time'])
+                end_time = to_datetime(data.get('end_time') or booking['end_time'])
+                if _has_conflict(cursor, device_id, start_time, end_time, exclude_booking_id=booking_id):
+                    raise _unavailable()
+
+            cursor.execute(
+                f"UPDATE device_bookings SET {', '.join(fields)} WHERE id = ?",
+                values
+            )
+            success = cursor.rowcount > 0
 
-    conn = database.get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        f"UPDATE device_bookings SET {', '.join(fields)} WHERE id = ?",
-        values
-    )
-    success = cursor.rowcount > 0
-    conn.commit()
-    conn.close()
+            cursor.execute(
+                "SELECT status, start_time, end_time FROM device_bookings WHERE id = ?", (booking_id,))
+            updated = cursor.fetchone()
+
+        if success:
+            if updated['status'] == 'active':
+                booking_index.add(
+                    device_id, booking_id, updated['start_time'], updated['end_time'])
+                expiry_scheduler.schedule(booking_id, updated['end_time'])
+            else:
+                booking_index.remove(device_id, booking_id)
+                expiry_scheduler.unschedule(booking_id)
 
     logger.info(f"Обновлено бронирование {booking_id}: {data}")
     return success
@@ -151,15 +214,18 @@ def cancel_booking(booking_id: int, user_id: int = None) -> bool:
             detail="Нет прав для отмены этого бронирования"
         )
 
-    conn = database.get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "UPDATE device_bookings SET status = 'cancelled' WHERE id = ?",
-        (booking_id,)
-    )
-    success = cursor.rowcount > 0
-    conn.commit()
-    conn.close()
+    with _device_lock(booking['device_id']):
+        with database.get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "UPDATE device_bookings SET status = 'cancelled' WHERE id = ?",
+                (booking_id,)
+            )
+            success = cursor.rowcount > 0
+
+        booking_index.remove(booking['device_id'], booking_id)
+
+    expiry_scheduler.unschedule(booking_id)
 
     logger.info(f"Отменено бронирование {booking_id}")
     return success
@@ -168,114 +234,52 @@ def cancel_booking(booking_id: int, user_id: int = None) -> bool:
 def is_device_available(device_id: str, start_time: datetime, end_time: datetime,
                         exclude_booking_id: int = None) -> bool:
     """Проверка доступности устройства в указанное время"""
-    conn = database.get_db_connection()
-    cursor = conn.cursor()
-
-    query = """
-        SELECT COUNT(*) FROM device_bookings 
-        WHERE device_id = ? 
-        AND status = 'active'
-        AND NOT (end_time <= ? OR start_time >= ?)
-    """
-    params = [device_id, start_time.isoformat(), end_time.isoformat()]
-
-    if exclude_booking_id:
-        query += " AND id != ?"
-        params.append(exclude_booking_id)
-
-    cursor.execute(query, params)
-    count = cursor.fetchone()[0]
-    conn.close()
-
-    return count == 0
+    return booking_index.is_available(device_id, start_time, end_time, exclude_booking_id)
 
 
 def get_device_availability(device_id: str) -> DeviceAvailability:
     """Получение информации о доступности устройства"""
-    now = datetime.now()
+    info = booking_index.availability(device_id)
 
-    # Получаем текущее активное бронирование
-    conn = database.get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT * FROM device_bookings 
-        WHERE device_id = ? 
-        AND status = 'active'
-        AND start_time <= ? 
-        AND end_time > ?
-        ORDER BY start_time
-        LIMIT 1
-    """, (device_id, now.isoformat(), now.isoformat()))
-    current_booking = cursor.fetchone()
-
-    # Получаем следующие бронирования
-    cursor.execute("""
-        SELECT * FROM device_bookings 
-        WHERE device_id = ? 
-        AND status = 'active'
-        AND start_time > ?
-        ORDER BY start_time
-    """, (device_id, now.isoformat()))
-    upcoming_bookings = cursor.fetchall()
-    conn.close()
-
-    # Формируем ответ
-    is_available = current_booking is None
-    next_available = None
-
-    if not is_available and current_booking:
-        next_available = datetime.fromisoformat(current_booking['end_time'])
-    elif upcoming_bookings:
-        next_available = datetime.fromisoformat(
-            upcoming_bookings[0]['start_time'])
+    current_booking = None
+    if info["current_booking_id"] is not None:
+        current_booking = get_booking(info["current_booking_id"])
 
     return DeviceAvailability(
         device_id=device_id,
-        is_available=is_available,
-        current_booking=dict(current_booking) if current_booking else None,
-        next_available=next_available,
-        queue_length=len(upcoming_bookings)
+        is_available=info["current_booking_id"] is None,
+        current_booking=current_booking,
+        next_available=info["next_available"],
+        queue_length=info["queue_length"]
     )
 
 
+def get_free_slots(device_ids: List[str], start_time: datetime, end_time: datetime,
+                   min_duration: timedelta = timedelta(0)) -> Dict[str, List[Dict[str, datetime]]]:
+    """Свободные промежутки для нескольких устройств в заданном окне"""
+    slots = booking_index.free_slots(
+        device_ids, start_time, end_time, min_duration.total_seconds())
+    return {
+        device_id: [{"start": start, "end": end} for start, end in device_slots]
+        for device_id, device_slots in slots.items()
+    }
+
+
 def get_device_queue(device_id: str) -> List[Dict[str, Any]]:
     """Получение очереди бронирований для устройства"""
     now = datetime.now()
 
-    conn = database.get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT b.*, u.login as user_login, u.last_name, u.first_name
-        FROM device_bookings b
-        JOIN users u ON b.user_id = u.id
-        WHERE b.device_id = ? 
-        AND b.status = 'active'
-        AND b.end_time > ?
-        ORDER BY b.start_time
-    """, (device_id, now.isoformat()))
-    queue = [dict(row) for row in cursor.fetchall()]
-    conn.close()
+    with database.get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT b.*, u.login as user_login, u.last_name, u.first_name
+            FROM device_bookings b
+            JOIN users u ON b.user_id = u.id
+            WHERE b.device_id = ? 
+            AND b.status = 'active'
+            AND b.end_time > ?
+            ORDER BY b.start_time
+        """, (device_id, now.isoformat()))
+        queue = [dict(row) for row in cursor.fetchall()]
 
     return queue
-
-
-def cleanup_expired_bookings():
-    """Очистка истекших бронирований"""
-    now = datetime.now()
-
-    conn = database.get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        UPDATE device_bookings 
-        SET status = 'completed' 
-        WHERE status = 'active' 
-        AND end_time < ?
-    """, (now.isoformat(),))
-    count = cursor.rowcount
-    conn.commit()
-    conn.close()
-
-    if count > 0:
-        logger.info(f"Очищено {count} истекших бронирований")
-
-    return count
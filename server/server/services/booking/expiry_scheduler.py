@@ -0,0 +1,200 @@
+import asyncio
+import heapq
+from datetime import datetime
+from threading import Lock
+from typing import Dict, Any, List, Optional, Tuple
+import database
+from config import logger
+from services.booking.booking_index import booking_index, to_datetime
+from services.websocket.ws_manager import ws_manager
+from utils.executors import run_db
+
+# Максимальная пауза таймера: после нее срок ближайшего бронирования
+# пересчитывается (на случай перевода системных часов)
+MAX_TIMER_DELAY = 3600.0
+
+
+class BookingExpiryScheduler:
+    """Завершение бронирований точно по времени окончания
+
+    Куча (время окончания, ID бронирования) и один таймер цикла событий,
+    взведенный на ближайшее окончание. schedule()/unschedule() вызываются
+    сервисом бронирования из любых потоков; отмененные и перенесенные
+    записи удаляются из кучи лениво.
+    """
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = Lock()
+        self._heap: List[Tuple[datetime, int]] = []
+        # ID бронирования -> актуальное время окончания
+        self._entries: Dict[int, datetime] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._task: Optional[asyncio.Task] = None
+        self._running = False
+
+        # Метрики
+        self.scheduled = 0
+        self.wakeups = 0
+        self.expired = 0
+
+    async def attach(self, loop: asyncio.AbstractEventLoop):
+        """Привязка к циклу событий и загрузка активных бронирований"""
+        rows = await run_db(self._load_active)
+        with self._lock:
+            self._loop = loop
+            for row in rows:
+                self._push(row["id"], to_datetime(row["end_time"]))
+        self._arm()
+        logger.info(
+            f"Планировщик завершения бронирований запущен ({len(rows)} активных)")
+
+    def detach(self):
+        """Остановка таймера (при остановке сервера)"""
+        with self._lock:
+            self._loop = None
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+    def schedule(self, booking_id: int, end_time: Any):
+        """Планирование завершения бронирования (потокобезопасно)"""
+        end_time = to_datetime(end_time)
+        with self._lock:
+            self.scheduled += 1
+            self._push(booking_id, end_time)
+            loop = self._loop
+            earliest = self._heap[0][1] == booking_id and self._heap[0][0] == end_time
+
+        if loop is not None and earliest:
+            self._call_in_loop(loop, self._arm)
+
+    def unschedule(self, booking_id: int):
+        """Отмена планирования (бронирование отменено)"""
+        with self._lock:
+            self._entries.pop(booking_id, None)
+
+    def _push(self, booking_id: int, end_time: datetime):
+        """Добавление записи в кучу (вызывается под блокировкой)"""
+        self._entries[booking_id] = end_time
+        heapq.heappush(self._heap, (end_time, booking_id))
+
+    def _next_due(self) -> Optional[datetime]:
+        """Ближайшее актуальное время окончания (вызывается под блокировкой)"""
+        while self._heap:
+            end_time, booking_id = self._heap[0]
+            if self._entries.get(booking_id) == end_time:
+                return end_time
+            heapq.heappop(self._heap)
+        return None
+
+    @staticmethod
+    def _call_in_loop(loop: asyncio.AbstractEventLoop, callback):
+        try:
+            loop.call_soon_threadsafe(callback)
+        except RuntimeError:
+            # Цикл событий уже закрыт
+            pass
+
+    def _arm(self):
+        """Перевзвод таймера на ближайшее окончание (в цикле событий)"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            loop = self._loop
+            due = self._next_due()
+            if loop is None or due is None or self._running:
+                return
+            delay = (due - datetime.now()).total_seconds()
+            self._timer = loop.call_later(
+                min(max(0.0, delay), MAX_TIMER_DELAY), self._on_timer)
+
+    def _on_timer(self):
+        """Срабатывание таймера"""
+        with self._lock:
+            self._timer = None
+            self._running = True
+            self.wakeups += 1
+        self._task = asyncio.ensure_future(self._run_due())
+
+    async def _run_due(self):
+        """Завершение наступивших бронирований и уведомление клиентов"""
+        try:
+            now = datetime.now()
+            with self._lock:
+                due = self._next_due()
+            if due is not None and due <= now:
+                expired = await run_db(self._expire_due, now)
+                with self._lock:
+                    while self._heap and self._heap[0][0] <= now:
+                        _, booking_id = heapq.heappop(self._heap)
+                        if self._entries.get(booking_id, now) <= now:
+                            self._entries.pop(booking_id, None)
+                    self.expired += len(expired)
+
+                for booking in expired:
+                    booking_index.remove(booking["device_id"], booking["id"])
+                    await ws_manager.broadcast_booking_notification(
+                        booking["device_id"],
+                        booking["user_id"],
+                        "expired",
+                        {
+                            "booking_id": booking["id"],
+                            "device_id": booking["device_id"],
+                            "end_time": booking["end_time"]
+                        }
+                    )
+        except Exception as e:
+            logger.error(f"Ошибка при завершении бронирований: {e}")
+        finally:
+            with self._lock:
+                self._running = False
+            self._arm()
+
+    @staticmethod
+    def _load_active() -> List[Dict[str, Any]]:
+        """Активные бронирования, в том числе истекшие во время простоя сервера"""
+        with database.get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT id, end_time FROM device_bookings WHERE status = 'active'")
+            return [dict(row) for row in cursor.fetchall()]
+
+    @staticmethod
+    def _expire_due(now: datetime) -> List[Dict[str, Any]]:
+        """Перевод наступивших бронирований в статус completed"""
+        with database.get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute("""
+                SELECT id, device_id, user_id, end_time FROM device_bookings
+                WHERE status = 'active' AND end_time <= ?
+            """, (now.isoformat(),))
+            expired = [dict(row) for row in cursor.fetchall()]
+            if expired:
+                cursor.execute("""
+                    UPDATE device_bookings SET status = 'completed'
+                    WHERE status = 'active' AND end_time <= ?
+                """, (now.isoformat(),))
+
+        if expired:
+            logger.info(f"Завершено {len(expired)} истекших бронирований")
+        return expired
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Метрики планировщика"""
+        with self._lock:
+            due = self._next_due()
+            return {
+                "pending": len(self._entries),
+                "heap_size": len(self._heap),
+                "next_due": due.isoformat() if due else None,
+                "scheduled": self.scheduled,
+                "wakeups": self.wakeups,
+                "expired": self.expired
+            }
+
+
+# Глобальный экземпляр планировщика
+expiry_scheduler = BookingExpiryScheduler()
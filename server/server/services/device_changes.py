@@ -0,0 +1,95 @@
+import time
+from threading import Lock
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+# Максимальное число запоминаемых удаленных устройств
+MAX_REMOVED = 1000
+
+
+class DeviceChangeLog:
+    """Последовательность изменений устройств для синхронизации клиентов
+
+    Для каждого устройства хранится номер последнего изменения (описание,
+    состояние или доступность). Номера начинаются с текущего времени в
+    миллисекундах, поэтому растут и между перезапусками сервера: курсор,
+    полученный до перезапуска, оказывается ниже нижней границы, и клиент
+    получает сигнал полной синхронизации.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._seq = int(time.time() * 1000)
+        # Курсоры не ниже этой границы обслуживаются изменениями
+        self._floor = self._seq
+        # ID устройства -> номер последнего изменения
+        self._changed: Dict[str, int] = {}
+        # ID удаленного устройства -> номер удаления
+        self._removed: Dict[str, int] = {}
+
+        # Метрики
+        self.deltas = 0
+        self.resyncs = 0
+
+    @property
+    def seq(self) -> int:
+        """Номер последнего изменения"""
+        with self._lock:
+            return self._seq
+
+    def record(self, device_id: str):
+        """Изменение одного устройства (потокобезопасно)"""
+        with self._lock:
+            self._seq += 1
+            self._changed[device_id] = self._seq
+            self._removed.pop(device_id, None)
+
+    def record_many(self, device_ids: Iterable[str], removed_ids: Iterable[str] = ()):
+        """Изменение и удаление набора устройств"""
+        with self._lock:
+            for device_id in device_ids:
+                self._seq += 1
+                self._changed[device_id] = self._seq
+                self._removed.pop(device_id, None)
+
+            for device_id in removed_ids:
+                self._seq += 1
+                self._changed.pop(device_id, None)
+                self._removed[device_id] = self._seq
+
+            # Старые удаления забываются, курсоры до них требуют полной синхронизации
+            if len(self._removed) > MAX_REMOVED:
+                oldest = sorted(self._removed.items(), key=lambda item: item[1])
+                for device_id, seq in oldest[:len(self._removed) - MAX_REMOVED]:
+                    del self._removed[device_id]
+                    self._floor = max(self._floor, seq)
+
+    def changes_since(self, since: Optional[int]) -> Tuple[int, bool, List[str], List[str]]:
+        """Изменения после курсора: (номер, нужна полная синхронизация, измененные, удаленные)"""
+        with self._lock:
+            seq = self._seq
+            if since is None or since < self._floor or since > seq:
+                self.resyncs += 1
+                return seq, True, [], []
+
+            changed = [device_id for device_id, changed_seq in self._changed.items()
+                       if changed_seq > since]
+            removed = [device_id for device_id, removed_seq in self._removed.items()
+                       if removed_seq > since]
+            self.deltas += 1
+            return seq, False, changed, removed
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Метрики журнала изменений"""
+        with self._lock:
+            return {
+                "seq": self._seq,
+                "floor": self._floor,
+                "tracked": len(self._changed),
+                "removed": len(self._removed),
+                "deltas": self.deltas,
+                "resyncs": self.resyncs
+            }
+
+
+# Глобальный экземпляр журнала изменений устройств
+device_changes = DeviceChangeLog()
@@ -1,23 +1,49 @@
 from typing import Dict, List, Any, Optional
+from datetime import datetime, timedelta
 from fastapi import HTTPException, status
 from config import devices_cache, device_states, device_availability, groups_cache
 import database
+from utils.response_cache import response_cache, GROUPS
+from services.device_changes import device_changes
+import timeseries
+import rollups
 import json
 
 
+def _device_info(device_id: str, device: Dict[str, Any]) -> Dict[str, Any]:
+    """Объединение информации об устройстве из разных кэшей"""
+    return {
+        **device,
+        "state": device_states.get(device_id, {}),
+        "available": device_availability.get(device_id, {"state": "unknown"}).get("state", "unknown")
+    }
+
+
 def get_all_devices() -> Dict[str, Dict[str, Any]]:
     """Получение всех устройств с их состояниями"""
-    devices_info = {}
-    for device_id, device in devices_cache.items():
-        # Объединяем информацию из разных кэшей
-        device_info = {
-            **device,
-            "state": device_states.get(device_id, {}),
-            "available": device_availability.get(device_id, {"state": "unknown"}).get("state", "unknown")
-        }
-        devices_info[device_id] = device_info
+    return {
+        device_id: _device_info(device_id, device)
+        for device_id, device in list(devices_cache.items())
+    }
+
+
+def get_device_changes(since: Optional[int] = None) -> Dict[str, Any]:
+    """Устройства, изменившиеся после курсора since
+
+    Если курсор отсутствует или устарел (перезапуск сервера, давние
+    удаления), возвращается полный список с флагом resync.
+    """
+    seq, resync, changed, removed = device_changes.changes_since(since)
+    if resync:
+        return {"seq": seq, "resync": True, "devices": get_all_devices(), "removed": []}
+
+    devices = {}
+    for device_id in changed:
+        device = devices_cache.get(device_id)
+        if device is not None:
+            devices[device_id] = _device_info(device_id, device)
 
-    return devices_info
+    return {"seq": seq, "resync": False, "devices": devices, "removed": removed}
 
 
 def get_device(device_id: str) -> Dict[str, Any]:
@@ -29,11 +55,7 @@ def get_device(device_id: str) -> Dict[str, Any]:
         )
 
     # Объединяем информацию из разных кэшей
-    device_info = {
-        **devices_cache[device_id],
-        "state": device_states.get(device_id, {}),
-        "available": device_availability.get(device_id, {"state": "unknown"}).get("state", "unknown")
-    }
+    device_info = _device_info(device_id, devices_cache[device_id])
 
     return device_info
 
@@ -46,26 +68,10 @@ def get_device_history(device_id: str, limit: int = 100, start_date: Optional[st
             detail="Устройство не найдено"
         )
 
-    conn = database.get_db_connection()
-    cursor = conn.cursor()
-
-    query = "SELECT timestamp, data FROM sensor_data WHERE device_id = ?"
-    params = [device_id]
-
-    if start_date:
-        query += " AND timestamp >= ?"
-        params.append(start_date)
-
-    if end_date:
-        query += " AND timestamp <= ?"
-        params.append(end_date)
-
-    query += " ORDER BY timestamp DESC LIMIT ?"
-    params.append(limit)
-
-    cursor.execute(query, params)
-    rows = cursor.fetchall()
-    conn.close()
+    with database.get_db_connection() as conn:
+        # Читаем только секции, попадающие в запрошенный интервал
+        rows = timeseries.query_history(
+            conn.cursor(), device_id, limit, start_date, end_date)
 
     if not rows:
         return []
@@ -75,13 +81,50 @@ def get_device_history(device_id: str, limit: int = 100, start_date: Optional[st
     return history
 
 
+def _parse_local_datetime(value: str) -> datetime:
+    """Разбор даты ISO 8601; дата с часовым поясом переводится в локальное
+    время без пояса, в котором хранятся показания"""
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed
+
+
+def get_device_history_aggregate(device_id: str, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                                 buckets: int = 100, fields: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Получение агрегированной истории показаний устройства (min/max/avg/last)"""
+    if device_id not in devices_cache:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Устройство не найдено"
+        )
+
+    try:
+        end = _parse_local_datetime(end_date) if end_date else datetime.now()
+        start = _parse_local_datetime(
+            start_date) if start_date else end - timedelta(days=1)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Некорректный формат даты"
+        )
+
+    if start >= end:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Дата начала должна быть раньше даты окончания"
+        )
+
+    with database.get_db_connection() as conn:
+        return rollups.query_aggregate(conn.cursor(), device_id, start, end, buckets, fields)
+
+
 def get_all_groups() -> List[Dict[str, Any]]:
     """Получение всех групп устройств"""
-    conn = database.get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, name, description, devices FROM device_groups")
-    rows = cursor.fetchall()
-    conn.close()
+    with database.get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, name, description, devices FROM device_groups")
+        rows = cursor.fetchall()
 
     local_groups = [
         {
@@ -92,12 +135,15 @@ def get_all_groups() -> List[Dict[str, Any]]:
         } for row in rows
     ]
 
-    # Добавляем информацию из кэша Zigbee2MQTT
+    # Добавляем информацию из кэша Zigbee2MQTT (первая группа с таким именем)
+    zigbee_by_name = {}
+    for zigbee_group in list(groups_cache.values()):
+        zigbee_by_name.setdefault(zigbee_group.get("friendly_name"), zigbee_group)
+
     for local_group in local_groups:
-        for group_id, zigbee_group in groups_cache.items():
-            if zigbee_group.get("friendly_name") == local_group["name"]:
-                local_group["zigbee_info"] = zigbee_group
-                break
+        zigbee_group = zigbee_by_name.get(local_group["name"])
+        if zigbee_group is not None:
+            local_group["zigbee_info"] = zigbee_group
 
     return local_groups
 
@@ -105,24 +151,23 @@ def get_all_groups() -> List[Dict[str, Any]]:
 def create_group(name: str, devices: List[str], description: Optional[str] = None) -> Dict[str, Any]:
     """Создание новой группы устройств"""
     # Проверяем, что группа с таким именем не существует
-    conn = database.get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT id FROM device_groups WHERE name = ?", (name,))
-    if cursor.fetchone():
-        conn.close()
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Группа с таким именем уже существует"
+    with database.get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT id FROM device_groups WHERE name = ?", (name,))
+        if cursor.fetchone():
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Группа с таким именем уже существует"
+            )
+
+        # Создаем группу в БД
+        cursor.execute(
+            "INSERT INTO device_groups (name, description, devices) VALUES (?, ?, ?)",
+            (name, description or f"Группа {name}", json.dumps(devices))
         )
+        group_id = cursor.lastrowid
 
-    # Создаем группу в БД
-    cursor.execute(
-        "INSERT INTO device_groups (name, description, devices) VALUES (?, ?, ?)",
-        (name, description or f"Группа {name}", json.dumps(devices))
-    )
-    group_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
+    response_cache.bump(GROUPS)
 
     return {
         "id": group_id,
@@ -134,70 +179,64 @@ def create_group(name: str, devices: List[str], description: Optional[str] = Non
 
 def update_group(group_id: int, data: Dict[str, Any]) -> Dict[str, Any]:
     """Обновление группы устройств"""
-    conn = database.get_db_connection()
-    cursor = conn.cursor()
-
-    # Проверяем существование группы
-    cursor.execute("SELECT name FROM device_groups WHERE id = ?", (group_id,))
-    row = cursor.fetchone()
-    if not row:
-        conn.close()
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Группа не найдена"
+    with database.get_db_connection() as conn:
+        cursor = conn.cursor()
+
+        # Проверяем существование группы
+        cursor.execute("SELECT name FROM device_groups WHERE id = ?", (group_id,))
+        row = cursor.fetchone()
+        if not row:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Группа не найдена"
+            )
+
+        # Обновляем группу
+        fields = []
+        values = []
+
+        if "name" in data and data["name"]:
+            # Проверяем, что новое имя не занято
+            if data["name"] != row["name"]:
+                cursor.execute(
+                    "SELECT id FROM device_groups WHERE name = ?", (data["name"],))
+                if cursor.fetchone():
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail="Группа с таким именем уже существует"
+                    )
+
+            fields.append("name = ?")
+            values.append(data["name"])
+
+        if "description" in data:
+            fields.append("description = ?")
+            values.append(data["description"])
+
+        if "devices" in data:
+            fields.append("devices = ?")
+            values.append(json.dumps(data["devices"]))
+
+        if not fields:
+            return get_group(group_id)
+
+        values.append(group_id)
+
+        cursor.execute(
+            f"UPDATE device_groups SET {', '.join(fields)} WHERE id = ?",
+            values
         )
 
-    # Обновляем группу
-    fields = []
-    values = []
-
-    if "name" in data and data["name"]:
-        # Проверяем, что новое имя не занято
-        if data["name"] != row["name"]:
-            cursor.execute(
-                "SELECT id FROM device_groups WHERE name = ?", (data["name"],))
-            if cursor.fetchone():
-                conn.close()
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Группа с таким именем уже существует"
-                )
-
-        fields.append("name = ?")
-        values.append(data["name"])
-
-    if "description" in data:
-        fields.append("description = ?")
-        values.append(data["description"])
-
-    if "devices" in data:
-        fields.append("devices = ?")
-        values.append(json.dumps(data["devices"]))
-
-    if not fields:
-        conn.close()
-        return get_group(group_id)
-
-    values.append(group_id)
-
-    cursor.execute(
-        f"UPDATE device_groups SET {', '.join(fields)} WHERE id = ?",
-        values
-    )
-    conn.commit()
-    conn.close()
-
+    response_cache.bump(GROUPS)
     return get_group(group_id)
 
 
 def delete_group(group_id: int) -> bool:
     """Удаление группы устройств"""
-    conn = database.get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM device_groups WHERE id = ?", (group_id,))
-    success = cursor.rowcount > 0
-    conn.commit()
-    conn.close()
+    with database.get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM device_groups WHERE id = ?", (group_id,))
+        success = cursor.rowcount > 0
 
     if not success:
         raise HTTPException(
@@ -205,17 +244,17 @@ def delete_group(group_id: int) -> bool:
             detail="Группа не найдена"
         )
 
+    response_cache.bump(GROUPS)
     return True
 
 
 def get_group(group_id: int) -> Dict[str, Any]:
     """Получение группы по ID"""
-    conn = database.get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "SELECT id, name, description, devices FROM device_groups WHERE id = ?", (group_id,))
-    row = cursor.fetchone()
-    conn.close()
+    with database.get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT id, name, description, devices FROM device_groups WHERE id = ?", (group_id,))
+        row = cursor.fetchone()
 
     if not row:
         raise HTTPException(
@@ -2,6 +2,7 @@ from typing import Dict, List, Any, Optional
 from fastapi import HTTPException, status
 import database
 import json
+from services.task_verifier import task_verifier
 
 
 def create_lab(title: str, description: str, content: Dict[str, Any], created_by: int) -> Dict[str, Any]:
@@ -59,10 +60,12 @@ def delete_lab(lab_id: int) -> bool:
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Лабораторная работа не найдена"
         )
+    task_verifier.invalidate()
     return True
 
 
-def create_task(lab_id: int, title: str, description: str, task_type: str, content: Dict[str, Any], order_index: int, max_score: float) -> Dict[str, Any]:
+def create_task(lab_id: int, title: str, description: str, task_type: str, content: Dict[str, Any], order_index: int, max_score: float,
+                devices: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
     """Создание нового задания для лабораторной работы"""
     # Проверяем существование лабораторной работы
     lab = database.get_lab(lab_id)
@@ -74,6 +77,9 @@ def create_task(lab_id: int, title: str, description: str, task_type: str, conte
 
     task_id = database.create_task(
         lab_id, title, description, task_type, content, order_index, max_score)
+    if devices:
+        database.set_task_devices(task_id, devices)
+        task_verifier.invalidate()
 
     # Получаем обновленную лабораторную работу с заданиями
     lab = database.get_lab(lab_id)
@@ -96,19 +102,22 @@ def create_task(lab_id: int, title: str, description: str, task_type: str, conte
 
 def update_task(task_id: int, data: Dict[str, Any]) -> Dict[str, Any]:
     """Обновление задания"""
-    success = database.update_task(task_id, data)
-    if not success:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Задание не найдено"
-        )
+    devices = data.pop("devices", None)
+
+    # Без изменяемых полей наличие задания проверяется ниже
+    if data:
+        success = database.update_task(task_id, data)
+        if not success:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Задание не найдено"
+            )
 
     # Получаем обновленное задание
-    conn = database.get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT lab_id FROM lab_tasks WHERE id = ?", (task_id,))
-    row = cursor.fetchone()
-    conn.close()
+    with database.get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT lab_id FROM lab_tasks WHERE id = ?", (task_id,))
+        row = cursor.fetchone()
 
     if not row:
         raise HTTPException(
@@ -116,6 +125,10 @@ def update_task(task_id: int, data: Dict[str, Any]) -> Dict[str, Any]:
             detail="Задание не найдено"
         )
 
+    if devices is not None:
+        database.set_task_devices(task_id, devices)
+    task_verifier.invalidate()
+
     lab_id = row["lab_id"]
     lab = database.get_lab(lab_id)
 
@@ -143,25 +156,25 @@ def delete_task(task_id: int) -> bool:
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Задание не найдено"
         )
+    task_verifier.invalidate()
     return True
 
 
 def add_device_to_task(task_id: int, device_id: str, required_state: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
     """Добавление устройства к заданию"""
     # Проверяем существование задания
-    conn = database.get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT id FROM lab_tasks WHERE id = ?", (task_id,))
-    if not cursor.fetchone():
-        conn.close()
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Задание не найдено"
-        )
-    conn.close()
+    with database.get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT id FROM lab_tasks WHERE id = ?", (task_id,))
+        if not cursor.fetchone():
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Задание не найдено"
+            )
 
     device_task_id = database.add_device_to_task(
         task_id, device_id, required_state)
+    task_verifier.invalidate()
 
     return {
         "id": device_task_id,
@@ -179,6 +192,7 @@ def remove_device_from_task(task_id: int, device_id: str) -> bool:
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Устройство не найдено в задании"
         )
+    task_verifier.invalidate()
     return True
 
 
@@ -201,14 +215,13 @@ def create_lab_result(lab_id: int, user_id: int) -> Dict[str, Any]:
         )
 
     # Проверяем, нет ли уже начатой работы
-    conn = database.get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "SELECT id FROM lab_results WHERE lab_id = ? AND user_id = ? AND status = 'in_progress'",
-        (lab_id, user_id)
-    )
-    existing_result = cursor.fetchone()
-    conn.close()
+    with database.get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT id FROM lab_results WHERE lab_id = ? AND user_id = ? AND status = 'in_progress'",
+            (lab_id, user_id)
+        )
+        existing_result = cursor.fetchone()
 
     if existing_result:
         return database.get_lab_result(existing_result["id"])
@@ -216,8 +229,10 @@ def create_lab_result(lab_id: int, user_id: int) -> Dict[str, Any]:
     result_id = database.create_lab_result(lab_id, user_id)
 
     # Создаем пустые результаты для всех заданий
-    for task in lab["tasks"]:
-        database.create_task_result(result_id, task["id"])
+    database.create_task_results(result_id, [task["id"] for task in lab["tasks"]])
+
+    # Задания с устройствами проверяются автоматически по их состояниям
+    task_verifier.watch_result(result_id)
 
     return database.get_lab_result(result_id)
 
@@ -233,6 +248,42 @@ def get_lab_result(result_id: int) -> Dict[str, Any]:
     return result
 
 
+def get_lab_results(lab_id: int) -> List[Dict[str, Any]]:
+    """Получение всех результатов лабораторной работы с результатами заданий"""
+    return database.get_lab_results_full(lab_id=lab_id)
+
+
+def get_lab_results_page(lab_id: int, page: int = 1, page_size: int = 50, sort_by: str = "id",
+                         order: str = "asc", status_filter: Optional[str] = None,
+                         search: Optional[str] = None) -> Dict[str, Any]:
+    """Страница результатов лабораторной работы с именами студентов"""
+    if sort_by not in database.LAB_RESULT_SORT_FIELDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Недопустимое поле сортировки: {sort_by}"
+        )
+
+    if order.lower() not in ("asc", "desc"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Порядок сортировки должен быть asc или desc"
+        )
+
+    if status_filter and status_filter not in ("in_progress", "submitted", "reviewed"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Недопустимый статус: {status_filter}"
+        )
+
+    return database.get_lab_results_page(
+        lab_id, page, page_size, sort_by, order, status_filter, search)
+
+
+def get_user_lab_results(user_id: int) -> List[Dict[str, Any]]:
+    """Получение всех результатов пользователя с результатами заданий"""
+    return database.get_lab_results_full(user_id=user_id)
+
+
 def update_lab_result(result_id: int, data: Dict[str, Any], user_id: int = None) -> Dict[str, Any]:
     """Обновление результата выполнения лабораторной работы"""
     # Если указан user_id, добавляем его в данные для обновления
@@ -246,11 +297,33 @@ def update_lab_result(result_id: int, data: Dict[str, Any], user_id: int = None)
             detail="Результат не найден"
         )
 
+    # После сдачи работы задания больше не проверяются автоматически
+    if data.get("status") and data["status"] != "in_progress":
+        task_verifier.unwatch_result(result_id)
+
     return database.get_lab_result(result_id)
 
 
 def update_task_result(task_result_id: int, data: Dict[str, Any]) -> Dict[str, Any]:
     """Обновление результата выполнения задания"""
+    # Оценка, выставленная вручную, заменяет автоматическую проверку
+    if data.get("score") is not None:
+        task_verifier.unwatch_task_result(task_result_id)
+
+    # Результат автоматической проверки пишет только сервер: отчет студента
+    # не может ни затереть, ни подменить его
+    if isinstance(data.get("answer"), dict):
+        with database.get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT answer FROM task_results WHERE id = ?",
+                           (task_result_id,))
+            row = cursor.fetchone()
+        previous = json.loads(row["answer"]) if row and row["answer"] else {}
+        answer = {key: value for key, value in data["answer"].items() if key != "verification"}
+        if "verification" in previous:
+            answer["verification"] = previous["verification"]
+        data["answer"] = answer
+
     success = database.update_task_result(task_result_id, data)
     if not success:
         raise HTTPException(
@@ -259,12 +332,11 @@ def update_task_result(task_result_id: int, data: Dict[str, Any]) -> Dict[str, A
         )
 
     # Получаем обновленный результат задания
-    conn = database.get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM task_results WHERE id = ?",
-                   (task_result_id,))
-    task_result = cursor.fetchone()
-    conn.close()
+    with database.get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM task_results WHERE id = ?",
+                       (task_result_id,))
+        task_result = cursor.fetchone()
 
     if not task_result:
         raise HTTPException(
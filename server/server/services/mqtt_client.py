@@ -1,15 +1,32 @@
 import json
+import uuid
+import asyncio
+import itertools
 import paho.mqtt.client as mqtt
-from typing import Callable, Dict, Any, Optional
-from threading import Thread
+from typing import Callable, Dict, Any, Optional, List, Tuple
+from threading import Thread, Lock
 import time
 from datetime import datetime, timedelta
+import config
 from config import (
-    MQTT_BROKER, MQTT_PORT, MQTT_TOPIC_SUBSCRIBE, MQTT_TOPIC_PUBLISH_PREFIX,
+    MQTT_BROKER, MQTT_PORT, MQTT_TOPIC_SUBSCRIBE, MQTT_TOPIC_PUBLISH_PREFIX, MQTT_REQUEST_TIMEOUT,
     devices_cache, device_availability, device_states, network_info, groups_cache,
-    pairing_mode_active, discovered_devices, logger
+    discovered_devices, logger
 )
 import database
+from services.sensor_ingest import sensor_writer
+from services.websocket.device_bridge import device_bridge
+from utils.response_cache import response_cache, DEVICES, GROUPS
+from services.device_changes import device_changes
+from services.task_verifier import task_verifier
+
+
+class BridgeRequestError(Exception):
+    """Ошибка запроса к мосту zigbee2mqtt"""
+
+
+class BridgeRequestTimeout(BridgeRequestError):
+    """Мост zigbee2mqtt не ответил на запрос вовремя"""
 
 
 class MQTTClient:
@@ -19,12 +36,30 @@ class MQTTClient:
         self.client.on_message = self.on_message
         self.client.on_disconnect = self.on_disconnect
         self.connected = False
+        self._thread: Optional[Thread] = None
+
+        # Ожидающие ответа запросы к мосту: transaction -> (цикл событий, future)
+        self._pending: Dict[str, Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = {}
+        # Ожидающие появления устройства в списке: device_id -> [(цикл событий, future)]
+        self._device_waiters: Dict[str, List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]]] = {}
+        self._lock = Lock()
+        self._transaction_prefix = uuid.uuid4().hex[:8]
+        self._transaction_counter = itertools.count(1)
+
+        # Метрики запросов к мосту
+        self.requests_sent = 0
+        self.requests_completed = 0
+        self.requests_failed = 0
+        self.requests_timed_out = 0
 
     def start(self):
-        """Запуск MQTT клиента в отдельном потоке"""
+        """Запуск MQTT клиента в отдельном потоке (повторный вызов не создает второй поток)"""
+        if self._thread is not None and self._thread.is_alive():
+            return self._thread
         thread = Thread(target=self._connect_loop)
         thread.daemon = True
         thread.start()
+        self._thread = thread
         return thread
 
     def _connect_loop(self):
@@ -51,6 +86,7 @@ class MQTTClient:
         client.subscribe(f"{MQTT_TOPIC_PUBLISH_PREFIX}/bridge/groups")
         client.subscribe(f"{MQTT_TOPIC_PUBLISH_PREFIX}/+/availability")
         client.subscribe(f"{MQTT_TOPIC_PUBLISH_PREFIX}/bridge/event/#")
+        client.subscribe(f"{MQTT_TOPIC_PUBLISH_PREFIX}/bridge/response/#")
 
         # Подписка на все устройства для получения их состояний
         client.subscribe(f"{MQTT_TOPIC_PUBLISH_PREFIX}/+")
@@ -109,6 +145,11 @@ class MQTTClient:
                 self.handle_bridge_log(payload)
                 return
 
+            # Обработка ответов моста на запросы
+            if topic.startswith(f"{MQTT_TOPIC_PUBLISH_PREFIX}/bridge/response/"):
+                self.handle_bridge_response(topic, payload)
+                return
+
             # Обработка событий моста
             if topic.startswith(f"{MQTT_TOPIC_PUBLISH_PREFIX}/bridge/event/"):
                 event_type = topic.split('/')[-1]
@@ -119,6 +160,8 @@ class MQTTClient:
             if topic.endswith("/availability"):
                 device_id = topic.split('/')[-2]
                 device_availability[device_id] = payload
+                response_cache.bump(DEVICES)
+                device_changes.record(device_id)
                 logger.debug(
                     f"Обновлен статус доступности устройства {device_id}: {payload}")
                 return
@@ -133,9 +176,17 @@ class MQTTClient:
 
                 # Обновляем состояние устройства в кэше
                 device_states[device_id] = payload
+                response_cache.bump(DEVICES)
+                device_changes.record(device_id)
+
+                # Проверяем задания, зависящие от этого устройства
+                task_verifier.on_state(device_id)
+
+                # Передаем обновление подписчикам WebSocket
+                device_bridge.publish(device_id, payload)
 
-                # Сохраняем данные в БД
-                database.save_to_db(device_id, payload)
+                # Ставим данные в очередь пакетной записи в БД
+                sensor_writer.enqueue(device_id, payload)
 
                 logger.debug(
                     f"Обновлено состояние устройства {device_id}: {payload}")
@@ -146,79 +197,88 @@ class MQTTClient:
 
     def update_devices_cache(self, devices_list):
         """Обновляет кэш устройств на основе полученного списка"""
-        global devices_cache
-
         new_cache = {}
         for device in devices_list:
             device_id = device.get("ieee_address")
             if device_id:
                 new_cache[device_id] = device
 
-        devices_cache = new_cache
+        changed = [device_id for device_id, device in new_cache.items()
+                   if devices_cache.get(device_id) != device]
+        removed = [device_id for device_id in devices_cache
+                   if device_id not in new_cache]
+
+        # Кэш изменяется на месте, чтобы его видели все модули, импортировавшие его из config
+        devices_cache.clear()
+        devices_cache.update(new_cache)
+        response_cache.bump(DEVICES)
+        device_changes.record_many(changed, removed)
+        # Имена устройств в заданиях сопоставляются по новому списку
+        if changed or removed:
+            task_verifier.invalidate()
         logger.info(
             f"Обновлен кэш устройств, всего устройств: {len(devices_cache)}")
 
+        self._resolve_device_waiters()
+
     def update_network_info(self, info_data):
         """Обновляет информацию о сети Zigbee"""
-        global network_info
-        network_info = info_data
+        network_info.clear()
+        network_info.update(info_data)
         logger.info("Обновлена информация о сети Zigbee")
 
     def update_groups_cache(self, groups_list):
         """Обновляет кэш групп устройств"""
-        global groups_cache
-
         new_cache = {}
         for group in groups_list:
             group_id = group.get("id")
             if group_id:
                 new_cache[group_id] = group
 
-        groups_cache = new_cache
+        groups_cache.clear()
+        groups_cache.update(new_cache)
 
         # Синхронизируем с локальной БД
         self.sync_groups_with_db()
+        response_cache.bump(GROUPS)
 
         logger.info(f"Обновлен кэш групп, всего групп: {len(groups_cache)}")
 
     def sync_groups_with_db(self):
         """Синхронизирует группы из Zigbee2MQTT с локальной БД"""
         try:
-            conn = database.get_db_connection()
-            cursor = conn.cursor()
-
-            # Получаем все группы из БД
-            cursor.execute(
-                "SELECT id, name, description, devices FROM device_groups")
-            db_groups = cursor.fetchall()
-
-            # Создаем словарь групп из БД по имени
-            db_groups_by_name = {}
-            for group in db_groups:
-                db_groups_by_name[group[1]] = {
-                    "id": group[0],
-                    "description": group[2],
-                    "devices": json.loads(group[3])
-                }
-
-            # Проверяем, нужно ли добавить новые группы из Zigbee2MQTT в БД
-            for group_id, group in groups_cache.items():
-                friendly_name = group.get("friendly_name")
-                if friendly_name and friendly_name not in db_groups_by_name:
-                    # Добавляем группу в БД
-                    members = group.get("members", [])
-                    devices = [member.get("ieee_address")
-                               for member in members if member.get("ieee_address")]
-
-                    cursor.execute(
-                        "INSERT INTO device_groups (name, description, devices) VALUES (?, ?, ?)",
-                        (friendly_name,
-                         f"Группа {friendly_name}", json.dumps(devices))
-                    )
-                    logger.info(f"Добавлена новая группа {friendly_name} в БД")
-
-            conn.commit()
-            conn.close()
+            with database.get_db_connection() as conn:
+                cursor = conn.cursor()
+
+                # Получаем все группы из БД
+                cursor.execute(
+                    "SELECT id, name, description, devices FROM device_groups")
+                db_groups = cursor.fetchall()
+
+                # Создаем словарь групп из БД по имени
+                db_groups_by_name = {}
+                for group in db_groups:
+                    db_groups_by_name[group[1]] = {
+                        "id": group[0],
+                        "description": group[2],
+                        "devices": json.loads(group[3])
+                    }
+
+                # Проверяем, нужно ли добавить новые группы из Zigbee2MQTT в БД
+                for group_id, group in groups_cache.items():
+                    friendly_name = group.get("friendly_name")
+                    if friendly_name and friendly_name not in db_groups_by_name:
+                        # Добавляем группу в БД
+                        members = group.get("members", [])
+                        devices = [member.get("ieee_address")
+                                   for member in members if member.get("ieee_address")]
+
+                        cursor.execute(
+                            "INSERT INTO device_groups (name, description, devices) VALUES (?, ?, ?)",
+                            (friendly_name,
+                             f"Группа {friendly_name}", json.dumps(devices))
+                        )
+                        logger.info(f"Добавлена новая группа {friendly_name} в БД")
         except Exception as e:
             logger.error(f"Ошибка синхронизации групп с БД: {e}")
 
@@ -233,12 +293,136 @@ class MQTTClient:
         else:
             logger.debug(f"Zigbee2MQTT лог [{level}]: {message}")
 
+    def handle_bridge_response(self, topic, payload):
+        """Передает ответ моста ожидающему запросу по идентификатору транзакции"""
+        transaction = payload.get("transaction") if isinstance(payload, dict) else None
+        if transaction is None:
+            logger.debug(f"Ответ моста без транзакции в топике {topic}")
+            return
+
+        with self._lock:
+            pending = self._pending.pop(str(transaction), None)
+        if pending is None:
+            return
+
+        loop, future = pending
+        loop.call_soon_threadsafe(self._set_future_result, future, payload)
+
+    @staticmethod
+    def _set_future_result(future: asyncio.Future, result: Any):
+        """Завершение future, если его еще не отменили"""
+        if not future.done():
+            future.set_result(result)
+
+    def _next_transaction(self) -> str:
+        """Уникальный идентификатор транзакции запроса к мосту"""
+        return f"{self._transaction_prefix}-{next(self._transaction_counter)}"
+
+    async def bridge_request(self, path: str, payload: Optional[Dict[str, Any]] = None,
+                             timeout: float = MQTT_REQUEST_TIMEOUT) -> Dict[str, Any]:
+        """Запрос к мосту zigbee2mqtt с ожиданием ответа
+
+        Публикует запрос в bridge/request/<path> с полем transaction и ждет
+        ответ с тем же идентификатором в bridge/response/<path>.
+        Возвращает поле data ответа.
+        """
+        if not self.connected:
+            raise BridgeRequestError("Нет подключения к MQTT брокеру")
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        transaction = self._next_transaction()
+        message = dict(payload or {})
+        message["transaction"] = transaction
+
+        with self._lock:
+            self._pending[transaction] = (loop, future)
+            self.requests_sent += 1
+
+        try:
+            result = self.client.publish(
+                f"{MQTT_TOPIC_PUBLISH_PREFIX}/bridge/request/{path}",
+                json.dumps(message)
+            )
+            if result.rc != 0:
+                raise BridgeRequestError(
+                    f"Ошибка публикации запроса {path}: код {result.rc}")
+
+            try:
+                response = await asyncio.wait_for(future, timeout)
+            except asyncio.TimeoutError:
+                with self._lock:
+                    self.requests_timed_out += 1
+                raise BridgeRequestTimeout(
+                    f"Мост zigbee2mqtt не ответил на запрос {path} за {timeout} с")
+        except BridgeRequestError:
+            with self._lock:
+                self.requests_failed += 1
+            raise
+        finally:
+            with self._lock:
+                self._pending.pop(transaction, None)
+
+        if response.get("status") != "ok":
+            with self._lock:
+                self.requests_failed += 1
+            raise BridgeRequestError(
+                response.get("error") or f"Мост zigbee2mqtt отклонил запрос {path}")
+
+        with self._lock:
+            self.requests_completed += 1
+        return response.get("data") or {}
+
+    async def wait_for_device(self, device_id: str, timeout: float = MQTT_REQUEST_TIMEOUT) -> Optional[Dict[str, Any]]:
+        """Ожидание появления устройства в кэше после обновления списка устройств"""
+        if device_id in devices_cache:
+            return devices_cache[device_id]
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            self._device_waiters.setdefault(device_id, []).append((loop, future))
+
+        self.request_devices()
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._lock:
+                waiters = self._device_waiters.get(device_id)
+                if waiters:
+                    waiters[:] = [w for w in waiters if w[1] is not future]
+                    if not waiters:
+                        del self._device_waiters[device_id]
+
+        return devices_cache.get(device_id)
+
+    def _resolve_device_waiters(self):
+        """Пробуждение ожидающих устройств, появившихся в кэше"""
+        with self._lock:
+            ready = [device_id for device_id in self._device_waiters if device_id in devices_cache]
+            waiters = [w for device_id in ready for w in self._device_waiters.pop(device_id)]
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(self._set_future_result, future, True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Метрики MQTT клиента"""
+        with self._lock:
+            return {
+                "connected": self.connected,
+                "pending_requests": len(self._pending),
+                "requests_sent": self.requests_sent,
+                "requests_completed": self.requests_completed,
+                "requests_failed": self.requests_failed,
+                "requests_timed_out": self.requests_timed_out,
+                "device_waiters": sum(len(w) for w in self._device_waiters.values())
+            }
+
     def handle_bridge_event(self, event_type, payload):
         """Обрабатывает события моста Zigbee"""
-        global discovered_devices, pairing_mode_active
-
         # Обработка событий сопряжения
-        if pairing_mode_active:
+        if config.pairing_mode_active:
             if event_type == "device_interview":
                 self.handle_device_interview(payload)
             elif event_type == "device_joined":
@@ -259,8 +443,6 @@ class MQTTClient:
 
     def handle_device_interview(self, payload):
         """Обрабатывает событие интервью устройства (получение информации о возможностях)"""
-        global discovered_devices
-
         device_id = payload.get("data", {}).get("ieee_address")
         status = payload.get("status")
 
@@ -359,65 +541,44 @@ class MQTTClient:
             logger.error(f"Ошибка запроса информации о сети: {e}")
             return False
 
-    def start_pairing(self, duration: int = 60) -> bool:
+    async def start_pairing(self, duration: int = 60) -> bool:
         """Включает режим сопряжения для добавления новых устройств"""
-        global pairing_mode_active, pairing_end_time, discovered_devices
-
-        if not self.connected:
-            logger.warning(
-                "Попытка включить режим сопряжения без подключения к MQTT")
-            return False
-
         try:
             # Очищаем список обнаруженных устройств
-            discovered_devices = {}
+            discovered_devices.clear()
 
             # Отправляем команду в zigbee2mqtt для включения режима сопряжения
-            result = self.client.publish(
-                f"{MQTT_TOPIC_PUBLISH_PREFIX}/bridge/request/permit_join",
-                json.dumps({"value": True, "time": duration})
-            )
+            await self.bridge_request("permit_join", {"value": True, "time": duration})
 
-            if result.rc != 0:
-                logger.error(
-                    f"Ошибка включения режима сопряжения: код {result.rc}")
-                return False
-
-            pairing_mode_active = True
-            pairing_end_time = datetime.now() + timedelta(seconds=duration)
+            config.pairing_mode_active = True
+            config.pairing_end_time = datetime.now() + timedelta(seconds=duration)
 
             logger.info(f"Режим сопряжения активирован на {duration} секунд")
             return True
-        except Exception as e:
+        except BridgeRequestError as e:
             logger.error(f"Ошибка при включении режима сопряжения: {e}")
             return False
 
-    def stop_pairing(self) -> bool:
+    async def stop_pairing(self) -> bool:
         """Отключает режим сопряжения"""
-        global pairing_mode_active, pairing_end_time
-
-        if not self.connected:
-            logger.warning(
-                "Попытка отключить режим сопряжения без подключения к MQTT")
-            return False
-
         try:
             # Отправляем команду в zigbee2mqtt для отключения режима сопряжения
-            result = self.client.publish(
-                f"{MQTT_TOPIC_PUBLISH_PREFIX}/bridge/request/permit_join",
-                json.dumps({"value": False})
-            )
+            await self.bridge_request("permit_join", {"value": False})
 
-            if result.rc != 0:
-                logger.error(
-                    f"Ошибка отключения режима сопряжения: код {result.rc}")
-                return False
-
-            pairing_mode_active = False
-            pairing_end_time = None
+            config.pairing_mode_active = False
+            config.pairing_end_time = None
 
             logger.info("Режим сопряжения отключен")
             return True
-        except Exception as e:
+        except BridgeRequestError as e:
             logger.error(f"Ошибка при отключении режима сопряжения: {e}")
             return False
+
+
+# Единственный экземпляр MQTT клиента, общий для всего приложения
+mqtt_client = MQTTClient()
+
+
+def get_mqtt_client() -> MQTTClient:
+    """Зависимость FastAPI для получения общего MQTT клиента"""
+    return mqtt_client
@@ -0,0 +1,182 @@
+import time
+import queue
+from datetime import datetime
+from threading import Thread, Event, Lock
+from typing import Dict, Any, List, Optional
+from config import (
+    SENSOR_BATCH_SIZE, SENSOR_FLUSH_INTERVAL, SENSOR_QUEUE_MAXSIZE, logger
+)
+import database
+
+# Маркер остановки потока записи
+_STOP = object()
+
+
+class SensorDataWriter:
+    """Буферизованная запись показаний сенсоров в БД
+
+    Сообщения MQTT только кладутся в очередь, а отдельный поток сбрасывает
+    их в sensor_data пакетами: при наборе batch_size строк или по истечении
+    flush_interval секунд, в зависимости от того, что наступит раньше.
+    """
+
+    def __init__(self, batch_size: int = SENSOR_BATCH_SIZE,
+                 flush_interval: float = SENSOR_FLUSH_INTERVAL,
+                 maxsize: int = SENSOR_QUEUE_MAXSIZE):
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = max(0.01, flush_interval)
+        self._queue: queue.Queue = queue.Queue(maxsize=maxsize)
+        self._thread: Optional[Thread] = None
+        self._stopped = Event()
+        self._flush_lock = Lock()
+
+        # Метрики
+        self._stats_lock = Lock()
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.flushes = 0
+        self.max_queue_depth = 0
+        self.last_flush_size = 0
+        self.last_flush_duration = 0.0
+        self._last_drop_warning = 0.0
+
+    def start(self):
+        """Запуск потока записи"""
+        if self._thread and self._thread.is_alive():
+            return self._thread
+
+        self._stopped.clear()
+        self._thread = Thread(target=self._run, name="sensor-writer")
+        self._thread.daemon = True
+        self._thread.start()
+        logger.info(
+            f"Запущена буферизованная запись показаний (пакет {self.batch_size}, "
+            f"интервал {self.flush_interval}с, очередь {self._queue.maxsize})")
+        return self._thread
+
+    def enqueue(self, device_id: str, data: Dict[str, Any]) -> bool:
+        """Постановка показаний в очередь записи (не блокирует вызывающий поток)"""
+        row = (device_id, datetime.now().isoformat(), data)
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            with self._stats_lock:
+                self.dropped += 1
+                now = time.monotonic()
+                warn = now - self._last_drop_warning > 10
+                if warn:
+                    self._last_drop_warning = now
+            if warn:
+                logger.warning(
+                    f"Очередь записи показаний переполнена, отброшено всего: {self.dropped}")
+            return False
+
+        with self._stats_lock:
+            self.enqueued += 1
+            depth = self._queue.qsize()
+            if depth > self.max_queue_depth:
+                self.max_queue_depth = depth
+        return True
+
+    def _run(self):
+        """Основной цикл потока записи"""
+        while True:
+            batch, stop = self._collect_batch()
+            if batch:
+                self._flush(batch)
+            if stop:
+                break
+
+    def _collect_batch(self):
+        """Сбор пакета строк до заполнения или истечения интервала"""
+        batch: List[tuple] = []
+        deadline = time.monotonic() + self.flush_interval
+
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+
+        return batch, False
+
+    def _flush(self, batch: List[tuple]):
+        """Запись пакета строк одной транзакцией"""
+        with self._flush_lock:
+            started = time.perf_counter()
+            try:
+                database.save_many_to_db(batch)
+            except Exception as e:
+                with self._stats_lock:
+                    self.failed += len(batch)
+                logger.error(
+                    f"Ошибка пакетной записи показаний ({len(batch)} строк): {e}")
+                return
+
+            duration = time.perf_counter() - started
+            with self._stats_lock:
+                self.written += len(batch)
+                self.flushes += 1
+                self.last_flush_size = len(batch)
+                self.last_flush_duration = duration
+
+    def _drain(self) -> List[tuple]:
+        """Извлечение всех оставшихся в очереди строк"""
+        rows = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return rows
+            if item is not _STOP:
+                rows.append(item)
+
+    def stop(self, timeout: float = 5.0):
+        """Остановка потока с гарантированной записью накопленных данных"""
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+
+        if self._thread and self._thread.is_alive():
+            try:
+                self._queue.put(_STOP, timeout=timeout)
+            except queue.Full:
+                pass
+            self._thread.join(timeout)
+
+        # Дописываем всё, что осталось после остановки потока
+        rows = self._drain()
+        for i in range(0, len(rows), self.batch_size):
+            self._flush(rows[i:i + self.batch_size])
+
+        logger.info(
+            f"Запись показаний остановлена, всего записано: {self.written}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Метрики очереди записи"""
+        with self._stats_lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "queue_capacity": self._queue.maxsize,
+                "max_queue_depth": self.max_queue_depth,
+                "enqueued": self.enqueued,
+                "written": self.written,
+                "dropped": self.dropped,
+                "failed": self.failed,
+                "flushes": self.flushes,
+                "last_flush_size": self.last_flush_size,
+                "last_flush_duration_ms": round(self.last_flush_duration * 1000, 3),
+                "running": bool(self._thread and self._thread.is_alive())
+            }
+
+
+# Глобальный экземпляр буферизованной записи показаний
+sensor_writer = SensorDataWriter()
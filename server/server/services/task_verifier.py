@@ -0,0 +1,396 @@
+import json
+import queue
+import time
+import operator
+from datetime import datetime, timezone
+from threading import Thread, Lock
+from typing import Dict, Any, List, Optional, Set, Tuple
+from config import VERIFIER_QUEUE_MAXSIZE, devices_cache, device_states, logger
+import database
+
+# Маркеры перезагрузки наблюдений и остановки потока
+_RELOAD = object()
+_STOP = object()
+
+# Операторы условий required_state: {"temperature": {">=": 25}}
+OPERATORS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+}
+
+
+def _equal(actual: Any, expected: Any) -> bool:
+    """Сравнение значений (строки без учета регистра: ON/on)"""
+    if isinstance(actual, str) and isinstance(expected, str):
+        return actual.lower() == expected.lower()
+    return actual == expected
+
+
+def matches(state: Dict[str, Any], required: Dict[str, Any]) -> bool:
+    """Соответствие состояния устройства условиям required_state
+
+    Значение условия - либо ожидаемое значение, либо словарь операторов
+    ({">": 20, "<=": 30}), либо вложенный словарь для вложенных полей.
+    """
+    for key, expected in required.items():
+        if key not in state:
+            return False
+        actual = state[key]
+
+        if isinstance(expected, dict) and expected and all(op in OPERATORS for op in expected):
+            for op, value in expected.items():
+                try:
+                    if not OPERATORS[op](actual, value):
+                        return False
+                except TypeError:
+                    return False
+        elif isinstance(expected, dict):
+            if not isinstance(actual, dict) or not matches(actual, expected):
+                return False
+        elif not _equal(actual, expected):
+            return False
+    return True
+
+
+def _device_aliases(device_id: str) -> Tuple[str, ...]:
+    """ID устройства и его второе имя (IEEE-адрес или friendly_name)
+
+    Состояния из MQTT приходят по friendly_name, а в задании может быть
+    указан IEEE-адрес, и наоборот.
+    """
+    device = devices_cache.get(device_id)
+    if device and device.get("friendly_name") and device["friendly_name"] != device_id:
+        return device_id, device["friendly_name"]
+    for ieee, device in devices_cache.items():
+        if device.get("friendly_name") == device_id and ieee != device_id:
+            return device_id, ieee
+    return (device_id,)
+
+
+def _parse_started_at(value: Optional[str]) -> float:
+    """Время начала попытки в секундах эпохи (CURRENT_TIMESTAMP в SQLite - UTC)"""
+    if not value:
+        return time.time()
+    try:
+        started = datetime.fromisoformat(value)
+    except ValueError:
+        return time.time()
+    if started.tzinfo is None:
+        started = started.replace(tzinfo=timezone.utc)
+    return started.timestamp()
+
+
+def _current_state(aliases: Tuple[str, ...]) -> Optional[Dict[str, Any]]:
+    """Последнее состояние устройства по любому из его имен"""
+    for alias in aliases:
+        state = device_states.get(alias)
+        if isinstance(state, dict):
+            return state
+    return None
+
+
+def _requirement_met(aliases: Tuple[str, ...], required: Dict[str, Any]) -> bool:
+    state = _current_state(aliases)
+    return state is not None and matches(state, required)
+
+
+class _Watch:
+    """Наблюдение за одним заданием одной попытки"""
+
+    __slots__ = ("task_result_id", "lab_result_id", "task_id", "max_score",
+                 "started_at", "watched_at", "requirements", "met")
+
+    def __init__(self, task_result_id: int, lab_result_id: int, task_id: int,
+                 max_score: float, started_at: float,
+                 requirements: List[Tuple[str, Tuple[str, ...], Dict[str, Any]]]):
+        self.task_result_id = task_result_id
+        self.lab_result_id = lab_result_id
+        self.task_id = task_id
+        self.max_score = max_score
+        self.started_at = started_at
+        # Начало наблюдения: более ранние обновления не засчитываются
+        self.watched_at = time.time()
+        # (ID устройства из задания, его имена, required_state)
+        self.requirements = requirements
+        # Выполнено ли условие каждого устройства при последней проверке;
+        # условия, выполненные уже на старте, требуют смены состояния
+        self.met = [_requirement_met(aliases, required)
+                    for _, aliases, required in requirements]
+
+
+class TaskVerifier:
+    """Автоматическая проверка заданий device_interaction
+
+    Для каждой попытки в статусе in_progress наблюдаются задания с
+    required_state, еще не получившие оценку. Наблюдения проиндексированы по
+    устройству, поэтому обновление состояния из MQTT проверяет только
+    связанные с ним задания. Проверка и запись оценки выполняются в отдельном
+    потоке; поток MQTT только ставит обновление в очередь.
+
+    Задание выполнено, когда состояния всех его устройств одновременно
+    удовлетворяют условиям и хотя бы одно из условий стало выполненным в
+    ходе наблюдения. Засчитываются только обновления, пришедшие после
+    начала наблюдения. В task_results записывается максимальный балл, а в
+    answer["verification"] - время выполнения и итоговые состояния.
+    """
+
+    def __init__(self, maxsize: int = VERIFIER_QUEUE_MAXSIZE):
+        self._queue: queue.Queue = queue.Queue(maxsize=maxsize)
+        self._thread: Optional[Thread] = None
+        self._lock = Lock()
+        # ID результата задания -> наблюдение
+        self._watches: Dict[int, _Watch] = {}
+        # Имя устройства -> ID результатов заданий, зависящих от него
+        self._by_device: Dict[str, Set[int]] = {}
+
+        # Метрики
+        self.updates = 0
+        self.dropped = 0
+        self.checks = 0
+        self.completed = 0
+        self.reloads = 0
+        self.failed = 0
+
+    def start(self):
+        """Запуск потока проверки с загрузкой активных попыток"""
+        if self._thread and self._thread.is_alive():
+            return self._thread
+        self._thread = Thread(target=self._run, name="task-verifier")
+        self._thread.daemon = True
+        self._thread.start()
+        self.invalidate()
+        return self._thread
+
+    def stop(self, timeout: float = 5.0):
+        """Остановка потока проверки"""
+        if not (self._thread and self._thread.is_alive()):
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+
+    def invalidate(self):
+        """Перезагрузка наблюдений (изменились задания или список устройств)"""
+        try:
+            self._queue.put_nowait(_RELOAD)
+        except queue.Full:
+            self.dropped += 1
+
+    def on_state(self, device_id: str):
+        """Обновление состояния устройства (из потока MQTT, не блокирует)"""
+        if device_id not in self._by_device:
+            return
+        try:
+            self._queue.put_nowait((device_id, time.time()))
+            self.updates += 1
+        except queue.Full:
+            self.dropped += 1
+
+    def watch_result(self, lab_result_id: int):
+        """Начало наблюдения за заданиями новой попытки"""
+        watches = self._load(lab_result_id)
+        with self._lock:
+            for watch in watches:
+                self._add(watch)
+
+    def unwatch_result(self, lab_result_id: int):
+        """Прекращение наблюдения за попыткой (работа сдана или проверена)"""
+        with self._lock:
+            for task_result_id in [watch.task_result_id for watch in self._watches.values()
+                                   if watch.lab_result_id == lab_result_id]:
+                self._remove(task_result_id)
+
+    def unwatch_task_result(self, task_result_id: int):
+        """Прекращение наблюдения за заданием (оценка выставлена вручную)"""
+        with self._lock:
+            self._remove(task_result_id)
+
+    def _add(self, watch: _Watch):
+        self._remove(watch.task_result_id)
+        self._watches[watch.task_result_id] = watch
+        for _, aliases, _ in watch.requirements:
+            for alias in aliases:
+                self._by_device.setdefault(alias, set()).add(watch.task_result_id)
+
+    def _remove(self, task_result_id: int):
+        watch = self._watches.pop(task_result_id, None)
+        if watch is None:
+            return
+        for _, aliases, _ in watch.requirements:
+            for alias in aliases:
+                ids = self._by_device.get(alias)
+                if ids is not None:
+                    ids.discard(task_result_id)
+                    if not ids:
+                        del self._by_device[alias]
+
+    def _load(self, lab_result_id: Optional[int] = None) -> List[_Watch]:
+        """Загрузка неоцененных заданий device_interaction активных попыток"""
+        query = '''
+            SELECT tr.id AS task_result_id, tr.lab_result_id, tr.task_id,
+                   t.max_score, r.started_at
+            FROM task_results tr
+            JOIN lab_results r ON r.id = tr.lab_result_id
+            JOIN lab_tasks t ON t.id = tr.task_id
+            WHERE r.status = 'in_progress' AND t.task_type = 'device_interaction'
+              AND tr.score IS NULL
+        '''
+        params: List[Any] = []
+        if lab_result_id is not None:
+            query += " AND r.id = ?"
+            params.append(lab_result_id)
+
+        with database.get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            rows = [dict(row) for row in cursor.fetchall()]
+            if not rows:
+                return []
+
+            task_ids = sorted({row["task_id"] for row in rows})
+            placeholders = ",".join("?" * len(task_ids))
+            cursor.execute(
+                f"SELECT task_id, device_id, required_state FROM task_devices "
+                f"WHERE task_id IN ({placeholders}) AND required_state IS NOT NULL ORDER BY id",
+                task_ids
+            )
+            requirements: Dict[int, List[Tuple[str, Tuple[str, ...], Dict[str, Any]]]] = {}
+            for row in cursor.fetchall():
+                required = json.loads(row["required_state"])
+                if isinstance(required, dict) and required:
+                    requirements.setdefault(row["task_id"], []).append(
+                        (row["device_id"], _device_aliases(row["device_id"]), required))
+
+        return [
+            _Watch(row["task_result_id"], row["lab_result_id"], row["task_id"],
+                   row["max_score"], _parse_started_at(row["started_at"]),
+                   requirements[row["task_id"]])
+            for row in rows if row["task_id"] in requirements
+        ]
+
+    def _reload(self):
+        watches = self._load()
+        with self._lock:
+            previous = self._watches
+            self._watches = {}
+            self._by_device.clear()
+            for watch in watches:
+                old = previous.get(watch.task_result_id)
+                if old is not None and old.requirements == watch.requirements:
+                    # Уже наблюдаемое задание сохраняет начало наблюдения и
+                    # снимок условий: смена состояния, еще не проверенная к
+                    # моменту перезагрузки, не должна попасть в новый снимок
+                    watch.watched_at = old.watched_at
+                    watch.met = old.met
+                self._add(watch)
+        self.reloads += 1
+        logger.info(f"Автопроверка заданий: наблюдается {len(watches)} заданий")
+
+    def _run(self):
+        """Основной цикл потока проверки"""
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            try:
+                if item is _RELOAD:
+                    self._reload()
+                else:
+                    self._check(*item)
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Ошибка автоматической проверки заданий: {e}")
+
+    def _check(self, device_id: str, received_at: float):
+        """Проверка заданий, зависящих от обновленного устройства"""
+        with self._lock:
+            watches = [self._watches[task_result_id]
+                       for task_result_id in self._by_device.get(device_id, ())
+                       if task_result_id in self._watches]
+        self.checks += len(watches)
+
+        for watch in watches:
+            if received_at < max(watch.started_at, watch.watched_at):
+                continue
+
+            states = {}
+            met = []
+            for task_device_id, aliases, required in watch.requirements:
+                state = _current_state(aliases)
+                met.append(state is not None and matches(state, required))
+                if met[-1]:
+                    states[task_device_id] = {key: state.get(key) for key in required}
+
+            # Засчитывается только переход условия из невыполненного в
+            # выполненное, а не состояние, уже бывшее на момент старта
+            changed = any(now and not before for now, before in zip(met, watch.met))
+            watch.met = met
+            if all(met) and changed:
+                self._complete(watch, received_at, states)
+
+    def _complete(self, watch: _Watch, completed_at: float, states: Dict[str, Any]):
+        """Запись оценки выполненного задания"""
+        with self._lock:
+            if self._watches.get(watch.task_result_id) is not watch:
+                return
+            self._remove(watch.task_result_id)
+
+        elapsed = round(max(0.0, completed_at - watch.started_at), 3)
+        verification = {
+            "status": "passed",
+            "completed_at": datetime.fromtimestamp(completed_at).isoformat(),
+            "time_to_complete": elapsed,
+            "states": states
+        }
+        feedback = f"Проверено автоматически: требуемое состояние достигнуто за {elapsed:.0f} с"
+
+        with database.get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT answer FROM task_results WHERE id = ? AND score IS NULL",
+                (watch.task_result_id,)
+            )
+            row = cursor.fetchone()
+            if not row:
+                # Оценка уже выставлена преподавателем
+                return
+            answer = json.loads(row["answer"]) if row["answer"] else {}
+            answer["verification"] = verification
+            cursor.execute(
+                "UPDATE task_results SET score = ?, answer = ?, feedback = ? "
+                "WHERE id = ? AND score IS NULL",
+                (watch.max_score, json.dumps(answer), feedback, watch.task_result_id)
+            )
+
+        self.completed += 1
+        logger.info(
+            f"Задание {watch.task_id} (результат {watch.lab_result_id}) "
+            f"выполнено автоматически за {elapsed:.1f} с")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Метрики автоматической проверки"""
+        with self._lock:
+            watching = len(self._watches)
+            devices = len(self._by_device)
+        return {
+            "watching": watching,
+            "devices": devices,
+            "queue_depth": self._queue.qsize(),
+            "updates": self.updates,
+            "dropped": self.dropped,
+            "checks": self.checks,
+            "completed": self.completed,
+            "reloads": self.reloads,
+            "failed": self.failed,
+            "running": bool(self._thread and self._thread.is_alive())
+        }
+
+
+# Глобальный экземпляр автоматической проверки заданий
+task_verifier = TaskVerifier()
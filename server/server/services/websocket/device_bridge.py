@@ -0,0 +1,103 @@
+import asyncio
+from threading import Lock
+from typing import Dict, Any, Optional, Set
+from config import WS_COALESCE_WINDOW, logger
+from services.websocket.ws_manager import ws_manager
+
+
+class DeviceUpdateBridge:
+    """Передача состояний устройств из потока MQTT в цикл событий uvicorn
+
+    publish() вызывается из сетевого потока paho. Для каждого устройства
+    хранится только последнее состояние: первое обновление планирует отправку
+    через window секунд, последующие в пределах окна лишь заменяют состояние.
+    """
+
+    def __init__(self, window: float = WS_COALESCE_WINDOW):
+        self.window = max(0.0, window)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = Lock()
+        # Последние неотправленные состояния по устройствам
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        # Устройства, для которых уже запланирована отправка
+        self._scheduled: Set[str] = set()
+
+        # Метрики
+        self.published = 0
+        self.coalesced = 0
+        self.delivered = 0
+
+    def attach(self, loop: asyncio.AbstractEventLoop):
+        """Привязка к циклу событий сервера"""
+        with self._lock:
+            self._loop = loop
+            waiting = [device_id for device_id in self._pending
+                       if device_id not in self._scheduled]
+            self._scheduled.update(waiting)
+
+        # Отправляем состояния, накопленные до запуска сервера
+        for device_id in waiting:
+            loop.call_soon_threadsafe(self._schedule_flush, device_id)
+        logger.info(
+            f"Мост обновлений устройств подключен (окно {self.window}с)")
+
+    def detach(self):
+        """Отключение от цикла событий (при остановке сервера)"""
+        with self._lock:
+            self._loop = None
+            self._scheduled.clear()
+
+    def publish(self, device_id: str, state: Dict[str, Any]):
+        """Передача нового состояния устройства (потокобезопасно)"""
+        with self._lock:
+            self.published += 1
+            if device_id in self._pending:
+                self.coalesced += 1
+            self._pending[device_id] = state
+
+            loop = self._loop
+            if loop is None or device_id in self._scheduled:
+                return
+            self._scheduled.add(device_id)
+
+        try:
+            loop.call_soon_threadsafe(self._schedule_flush, device_id)
+        except RuntimeError:
+            # Цикл событий уже закрыт
+            with self._lock:
+                self._scheduled.discard(device_id)
+
+    def _schedule_flush(self, device_id: str):
+        """Планирование отправки по истечении окна (в цикле событий)"""
+        if self.window:
+            self._loop.call_later(self.window, self._flush, device_id)
+        else:
+            self._flush(device_id)
+
+    def _flush(self, device_id: str):
+        """Отправка последнего состояния подписчикам устройства"""
+        with self._lock:
+            self._scheduled.discard(device_id)
+            state = self._pending.pop(device_id, None)
+            loop = self._loop
+            if state is None or loop is None:
+                return
+            self.delivered += 1
+
+        loop.create_task(ws_manager.broadcast_device_update(device_id, state))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Метрики моста обновлений"""
+        with self._lock:
+            return {
+                "window": self.window,
+                "attached": self._loop is not None,
+                "published": self.published,
+                "coalesced": self.coalesced,
+                "delivered": self.delivered,
+                "pending": len(self._pending)
+            }
+
+
+# Глобальный экземпляр моста обновлений устройств
+device_bridge = DeviceUpdateBridge()
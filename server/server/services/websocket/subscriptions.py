@@ -0,0 +1,109 @@
+import re
+import fnmatch
+from typing import Dict, Set, Any, Hashable, Pattern
+
+# Допустимые пространства имен тем подписки
+TOPIC_NAMESPACES = ("device", "lab")
+
+
+def device_topic(device_id: str) -> str:
+    """Тема подписки на устройство"""
+    return f"device:{device_id}"
+
+
+def lab_topic(lab_id: Any) -> str:
+    """Тема подписки на лабораторную работу"""
+    return f"lab:{lab_id}"
+
+
+def is_pattern(topic: str) -> bool:
+    """Содержит ли тема шаблонные символы (*, ?, [...])"""
+    return any(ch in topic for ch in "*?[")
+
+
+def is_valid_topic(topic: Any) -> bool:
+    """Проверка формата темы "пространство:идентификатор" """
+    if not isinstance(topic, str) or ":" not in topic:
+        return False
+    namespace, _, key = topic.partition(":")
+    return namespace in TOPIC_NAMESPACES and bool(key)
+
+
+class SubscriptionIndex:
+    """Двусторонний индекс подписок: соединение -> темы и тема -> соединения
+
+    Точные темы хранятся в словаре множеств, поэтому подписка, отписка и
+    поиск подписчиков выполняются за O(1), а отключение соединения - за
+    O(k), где k - число его подписок. Шаблонные темы ("device:0x00158d*")
+    хранятся отдельно и проверяются только при поиске подписчиков.
+    """
+
+    def __init__(self):
+        # Точные темы -> соединения
+        self._topics: Dict[str, Set[Hashable]] = {}
+        # Шаблоны -> соединения
+        self._patterns: Dict[str, Set[Hashable]] = {}
+        # Скомпилированные шаблоны
+        self._compiled: Dict[str, Pattern] = {}
+        # Соединение -> его темы и шаблоны
+        self._by_connection: Dict[Hashable, Set[str]] = {}
+
+    def subscribe(self, connection: Hashable, topic: str) -> bool:
+        """Подписка соединения на тему; False, если подписка уже есть"""
+        topics = self._by_connection.setdefault(connection, set())
+        if topic in topics:
+            return False
+        topics.add(topic)
+
+        if is_pattern(topic):
+            if topic not in self._patterns:
+                self._patterns[topic] = set()
+                self._compiled[topic] = re.compile(fnmatch.translate(topic))
+            self._patterns[topic].add(connection)
+        else:
+            self._topics.setdefault(topic, set()).add(connection)
+        return True
+
+    def unsubscribe(self, connection: Hashable, topic: str) -> bool:
+        """Отписка соединения от темы; False, если подписки не было"""
+        topics = self._by_connection.get(connection)
+        if not topics or topic not in topics:
+            return False
+        topics.discard(topic)
+        if not topics:
+            del self._by_connection[connection]
+
+        index = self._patterns if is_pattern(topic) else self._topics
+        connections = index.get(topic)
+        if connections is not None:
+            connections.discard(connection)
+            if not connections:
+                del index[topic]
+                self._compiled.pop(topic, None)
+        return True
+
+    def remove(self, connection: Hashable):
+        """Удаление всех подписок соединения"""
+        for topic in list(self._by_connection.get(connection, ())):
+            self.unsubscribe(connection, topic)
+
+    def subscribers(self, topic: str) -> Set[Hashable]:
+        """Соединения, подписанные на тему напрямую или через шаблон"""
+        result = set(self._topics.get(topic, ()))
+        for pattern, connections in self._patterns.items():
+            if self._compiled[pattern].match(topic):
+                result.update(connections)
+        return result
+
+    def topics_of(self, connection: Hashable) -> Set[str]:
+        """Темы, на которые подписано соединение"""
+        return set(self._by_connection.get(connection, ()))
+
+    def get_stats(self) -> Dict[str, int]:
+        """Размеры индекса"""
+        return {
+            "topics": len(self._topics),
+            "patterns": len(self._patterns),
+            "subscribed_connections": len(self._by_connection),
+            "subscriptions": sum(len(t) for t in self._by_connection.values())
+        }
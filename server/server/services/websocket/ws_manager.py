@@ -1,75 +1,201 @@
 import json
-from typing import Dict, List, Any, Set, Optional
+import asyncio
+import time
+from typing import Dict, List, Any, Set, Optional, Iterable
 from fastapi import WebSocket, WebSocketDisconnect
 from datetime import datetime
+from config import WS_SEND_QUEUE_SIZE, WS_SEND_TIMEOUT, logger
+from services.websocket.subscriptions import (
+    SubscriptionIndex, device_topic, lab_topic, is_valid_topic
+)
+
+# Маркер остановки задачи отправки
+_CLOSE = object()
+
+
+class ConnectionChannel:
+    """Очередь отправки и задача-писатель одного WebSocket соединения
+
+    Рассылки только кладут уже сериализованное сообщение в очередь, поэтому
+    медленный клиент не задерживает доставку остальным.
+    """
+
+    def __init__(self, manager: "WebSocketManager", websocket: WebSocket, user_id: int, role: str,
+                 maxsize: int = WS_SEND_QUEUE_SIZE, send_timeout: float = WS_SEND_TIMEOUT):
+        self.manager = manager
+        self.websocket = websocket
+        self.user_id = user_id
+        self.role = role
+        self.send_timeout = send_timeout
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.task: Optional[asyncio.Task] = None
+        self.closed = False
+
+        # Метрики
+        self.sent = 0
+        self.max_depth = 0
+        self.last_send_duration = 0.0
+
+    def start(self):
+        """Запуск задачи отправки"""
+        self.task = asyncio.create_task(self._writer())
+
+    def offer(self, text: str) -> bool:
+        """Постановка сообщения в очередь; False, если очередь переполнена"""
+        if self.closed:
+            return True
+        try:
+            self.queue.put_nowait(text)
+        except asyncio.QueueFull:
+            return False
+        depth = self.queue.qsize()
+        if depth > self.max_depth:
+            self.max_depth = depth
+        return True
+
+    async def _writer(self):
+        """Последовательная отправка сообщений из очереди"""
+        while True:
+            text = await self.queue.get()
+            if text is _CLOSE:
+                return
+            started = time.perf_counter()
+            try:
+                await asyncio.wait_for(self.websocket.send_text(text), self.send_timeout)
+            except asyncio.TimeoutError:
+                self.manager.evict(self.websocket, "send timeout")
+                return
+            except Exception:
+                # Соединение разорвано - отключаем его без закрытия
+                self.manager.disconnect(self.websocket, self.user_id, self.role)
+                return
+            self.last_send_duration = time.perf_counter() - started
+            self.sent += 1
+
+    def stop(self):
+        """Остановка задачи отправки"""
+        if self.closed:
+            return
+        self.closed = True
+        if self.task and not self.task.done():
+            # Очередь может быть заполнена, поэтому задачу просто отменяем
+            self.task.cancel()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Метрики соединения"""
+        return {
+            "user_id": self.user_id,
+            "role": self.role,
+            "queue_depth": self.queue.qsize(),
+            "max_queue_depth": self.max_depth,
+            "sent": self.sent,
+            "last_send_ms": round(self.last_send_duration * 1000, 3)
+        }
 
 
 class WebSocketManager:
     def __init__(self):
         # Активные соединения
-        self.active_connections: List[WebSocket] = []
+        self.active_connections: Set[WebSocket] = set()
         # Соединения, сгруппированные по пользователям
-        self.user_connections: Dict[int, List[WebSocket]] = {}
+        self.user_connections: Dict[int, Set[WebSocket]] = {}
         # Соединения, сгруппированные по ролям
-        self.role_connections: Dict[str, List[WebSocket]] = {}
-        # Соединения, подписанные на устройства
-        self.device_subscriptions: Dict[str, List[WebSocket]] = {}
-        # Соединения, подписанные на лабораторные работы
-        self.lab_subscriptions: Dict[int, List[WebSocket]] = {}
+        self.role_connections: Dict[str, Set[WebSocket]] = {}
+        # Подписки соединений на устройства и лабораторные работы
+        self.subscriptions = SubscriptionIndex()
+        # Очереди отправки соединений
+        self.channels: Dict[WebSocket, ConnectionChannel] = {}
+
+        # Метрики
+        self.messages_encoded = 0
+        self.messages_queued = 0
+        self.evicted = 0
 
     async def connect(self, websocket: WebSocket, user_id: int, role: str):
         """Подключение нового клиента"""
         await websocket.accept()
-        self.active_connections.append(websocket)
+        self.active_connections.add(websocket)
+
+        channel = ConnectionChannel(self, websocket, user_id, role)
+        self.channels[websocket] = channel
+        channel.start()
 
         # Добавляем соединение в группу пользователя
-        if user_id not in self.user_connections:
-            self.user_connections[user_id] = []
-        self.user_connections[user_id].append(websocket)
+        self.user_connections.setdefault(user_id, set()).add(websocket)
 
         # Добавляем соединение в группу роли
-        if role not in self.role_connections:
-            self.role_connections[role] = []
-        self.role_connections[role].append(websocket)
+        self.role_connections.setdefault(role, set()).add(websocket)
 
     def disconnect(self, websocket: WebSocket, user_id: int, role: str):
         """Отключение клиента"""
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
+        channel = self.channels.pop(websocket, None)
+        if channel:
+            channel.stop()
+
+        self.active_connections.discard(websocket)
 
         # Удаляем соединение из группы пользователя
-        if user_id in self.user_connections and websocket in self.user_connections[user_id]:
-            self.user_connections[user_id].remove(websocket)
-            if not self.user_connections[user_id]:
+        connections = self.user_connections.get(user_id)
+        if connections is not None:
+            connections.discard(websocket)
+            if not connections:
                 del self.user_connections[user_id]
 
         # Удаляем соединение из группы роли
-        if role in self.role_connections and websocket in self.role_connections[role]:
-            self.role_connections[role].remove(websocket)
-            if not self.role_connections[role]:
+        connections = self.role_connections.get(role)
+        if connections is not None:
+            connections.discard(websocket)
+            if not connections:
                 del self.role_connections[role]
 
-        # Удаляем соединение из подписок на устройства
-        for device_id, connections in list(self.device_subscriptions.items()):
-            if websocket in connections:
-                connections.remove(websocket)
-                if not connections:
-                    del self.device_subscriptions[device_id]
+        # Удаляем подписки соединения (только его собственные темы)
+        self.subscriptions.remove(websocket)
+
+    def evict(self, websocket: WebSocket, reason: str):
+        """Отключение медленного клиента, не успевающего принимать сообщения"""
+        channel = self.channels.get(websocket)
+        if channel is None:
+            return
+
+        self.evicted += 1
+        logger.warning(
+            f"WebSocket клиент пользователя {channel.user_id} отключен: {reason}")
+        self.disconnect(websocket, channel.user_id, channel.role)
+        asyncio.create_task(self._close(websocket))
+
+    async def _close(self, websocket: WebSocket):
+        """Закрытие соединения с кодом "повторите позже" """
+        try:
+            await asyncio.wait_for(websocket.close(code=1013, reason="Slow consumer"), WS_SEND_TIMEOUT)
+        except Exception:
+            pass
+
+    def _encode(self, message: Dict[str, Any]) -> str:
+        """Однократная сериализация сообщения для всех получателей"""
+        message["timestamp"] = datetime.now().isoformat()
+        self.messages_encoded += 1
+        return json.dumps(message, separators=(",", ":"), ensure_ascii=False, default=str)
+
+    def _fanout(self, connections: Iterable[WebSocket], message: Dict[str, Any]):
+        """Постановка сообщения в очереди указанных соединений"""
+        targets = [ws for ws in dict.fromkeys(connections) if ws in self.channels]
+        if not targets:
+            return
 
-        # Удаляем соединение из подписок на лабораторные работы
-        for lab_id, connections in list(self.lab_subscriptions.items()):
-            if websocket in connections:
-                connections.remove(websocket)
-                if not connections:
-                    del self.lab_subscriptions[lab_id]
+        text = self._encode(message)
+        for websocket in targets:
+            channel = self.channels.get(websocket)
+            if channel is None:
+                continue
+            if channel.offer(text):
+                self.messages_queued += 1
+            else:
+                self.evict(websocket, "send queue overflow")
 
     async def subscribe_to_device(self, websocket: WebSocket, device_id: str):
         """Подписка на обновления устройства"""
-        if device_id not in self.device_subscriptions:
-            self.device_subscriptions[device_id] = []
-        if websocket not in self.device_subscriptions[device_id]:
-            self.device_subscriptions[device_id].append(websocket)
-            await websocket.send_json({
+        if self.subscriptions.subscribe(websocket, device_topic(device_id)):
+            self._fanout([websocket], {
                 "type": "subscription",
                 "status": "success",
                 "target": "device",
@@ -79,11 +205,8 @@ class WebSocketManager:
 
     async def subscribe_to_lab(self, websocket: WebSocket, lab_id: int):
         """Подписка на обновления лабораторной работы"""
-        if lab_id not in self.lab_subscriptions:
-            self.lab_subscriptions[lab_id] = []
-        if websocket not in self.lab_subscriptions[lab_id]:
-            self.lab_subscriptions[lab_id].append(websocket)
-            await websocket.send_json({
+        if self.subscriptions.subscribe(websocket, lab_topic(lab_id)):
+            self._fanout([websocket], {
                 "type": "subscription",
                 "status": "success",
                 "target": "lab",
@@ -91,70 +214,61 @@ class WebSocketManager:
                 "message": f"Подписка на лабораторную работу {lab_id} оформлена"
             })
 
+    async def subscribe_topics(self, websocket: WebSocket, topics: List[str]):
+        """Пакетная подписка на темы вида "device:<id>" и "lab:<id>" (допускаются шаблоны)"""
+        accepted = []
+        rejected = []
+        for topic in topics:
+            if not is_valid_topic(topic):
+                rejected.append(topic)
+                continue
+            self.subscriptions.subscribe(websocket, topic)
+            accepted.append(topic)
+
+        self._fanout([websocket], {
+            "type": "subscription",
+            "status": "success" if not rejected else "partial",
+            "target": "topics",
+            "topics": accepted,
+            "rejected": rejected,
+            "message": f"Оформлено подписок: {len(accepted)}"
+        })
+
+    async def unsubscribe_topics(self, websocket: WebSocket, topics: List[str]):
+        """Пакетная отписка от тем"""
+        removed = [topic for topic in topics
+                   if isinstance(topic, str) and self.subscriptions.unsubscribe(websocket, topic)]
+
+        self._fanout([websocket], {
+            "type": "unsubscription",
+            "status": "success",
+            "topics": removed,
+            "message": f"Отменено подписок: {len(removed)}"
+        })
+
     async def send_personal_message(self, message: Dict[str, Any], websocket: WebSocket):
         """Отправка сообщения конкретному клиенту"""
-        message["timestamp"] = datetime.now().isoformat()
-        try:
-            await websocket.send_json(message)
-        except Exception as e:
-            print(f"Ошибка отправки сообщения: {e}")
+        self._fanout([websocket], message)
 
     async def broadcast(self, message: Dict[str, Any]):
         """Отправка сообщения всем подключенным клиентам"""
-        message["timestamp"] = datetime.now().isoformat()
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(message)
-            except Exception:
-                pass
+        self._fanout(self.active_connections, message)
 
     async def broadcast_to_user(self, user_id: int, message: Dict[str, Any]):
         """Отправка сообщения всем соединениям конкретного пользователя"""
-        if user_id not in self.user_connections:
-            return
-
-        message["timestamp"] = datetime.now().isoformat()
-        for connection in self.user_connections[user_id]:
-            try:
-                await connection.send_json(message)
-            except Exception:
-                pass
+        self._fanout(self.user_connections.get(user_id, ()), message)
 
     async def broadcast_to_role(self, role: str, message: Dict[str, Any]):
         """Отправка сообщения всем пользователям с определенной ролью"""
-        if role not in self.role_connections:
-            return
-
-        message["timestamp"] = datetime.now().isoformat()
-        for connection in self.role_connections[role]:
-            try:
-                await connection.send_json(message)
-            except Exception:
-                pass
+        self._fanout(self.role_connections.get(role, ()), message)
 
     async def broadcast_to_device_subscribers(self, device_id: str, message: Dict[str, Any]):
         """Отправка сообщения всем подписчикам устройства"""
-        if device_id not in self.device_subscriptions:
-            return
-
-        message["timestamp"] = datetime.now().isoformat()
-        for connection in self.device_subscriptions[device_id]:
-            try:
-                await connection.send_json(message)
-            except Exception:
-                pass
+        self._fanout(self.subscriptions.subscribers(device_topic(device_id)), message)
 
     async def broadcast_to_lab_subscribers(self, lab_id: int, message: Dict[str, Any]):
         """Отправка сообщения всем подписчикам лабораторной работы"""
-        if lab_id not in self.lab_subscriptions:
-            return
-
-        message["timestamp"] = datetime.now().isoformat()
-        for connection in self.lab_subscriptions[lab_id]:
-            try:
-                await connection.send_json(message)
-            except Exception:
-                pass
+        self._fanout(self.subscriptions.subscribers(lab_topic(lab_id)), message)
 
     async def broadcast_device_update(self, device_id: str, state: Dict[str, Any]):
         """Отправка обновления состояния устройства всем подписчикам"""
@@ -176,15 +290,14 @@ class WebSocketManager:
             "timestamp": datetime.now().isoformat()
         }
 
-        # Отправляем всем подписчикам устройства
-        await self.broadcast_to_device_subscribers(device_id, message)
-
-        # Отправляем владельцу бронирования
-        await self.broadcast_to_user(user_id, message)
-
-        # Отправляем преподавателям и администраторам
-        await self.broadcast_to_role("teacher", message)
-        await self.broadcast_to_role("admin", message)
+        # Подписчики устройства, владелец бронирования, преподаватели и администраторы
+        # получают одно и то же сообщение, сериализованное один раз
+        self._fanout([
+            *self.subscriptions.subscribers(device_topic(device_id)),
+            *self.user_connections.get(user_id, ()),
+            *self.role_connections.get("teacher", ()),
+            *self.role_connections.get("admin", ())
+        ], message)
 
     async def broadcast_lab_update(self, lab_id: int, action: str, data: Dict[str, Any]):
         """Отправка обновления лабораторной работы"""
@@ -208,15 +321,13 @@ class WebSocketManager:
             "timestamp": datetime.now().isoformat()
         }
 
-        # Отправляем владельцу результата
-        await self.broadcast_to_user(user_id, message)
-
-        # Отправляем преподавателям и администраторам
-        await self.broadcast_to_role("teacher", message)
-        await self.broadcast_to_role("admin", message)
-
-        # Отправляем подписчикам лабораторной работы
-        await self.broadcast_to_lab_subscribers(lab_id, message)
+        # Владелец результата, преподаватели, администраторы и подписчики работы
+        self._fanout([
+            *self.user_connections.get(user_id, ()),
+            *self.role_connections.get("teacher", ()),
+            *self.role_connections.get("admin", ()),
+            *self.subscriptions.subscribers(lab_topic(lab_id))
+        ], message)
 
     async def broadcast_notification(self, user_id: int, title: str, message: str, level: str = "info"):
         """Отправка уведомления пользователю"""
@@ -240,11 +351,24 @@ class WebSocketManager:
         }
 
         if roles:
-            for role in roles:
-                await self.broadcast_to_role(role, notification)
+            self._fanout([ws for role in roles for ws in self.role_connections.get(role, ())],
+                         notification)
         else:
             await self.broadcast(notification)
 
+    def get_stats(self) -> Dict[str, Any]:
+        """Метрики рассылки сообщений"""
+        channels = list(self.channels.values())
+        return {
+            "connections": len(channels),
+            "messages_encoded": self.messages_encoded,
+            "messages_queued": self.messages_queued,
+            "evicted": self.evicted,
+            "subscriptions": self.subscriptions.get_stats(),
+            "total_queue_depth": sum(c.queue.qsize() for c in channels),
+            "channels": [c.get_stats() for c in channels]
+        }
+
 
 # Создаем глобальный экземпляр менеджера WebSocket
 ws_manager = WebSocketManager()
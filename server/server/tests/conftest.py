@@ -0,0 +1,16 @@
+import os
+import sys
+import tempfile
+
+# База данных тестов создается во временном каталоге до импорта config
+_db_dir = tempfile.mkdtemp(prefix="iot_lab_tests_")
+os.environ.setdefault("DB_PATH", os.path.join(_db_dir, "test.db"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+import database  # noqa: E402
+
+
+@pytest.fixture(scope="session", autouse=True)
+def init_database():
+    database.init_db()
@@ -0,0 +1,137 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+import pytest
+from fastapi import HTTPException
+import database
+from config import devices_cache
+from services import devices as devices_service
+
+
+@pytest.fixture
+def device():
+    """Отдельное устройство для каждого теста: агрегаты не пересекаются"""
+    device_id = f"test_sensor_{uuid.uuid4().hex[:8]}"
+    devices_cache[device_id] = {"friendly_name": device_id}
+    yield device_id
+    devices_cache.pop(device_id, None)
+
+
+def _save(device_id, readings):
+    database.save_many_to_db([(device_id, timestamp, data) for timestamp, data in readings])
+
+
+def _aggregate(device_id, start, end, buckets, fields=None):
+    return devices_service.get_device_history_aggregate(
+        device_id, start_date=start, end_date=end, buckets=buckets, fields=fields)
+
+
+def _bucket(point):
+    return {key: point[key] for key in ("count", "min", "max", "avg", "last")}
+
+
+def test_minute_buckets(device):
+    _save(device, [
+        ("2024-03-05T10:00:10", {"temperature": 20, "state": "ON", "occupancy": True}),
+        ("2024-03-05T10:00:50", {"temperature": 22}),
+        ("2024-03-05T10:01:30", {"temperature": 30}),
+    ])
+
+    result = _aggregate(device, "2024-03-05T10:00:00", "2024-03-05T11:00:00", 60)
+    assert result["resolution"] == "1m"
+    assert result["bucket_seconds"] == 60
+    # Строки и логические значения не агрегируются
+    assert set(result["series"]) == {"temperature"}
+
+    series = result["series"]["temperature"]
+    assert [point["timestamp"] for point in series] == [
+        "2024-03-05T10:00:00", "2024-03-05T10:01:00"]
+    assert _bucket(series[0]) == {"count": 2, "min": 20, "max": 22, "avg": 21, "last": 22}
+    assert _bucket(series[1]) == {"count": 1, "min": 30, "max": 30, "avg": 30, "last": 30}
+
+
+def test_hour_buckets_split_at_boundary(device):
+    _save(device, [
+        ("2024-03-05T10:30:00", {"humidity": 5}),
+        ("2024-03-05T10:59:59", {"humidity": 7}),
+        ("2024-03-05T11:00:00", {"humidity": 1}),
+        ("2024-03-05T11:45:00", {"humidity": 3}),
+    ])
+
+    result = _aggregate(device, "2024-03-05T10:00:00", "2024-03-05T12:00:00", 2)
+    assert result["resolution"] == "1h"
+    assert result["bucket_seconds"] == 3600
+
+    series = result["series"]["humidity"]
+    assert [point["timestamp"] for point in series] == [
+        "2024-03-05T10:00:00", "2024-03-05T11:00:00"]
+    assert _bucket(series[0]) == {"count": 2, "min": 5, "max": 7, "avg": 6, "last": 7}
+    assert _bucket(series[1]) == {"count": 2, "min": 1, "max": 3, "avg": 2, "last": 3}
+
+
+def test_day_buckets_split_at_midnight(device):
+    _save(device, [
+        ("2024-03-05T23:59:00", {"power": 4}),
+        ("2024-03-06T00:01:00", {"power": 8}),
+    ])
+
+    result = _aggregate(device, "2024-03-05T00:00:00", "2024-03-07T00:00:00", 2)
+    assert result["resolution"] == "1d"
+
+    series = result["series"]["power"]
+    assert [_bucket(point) for point in series] == [
+        {"count": 1, "min": 4, "max": 4, "avg": 4, "last": 4},
+        {"count": 1, "min": 8, "max": 8, "avg": 8, "last": 8},
+    ]
+
+
+def test_batches_merge_into_existing_bucket(device):
+    _save(device, [("2024-03-05T10:00:30", {"temperature": 10})])
+    # Более ранняя строка из следующего пакета не меняет last
+    _save(device, [
+        ("2024-03-05T10:00:10", {"temperature": 40}),
+        ("2024-03-05T10:00:20", {"temperature": 4}),
+    ])
+
+    result = _aggregate(device, "2024-03-05T10:00:00", "2024-03-05T10:10:00", 10)
+    series = result["series"]["temperature"]
+    assert _bucket(series[0]) == {"count": 3, "min": 4, "max": 40, "avg": 18, "last": 10}
+
+
+def test_field_filter(device):
+    _save(device, [("2024-03-05T10:00:00", {"temperature": 20, "humidity": 50})])
+
+    result = _aggregate(device, "2024-03-05T10:00:00", "2024-03-05T11:00:00", 60,
+                        fields=["humidity"])
+    assert set(result["series"]) == {"humidity"}
+
+
+def test_aggregate_accepts_aware_start_with_naive_end(device):
+    _save(device, [("2024-03-05T10:30:00", {"temperature": 21})])
+    # Начало с часовым поясом, соответствующее 10:00 местного времени
+    start = datetime(2024, 3, 5, 10).astimezone().astimezone(timezone.utc).isoformat()
+
+    result = _aggregate(device, start, "2024-03-05T11:00:00", 1)
+    assert result["start"] == "2024-03-05T10:00:00"
+    assert _bucket(result["series"]["temperature"][0])["count"] == 1
+
+
+def test_aggregate_accepts_mixed_bounds(device):
+    _save(device, [("2024-03-05T10:30:00", {"temperature": 21})])
+    end = datetime(2024, 3, 5, 11).astimezone().astimezone(timezone(timedelta(hours=3))).isoformat()
+
+    result = _aggregate(device, "2024-03-05T10:00:00", end, 1)
+    assert result["end"] == "2024-03-05T11:00:00"
+    assert _bucket(result["series"]["temperature"][0])["count"] == 1
+
+
+def test_aware_bounds_are_converted_to_local_time():
+    parsed = devices_service._parse_local_datetime("2024-05-01T12:00:00+00:00")
+    expected = datetime(2024, 5, 1, 12, tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+    assert parsed == expected and parsed.tzinfo is None
+
+
+def test_aggregate_rejects_reversed_bounds(device):
+    with pytest.raises(HTTPException) as error:
+        devices_service.get_device_history_aggregate(
+            device, start_date="2024-05-02T00:00:00+00:00", end_date="2024-05-01T00:00:00")
+    assert error.value.status_code == 400
@@ -0,0 +1,90 @@
+import time
+import uuid
+import pytest
+import database
+from config import device_states
+from services.task_verifier import TaskVerifier
+
+LAMP = "test_lamp"
+
+
+@pytest.fixture
+def attempt():
+    """Попытка с одним заданием device_interaction: лампа должна быть включена"""
+    login = f"student_{uuid.uuid4().hex[:8]}"
+    user_id = database.create_user(login, "password", "Иванов", "Иван", "", "student")
+    lab_id = database.create_lab("Лампа", "", {}, user_id)
+    task_id = database.create_task(lab_id, "Включить лампу", "", "device_interaction", {}, 0, 10)
+    database.set_task_devices(task_id, [{"device_id": LAMP, "required_state": {"state": "ON"}}])
+    result_id = database.create_lab_result(lab_id, user_id)
+    database.create_task_results(result_id, [task_id])
+    yield result_id
+    device_states.pop(LAMP, None)
+
+
+def _score(result_id):
+    result = database.get_lab_result(result_id)
+    return result["task_results"][0]["score"]
+
+
+def _update(verifier, state):
+    device_states[LAMP] = state
+    verifier._check(LAMP, time.time())
+
+
+def test_already_met_requirement_needs_transition(attempt):
+    device_states[LAMP] = {"state": "ON", "linkquality": 100}
+    verifier = TaskVerifier()
+    verifier.watch_result(attempt)
+
+    # Посторонние обновления при уже включенной лампе не засчитываются
+    _update(verifier, {"state": "ON", "linkquality": 90})
+    assert _score(attempt) is None
+
+    _update(verifier, {"state": "OFF", "linkquality": 90})
+    assert _score(attempt) is None
+
+    _update(verifier, {"state": "ON", "linkquality": 90})
+    assert _score(attempt) == 10
+
+
+def test_transition_after_start_is_scored(attempt):
+    device_states[LAMP] = {"state": "OFF"}
+    verifier = TaskVerifier()
+    verifier.watch_result(attempt)
+
+    _update(verifier, {"state": "on"})
+    assert _score(attempt) == 10
+
+
+def test_update_received_before_watch_is_ignored(attempt):
+    device_states[LAMP] = {"state": "OFF"}
+    verifier = TaskVerifier()
+    received_at = time.time() - 60
+    verifier.watch_result(attempt)
+
+    device_states[LAMP] = {"state": "ON"}
+    verifier._check(LAMP, received_at)
+    assert _score(attempt) is None
+
+
+def test_reload_between_change_and_check_keeps_baseline(attempt):
+    device_states[LAMP] = {"state": "OFF"}
+    verifier = TaskVerifier()
+    verifier.watch_result(attempt)
+
+    # Лампу включили, но до проверки обновления наблюдения перезагрузились
+    device_states[LAMP] = {"state": "ON"}
+    received_at = time.time()
+    verifier._reload()
+    verifier._check(LAMP, received_at)
+    assert _score(attempt) == 10
+
+
+def test_reload_snapshots_new_watches(attempt):
+    device_states[LAMP] = {"state": "ON"}
+    verifier = TaskVerifier()
+    verifier._reload()
+
+    _update(verifier, {"state": "ON", "linkquality": 80})
+    assert _score(attempt) is None
@@ -0,0 +1,29 @@
+from utils.user_cache import UserCache
+
+
+def test_user_invalidated_during_read_is_not_cached():
+    cache = UserCache(ttl=60)
+    generation = cache.user_generation(1)
+    # Пока запись читается из БД, пользователя понизили в правах
+    cache.invalidate_user(1)
+    cache.put_user({"id": 1, "role": "admin"}, generation)
+    assert cache.get_user(1) is None
+
+    cache.put_user({"id": 1, "role": "student"}, cache.user_generation(1))
+    assert cache.get_user(1)["role"] == "student"
+
+
+def test_token_invalidated_during_check_is_not_cached():
+    cache = UserCache(ttl=60)
+    generation = cache.token_generation()
+    cache.invalidate_token("token")
+    cache.put_token("token", 1, generation=generation)
+    assert cache.get_token("token") is None
+
+    generation = cache.token_generation()
+    cache.invalidate_user(1)
+    cache.put_token("token", 1, generation=generation)
+    assert cache.get_token("token") is None
+
+    cache.put_token("token", 1, generation=cache.token_generation())
+    assert cache.get_token("token") == 1
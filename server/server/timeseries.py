@@ -0,0 +1,174 @@
+import re
+import sqlite3
+from threading import Lock
+from typing import Dict, List, Any, Optional, Iterable, Tuple
+from config import logger
+
+# Таблица-каталог помесячных секций показаний сенсоров
+CATALOG_TABLE = "sensor_partitions"
+PARTITION_PREFIX = "sensor_data_"
+
+_PERIOD_RE = re.compile(r"^\d{4}-\d{2}$")
+
+# Известные секции: период "ГГГГ-ММ" -> имя таблицы
+_partitions: Dict[str, str] = {}
+_partitions_lock = Lock()
+
+
+def period_of(timestamp: str) -> str:
+    """Период секции ("ГГГГ-ММ") для метки времени в формате ISO"""
+    period = timestamp[:7]
+    if not _PERIOD_RE.match(period):
+        raise ValueError(f"Некорректная метка времени: {timestamp}")
+    return period
+
+
+def partition_name(period: str) -> str:
+    """Имя таблицы секции для периода"""
+    return PARTITION_PREFIX + period.replace("-", "_")
+
+
+def init_timeseries(cursor: sqlite3.Cursor):
+    """Создание каталога секций и перенос строк из общей таблицы sensor_data"""
+    cursor.execute(f'''
+    CREATE TABLE IF NOT EXISTS {CATALOG_TABLE} (
+        period TEXT PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+
+    with _partitions_lock:
+        _partitions.clear()
+        cursor.execute(f"SELECT period, name FROM {CATALOG_TABLE}")
+        for row in cursor.fetchall():
+            _partitions[row[0]] = row[1]
+
+    # Переносим показания, записанные до перехода на секции
+    cursor.execute(
+        "SELECT DISTINCT substr(timestamp, 1, 7) FROM sensor_data")
+    legacy_periods = [row[0] for row in cursor.fetchall()
+                      if row[0] and _PERIOD_RE.match(row[0])]
+    if not legacy_periods:
+        return
+
+    moved = 0
+    for period in legacy_periods:
+        name = ensure_partition(cursor, period)
+        cursor.execute(f'''
+            INSERT INTO {name} (device_id, timestamp, data)
+            SELECT device_id, timestamp, data FROM sensor_data
+            WHERE substr(timestamp, 1, 7) = ?
+            ORDER BY id
+        ''', (period,))
+        moved += cursor.rowcount
+    cursor.execute("DELETE FROM sensor_data")
+    logger.info(
+        f"Показания сенсоров перенесены в помесячные секции: {moved} строк, {len(legacy_periods)} секций")
+
+
+def ensure_partition(cursor: sqlite3.Cursor, period: str) -> str:
+    """Получение имени секции с созданием таблицы при первом обращении к периоду"""
+    name = _partitions.get(period)
+    if name:
+        return name
+
+    name = partition_name(period)
+    cursor.execute(f'''
+    CREATE TABLE IF NOT EXISTS {name} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        device_id TEXT NOT NULL,
+        timestamp DATETIME NOT NULL,
+        data JSON NOT NULL
+    )
+    ''')
+    cursor.execute(
+        f"CREATE INDEX IF NOT EXISTS idx_{name}_device_ts ON {name} (device_id, timestamp)")
+    cursor.execute(
+        f"INSERT OR IGNORE INTO {CATALOG_TABLE} (period, name) VALUES (?, ?)",
+        (period, name)
+    )
+
+    with _partitions_lock:
+        _partitions[period] = name
+    logger.info(f"Создана секция показаний {name}")
+    return name
+
+
+def _forget_partition(period: str):
+    """Удаление секции из кэша (например, после отката транзакции)"""
+    with _partitions_lock:
+        _partitions.pop(period, None)
+
+
+def insert_rows(cursor: sqlite3.Cursor, rows: Iterable[Tuple[str, str, str]]) -> int:
+    """Запись строк (device_id, timestamp, data_json) в соответствующие секции"""
+    by_period: Dict[str, List[Tuple[str, str, str]]] = {}
+    for row in rows:
+        by_period.setdefault(period_of(row[1]), []).append(row)
+
+    count = 0
+    for period, period_rows in by_period.items():
+        name = ensure_partition(cursor, period)
+        sql = f"INSERT INTO {name} (device_id, timestamp, data) VALUES (?, ?, ?)"
+        try:
+            cursor.executemany(sql, period_rows)
+        except sqlite3.OperationalError:
+            # Таблица могла не сохраниться из-за отката транзакции, в которой создавалась
+            _forget_partition(period)
+            name = ensure_partition(cursor, period)
+            cursor.executemany(sql, period_rows)
+        count += len(period_rows)
+
+    return count
+
+
+def get_partitions(start: Optional[str] = None, end: Optional[str] = None) -> List[Tuple[str, str]]:
+    """Секции, пересекающиеся с интервалом [start, end], от новых к старым"""
+    start_period = start[:7] if start else None
+    end_period = end[:7] if end else None
+
+    with _partitions_lock:
+        items = list(_partitions.items())
+
+    selected = [
+        (period, name) for period, name in items
+        if (start_period is None or period >= start_period)
+        and (end_period is None or period <= end_period)
+    ]
+    selected.sort(reverse=True)
+    return selected
+
+
+def query_history(cursor: sqlite3.Cursor, device_id: str, limit: int,
+                  start: Optional[str] = None, end: Optional[str] = None) -> List[sqlite3.Row]:
+    """Последние показания устройства за интервал
+
+    Обходит только секции, попадающие в интервал, начиная с самой новой,
+    и останавливается, как только набрано limit строк.
+    """
+    rows: List[sqlite3.Row] = []
+
+    for _, name in get_partitions(start, end):
+        remaining = limit - len(rows)
+        if remaining <= 0:
+            break
+
+        query = f"SELECT timestamp, data FROM {name} WHERE device_id = ?"
+        params: List[Any] = [device_id]
+
+        if start:
+            query += " AND timestamp >= ?"
+            params.append(start)
+
+        if end:
+            query += " AND timestamp <= ?"
+            params.append(end)
+
+        query += " ORDER BY timestamp DESC LIMIT ?"
+        params.append(remaining)
+
+        cursor.execute(query, params)
+        rows.extend(cursor.fetchall())
+
+    return rows
@@ -0,0 +1,121 @@
+import asyncio
+import time
+import functools
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any, TypeVar
+from config import CPU_EXECUTOR_WORKERS, DB_EXECUTOR_WORKERS, logger
+
+T = TypeVar("T")
+
+
+class InstrumentedExecutor:
+    """Пул потоков с метриками времени ожидания в очереди и выполнения
+
+    Асинхронные обработчики выносят сюда блокирующую работу, чтобы не
+    останавливать цикл событий uvicorn.
+    """
+
+    def __init__(self, name: str, max_workers: int):
+        self.name = name
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=f"{name}-worker")
+        self._lock = Lock()
+
+        # Метрики
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.in_flight = 0
+        self.total_queue_time = 0.0
+        self.max_queue_time = 0.0
+        self.total_run_time = 0.0
+        self.max_run_time = 0.0
+
+    async def run(self, func: Callable[..., T], *args, **kwargs) -> T:
+        """Выполнение функции в пуле с ожиданием результата"""
+        loop = asyncio.get_running_loop()
+        submitted_at = time.perf_counter()
+        with self._lock:
+            self.submitted += 1
+            self.in_flight += 1
+        call = functools.partial(self._call, func, args, kwargs, submitted_at)
+        return await loop.run_in_executor(self._executor, call)
+
+    def _call(self, func: Callable[..., T], args: tuple, kwargs: dict, submitted_at: float) -> T:
+        """Выполнение функции в потоке пула с учетом времени"""
+        started = time.perf_counter()
+        queue_time = started - submitted_at
+        ok = False
+        try:
+            result = func(*args, **kwargs)
+            ok = True
+            return result
+        finally:
+            run_time = time.perf_counter() - started
+            with self._lock:
+                self.in_flight -= 1
+                if ok:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+                self.total_queue_time += queue_time
+                self.total_run_time += run_time
+                if queue_time > self.max_queue_time:
+                    self.max_queue_time = queue_time
+                if run_time > self.max_run_time:
+                    self.max_run_time = run_time
+
+    def shutdown(self):
+        """Остановка пула с ожиданием выполняющихся задач"""
+        self._executor.shutdown(wait=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Метрики пула"""
+        with self._lock:
+            finished = self.completed + self.failed
+            return {
+                "max_workers": self.max_workers,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "in_flight": self.in_flight,
+                "avg_queue_ms": round(self.total_queue_time / finished * 1000, 3) if finished else 0.0,
+                "max_queue_ms": round(self.max_queue_time * 1000, 3),
+                "avg_run_ms": round(self.total_run_time / finished * 1000, 3) if finished else 0.0,
+                "max_run_ms": round(self.max_run_time * 1000, 3)
+            }
+
+
+# Пул для вычислительно тяжелых операций (bcrypt освобождает GIL,
+# поэтому потоков достаточно)
+cpu_executor = InstrumentedExecutor("cpu", CPU_EXECUTOR_WORKERS)
+
+# Пул для синхронных запросов к SQLite
+db_executor = InstrumentedExecutor("db", DB_EXECUTOR_WORKERS)
+
+
+async def run_cpu(func: Callable[..., T], *args, **kwargs) -> T:
+    """Выполнение вычислительно тяжелой функции (хеширование паролей) вне цикла событий"""
+    return await cpu_executor.run(func, *args, **kwargs)
+
+
+async def run_db(func: Callable[..., T], *args, **kwargs) -> T:
+    """Выполнение функции, обращающейся к базе данных, вне цикла событий"""
+    return await db_executor.run(func, *args, **kwargs)
+
+
+def shutdown_executors():
+    """Остановка всех пулов"""
+    for executor in (cpu_executor, db_executor):
+        executor.shutdown()
+    logger.info("Пулы выполнения блокирующих операций остановлены")
+
+
+def get_executor_stats() -> Dict[str, Any]:
+    """Метрики всех пулов"""
+    return {
+        "cpu": cpu_executor.get_stats(),
+        "db": db_executor.get_stats()
+    }
@@ -0,0 +1,100 @@
+import hashlib
+from threading import Lock
+from typing import Callable, Awaitable, Dict, Any, Optional, Tuple
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+# Домены данных, изменение которых сбрасывает закэшированные ответы
+DEVICES = "devices"
+LABS = "labs"
+GROUPS = "groups"
+
+
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    """Совпадает ли ETag с заголовком If-None-Match"""
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # Для If-None-Match допускается слабое сравнение (RFC 9110, 13.1.2)
+    candidates = (value.strip() for value in header.split(","))
+    return any(value.removeprefix("W/") == etag for value in candidates)
+
+
+class ResponseCache:
+    """Кэш сериализованных ответов списочных запросов
+
+    Каждый домен данных имеет счетчик поколений, который увеличивается при
+    любом изменении данных. Ответ строится заново, только если поколение
+    изменилось; ETag вычисляется по содержимому, поэтому клиент получает
+    304 и тогда, когда данные после изменения совпали с прежними.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._generations: Dict[str, int] = {}
+        # Ключ -> (поколение, ETag, тело ответа)
+        self._entries: Dict[str, Tuple[int, str, bytes]] = {}
+
+        # Метрики
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def bump(self, domain: str):
+        """Отметка изменения данных домена (потокобезопасно)"""
+        with self._lock:
+            self._generations[domain] = self._generations.get(domain, 0) + 1
+
+    def generation(self, domain: str) -> int:
+        """Текущее поколение данных домена"""
+        with self._lock:
+            return self._generations.get(domain, 0)
+
+    async def respond(self, request: Request, domain: str,
+                      build: Callable[[], Awaitable[Any]], key: Optional[str] = None) -> Response:
+        """Ответ из кэша, 304 при совпадении ETag или новый ответ, построенный build()"""
+        key = key or domain
+        with self._lock:
+            generation = self._generations.get(domain, 0)
+            entry = self._entries.get(key)
+
+        if entry is not None and entry[0] == generation:
+            with self._lock:
+                self.hits += 1
+        else:
+            # Поколение читается до построения: изменение во время построения
+            # приведет к повторному построению при следующем запросе
+            body = JSONResponse(content=jsonable_encoder(await build())).body
+            etag = f'"{hashlib.sha1(body).hexdigest()}"'
+            entry = (generation, etag, body)
+            with self._lock:
+                self.misses += 1
+                self._entries[key] = entry
+
+        _, etag, body = entry
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            with self._lock:
+                self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Метрики кэша"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "generations": dict(self._generations),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 3) if total else 0.0,
+                "not_modified": self.not_modified
+            }
+
+
+# Глобальный экземпляр кэша
+response_cache = ResponseCache()
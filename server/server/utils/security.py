@@ -5,6 +5,8 @@ from typing import Optional, Dict
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
+from utils.user_cache import user_cache
+from utils.executors import run_db
 import database
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/token")
@@ -39,17 +41,26 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: int = int(payload.get("sub"))
-        if user_id is None:
+    user_id = user_cache.get_token(token)
+    if user_id is None:
+        generation = user_cache.token_generation()
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            user_id = int(payload.get("sub"))
+        except (JWTError, TypeError, ValueError):
             raise credentials_exception
-    except JWTError:
-        raise credentials_exception
+        user_cache.put_token(token, user_id, payload.get("exp"), generation)
 
-    user = database.get_user_by_id(user_id)
+    user = user_cache.get_user(user_id)
     if user is None:
-        raise credentials_exception
+        # Поколение читается до запроса: сброс во время чтения не даст
+        # закэшировать устаревшую запись
+        generation = user_cache.user_generation(user_id)
+        user = await run_db(database.get_user_by_id, user_id)
+        if user is None:
+            user_cache.invalidate_user(user_id)
+            raise credentials_exception
+        user_cache.put_user(user, generation)
 
     return user
 
@@ -0,0 +1,174 @@
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, Any, Optional, Set, Tuple
+from config import USER_CACHE_TTL, USER_CACHE_MAX_TOKENS
+
+
+class UserCache:
+    """Кэш проверенных токенов и пользователей в памяти процесса
+
+    Токен -> ID пользователя (живет до истечения токена или TTL), ID
+    пользователя -> запись пользователя (живет TTL). Изменение, удаление
+    пользователя и завершение его сессий явно сбрасывают связанные записи.
+
+    Сброс увеличивает счетчик поколения. Запись, прочитанная до сброса
+    (поколение получено до обращения к БД), не попадает в кэш.
+    """
+
+    def __init__(self, ttl: float = USER_CACHE_TTL, max_tokens: int = USER_CACHE_MAX_TOKENS):
+        self.ttl = ttl
+        self.max_tokens = max_tokens
+        self._lock = Lock()
+        # Токен -> (ID пользователя, срок действия записи)
+        self._tokens: "OrderedDict[str, Tuple[int, float]]" = OrderedDict()
+        # ID пользователя -> (запись пользователя, срок действия записи)
+        self._users: Dict[int, Tuple[Dict[str, Any], float]] = {}
+        # ID пользователя -> его токены в кэше
+        self._user_tokens: Dict[int, Set[str]] = {}
+        # Поколения: растут при каждом сбросе токенов / записи пользователя
+        self._token_generation = 0
+        self._user_generations: Dict[int, int] = {}
+
+        # Метрики
+        self.token_hits = 0
+        self.token_misses = 0
+        self.user_hits = 0
+        self.user_misses = 0
+        self.invalidations = 0
+        self.stale_puts = 0
+
+    def token_generation(self) -> int:
+        """Текущее поколение токенов (получать до проверки токена)"""
+        with self._lock:
+            return self._token_generation
+
+    def user_generation(self, user_id: int) -> int:
+        """Текущее поколение записи пользователя (получать до чтения из БД)"""
+        with self._lock:
+            return self._user_generations.get(user_id, 0)
+
+    def get_token(self, token: str) -> Optional[int]:
+        """ID пользователя для ранее проверенного токена"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._tokens.get(token)
+            if entry is None or entry[1] <= now:
+                if entry is not None:
+                    self._drop_token(token)
+                self.token_misses += 1
+                return None
+            self._tokens.move_to_end(token)
+            self.token_hits += 1
+            return entry[0]
+
+    def put_token(self, token: str, user_id: int, expires_at: Optional[float] = None,
+                  generation: Optional[int] = None):
+        """Запоминание проверенного токена; expires_at - время истечения JWT (UNIX)
+
+        generation - поколение токенов на момент начала проверки: если с тех
+        пор был сброс, токен не запоминается.
+        """
+        ttl = self.ttl
+        if expires_at is not None:
+            ttl = min(ttl, expires_at - time.time())
+        if ttl <= 0:
+            return
+
+        with self._lock:
+            if generation is not None and generation != self._token_generation:
+                self.stale_puts += 1
+                return
+            self._drop_token(token)
+            self._tokens[token] = (user_id, time.monotonic() + ttl)
+            self._user_tokens.setdefault(user_id, set()).add(token)
+            while len(self._tokens) > self.max_tokens:
+                oldest = next(iter(self._tokens))
+                self._drop_token(oldest)
+
+    def get_user(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Запись пользователя из кэша (копия)"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is None or entry[1] <= now:
+                if entry is not None:
+                    del self._users[user_id]
+                self.user_misses += 1
+                return None
+            self.user_hits += 1
+            return dict(entry[0])
+
+    def put_user(self, user: Dict[str, Any], generation: Optional[int] = None):
+        """Запоминание записи пользователя
+
+        generation - поколение записи до чтения из БД: если запись была
+        сброшена во время чтения, прочитанные данные могли устареть.
+        """
+        with self._lock:
+            if generation is not None and generation != self._user_generations.get(user["id"], 0):
+                self.stale_puts += 1
+                return
+            self._users[user["id"]] = (dict(user), time.monotonic() + self.ttl)
+
+    def invalidate_token(self, token: str):
+        """Сброс одного токена (выход из сессии)"""
+        with self._lock:
+            self._token_generation += 1
+            if self._drop_token(token):
+                self.invalidations += 1
+
+    def invalidate_user(self, user_id: int):
+        """Сброс записи пользователя и всех его токенов"""
+        with self._lock:
+            self._token_generation += 1
+            self._user_generations[user_id] = self._user_generations.get(user_id, 0) + 1
+            self._users.pop(user_id, None)
+            for token in list(self._user_tokens.get(user_id, ())):
+                self._drop_token(token)
+            self.invalidations += 1
+
+    def clear(self):
+        """Полная очистка кэша"""
+        with self._lock:
+            self._token_generation += 1
+            self._tokens.clear()
+            self._users.clear()
+            self._user_tokens.clear()
+
+    def _drop_token(self, token: str) -> bool:
+        """Удаление токена из индексов (вызывается под блокировкой)"""
+        entry = self._tokens.pop(token, None)
+        if entry is None:
+            return False
+        tokens = self._user_tokens.get(entry[0])
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._user_tokens[entry[0]]
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Метрики кэша"""
+        with self._lock:
+            tokens = len(self._tokens)
+            users = len(self._users)
+        token_total = self.token_hits + self.token_misses
+        user_total = self.user_hits + self.user_misses
+        return {
+            "tokens": tokens,
+            "users": users,
+            "token_hits": self.token_hits,
+            "token_misses": self.token_misses,
+            "token_hit_ratio": round(self.token_hits / token_total, 3) if token_total else 0.0,
+            "user_hits": self.user_hits,
+            "user_misses": self.user_misses,
+            "user_hit_ratio": round(self.user_hits / user_total, 3) if user_total else 0.0,
+            "invalidations": self.invalidations,
+            "stale_puts": self.stale_puts,
+            "ttl": self.ttl
+        }
+
+
+# Глобальный экземпляр кэша
+user_cache = UserCache()